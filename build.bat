@@ -19,7 +19,7 @@ echo Building keymapuino-cli...
 pyinstaller --onefile --distpath "%CLI_OUT%" --name keymapuino-cli %CLI_SRC%
 
 echo Building keymapuino-gui...
-pyinstaller --onefile --windowed --distpath "%GUI_OUT%" --name keymapuino-gui %GUI_SRC%
+pyinstaller --onefile --windowed --paths keymapuino-cli --distpath "%GUI_OUT%" --name keymapuino-gui %GUI_SRC%
 
 REM Copy plugin folder if it exists
 if exist "plugins" (
@@ -14,7 +14,7 @@ echo "Building keymapuino-cli..."
 pyinstaller --onefile --distpath "$CLI_OUT" --name keymapuino-cli "$CLI_SRC"
 
 echo "Building keymapuino-gui..."
-pyinstaller --onefile --distpath "$GUI_OUT" --name keymapuino-gui "$GUI_SRC"
+pyinstaller --onefile --paths keymapuino-cli --distpath "$GUI_OUT" --name keymapuino-gui "$GUI_SRC"
 
 cp -r plugins "$RELEASE_DIR/plugins"
 
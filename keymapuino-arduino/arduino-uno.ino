@@ -1,5 +1,10 @@
 #include <Arduino.h>
 #include <Servo.h>
+#include <EEPROM.h>
+#include <stddef.h>
+#include <stdlib.h>
+#include <string.h>
+#include <ctype.h>
 
 #define PWM_MAX_VALUE 255
 #define SERVO_MAX_ANGLE 180
@@ -10,6 +15,55 @@
 #define PIN_MODE_PULLUP 3
 #define PIN_MODE_SERVO 4
 
+#define ERR_MALFORMED_COMMAND 1
+#define ERR_INVALID_PIN 2
+#define ERR_NOT_OUTPUT 3
+#define ERR_NOT_SERVO 4
+#define ERR_MALFORMED_PIN_COMMAND 5
+#define ERR_INVALID_PIN_NUMBER 6
+#define ERR_INVALID_PIN_MODE 7
+#define ERR_PIN_IN_USE 8
+#define ERR_MAX_SERVOS 9
+#define ERR_NOT_INPUT 10
+#define ERR_UNKNOWN_PIN_ACTION 11
+#define ERR_UNKNOWN_COMMAND 12
+#define ERR_CORRUPTED_FRAME 13
+#define ERR_INVALID_BAUD_RATE 14
+
+const char* const ERROR_MESSAGES[] = {
+  "Unknown error",
+  "Malformed command",
+  "Invalid pin",
+  "Pin not configured as OUTPUT",
+  "Pin not configured as SERVO",
+  "Malformed pin command",
+  "Invalid pin number",
+  "Invalid pin mode",
+  "Pin already in use",
+  "Max servos reached",
+  "Pin not configured for input",
+  "Unknown pin action",
+  "Unknown command",
+  "Corrupted frame",
+  "Invalid baud rate"
+};
+
+// Binary frame: SYNC, type, pin, value (uint16 LE), seq, CRC-8 (poly 0x07) over type..seq
+#define FRAME_SYNC 0xA5
+#define FRAME_SIZE 7
+#define FRAME_ANALOG 'A'
+#define FRAME_DIGITAL 'D'
+#define FRAME_OK 'K'
+#define FRAME_ERROR 'E'
+
+#define TEXT_BAUD_RATE 9600
+#define DEFAULT_DEBOUNCE_MS 10
+#define ADC_RANGE 1024
+#define DEFAULT_DIGITAL_PERIOD_MS 1
+#define DEFAULT_ANALOG_PERIOD_MS 20
+#define COMMAND_BUFFER_SIZE 64
+#define FRAME_TIMEOUT_MS 100
+
 const int NUM_PINS = 20;
 int pinModes[NUM_PINS];
 
@@ -24,103 +78,248 @@ int numDigitalReadPins = 0;
 int analogReadPins[MAX_PINS_MONITORED];
 int numAnalogReadPins = 0;
 
+// Debounce state of monitored digital pins, indexed by pin number
+bool digitalPressed[NUM_PINS];
+bool digitalRawPressed[NUM_PINS];
+unsigned long digitalChangedAt[NUM_PINS];
+byte debounceMs[NUM_PINS];
+
+// Report-on-change settings of monitored analog pins; a deadband of -1 reports every sample
+int analogDeadband[NUM_PINS];
+unsigned int analogMinIntervalMs[NUM_PINS];
+unsigned int analogMaxIntervalMs[NUM_PINS];
+int analogLastSent[NUM_PINS];
+unsigned long analogLastSentAt[NUM_PINS];
+
+// Sampling schedule of monitored pins: a pin is read once micros() reaches its next sample time, so loop() never
+// sleeps and a held button, a busy analog pin or a half-received command cannot delay the other pins
+unsigned int samplePeriodMs[NUM_PINS];
+unsigned long nextSampleAt[NUM_PINS];
+
+// Command input is collected across passes of loop(); a binary frame is only taken once all of it has arrived
+char commandBuffer[COMMAND_BUFFER_SIZE];
+byte commandLength = 0;
+bool commandOverflow = false;
+bool frameWaiting = false;
+unsigned long frameWaitSince = 0;
+
+bool binaryMode = false;
+byte frameSeq = 0;
+
+// Sequence tag of the command being processed ("#<seq> <command>"), echoed in its reply; -1 when untagged
+long replySeq = -1;
+
+// Pin setup stored by "commit <hash>" and restored on boot, so a host holding the same configuration can skip the upload
+#define CONFIG_MAGIC 0x4B4E
+#define READ_NONE 0
+#define READ_DIGITAL 1
+#define READ_ANALOG 2
+
+struct StoredPin {
+  byte mode;
+  byte read;
+  byte debounceMs;
+  int deadband;
+  unsigned int minIntervalMs;
+  unsigned int maxIntervalMs;
+  unsigned int samplePeriodMs;
+};
+
+struct StoredConfig {
+  unsigned int magic;
+  unsigned long hash;
+  StoredPin pins[NUM_PINS];
+  byte crc;
+};
+
+// Host-supplied hash of the live configuration; 0 once a pin command or clear has changed it since the last commit
+unsigned long configHash = 0;
+
+// Prototypes, which the Arduino IDE would otherwise generate, so the sketch also builds as plain C++ (see host/)
+void clearAll();
+void restoreConfig();
+void saveConfig(unsigned long hash);
+void readSerialInput();
+bool sampleDue(int pin, unsigned long nowUs);
+void startSampling(int pin, unsigned int periodMs);
+void processCommand(char *cmd);
+void processFrame();
+void writeOutput(char type, int pin, int value);
+void switchProtocol(bool binary, long baudRate);
+long nextParam(char *&params, long defaultValue);
+char *afterWord(char *text, const char *word);
+char *trim(char *text);
+int parsePin(char *pinStr);
+void addToList(int list[], int &count, int value);
+void removeFromList(int list[], int &count, int value);
+byte crc8(const byte *data, int length);
+void sendDigitalEdge(int pin, bool pressed);
+void sendAnalogValue(int pin, int value);
+void sendFrame(char type, int pin, unsigned int value);
+void sendOK();
+void sendError(byte code);
+
 void setup() {
-  Serial.begin(9600);
+  Serial.begin(TEXT_BAUD_RATE);
   clearAll();
+  restoreConfig();
+  Serial.print("READY bin cfg=");
+  Serial.println(configHash, HEX);
 }
 
 void loop() {
-  if (Serial.available() > 0) {
-    String command = Serial.readStringUntil('\n');
-    processCommand(command);
-  }
+  readSerialInput();
 
+  unsigned long nowUs = micros();
+  unsigned long now = millis();
   for (int i = 0; i < numDigitalReadPins; i++) {
     int pin = digitalReadPins[i];
-    if (digitalRead(pin) == LOW) {
-      sendPinCode(pin);
-      delay(5);
+    if (!sampleDue(pin, nowUs)) continue;
+    bool pressed = digitalRead(pin) == LOW;
+    if (pressed != digitalRawPressed[pin]) {
+      digitalRawPressed[pin] = pressed;
+      digitalChangedAt[pin] = now;
+    }
+    if (pressed != digitalPressed[pin] && now - digitalChangedAt[pin] >= debounceMs[pin]) {
+      digitalPressed[pin] = pressed;
+      sendDigitalEdge(pin, pressed);
     }
   }
 
   for (int i = 0; i < numAnalogReadPins; i++) {
     int pin = analogReadPins[i];
+    if (!sampleDue(pin, nowUs)) continue;
     int value = analogRead(pin);
+    if (analogDeadband[pin] >= 0) {
+      unsigned long elapsed = now - analogLastSentAt[pin];
+      bool changed = abs(value - analogLastSent[pin]) > analogDeadband[pin] && elapsed >= analogMinIntervalMs[pin];
+      bool keepalive = analogMaxIntervalMs[pin] > 0 && elapsed >= analogMaxIntervalMs[pin];
+      if (!changed && !keepalive) continue;
+    }
+    analogLastSent[pin] = value;
+    analogLastSentAt[pin] = now;
     sendAnalogValue(pin, value);
   }
+}
 
-  delay(20);
+// True once the pin's next sample time has come. The schedule then moves on by one period, so samples keep a steady
+// rate; after a stall (a long EEPROM write, a full TX buffer) it restarts from now instead of catching up in a burst
+bool sampleDue(int pin, unsigned long nowUs) {
+  if ((long)(nowUs - nextSampleAt[pin]) < 0) return false;
+  unsigned long periodUs = samplePeriodMs[pin] * 1000UL;
+  nextSampleAt[pin] += periodUs;
+  if ((long)(nowUs - nextSampleAt[pin]) >= 0) nextSampleAt[pin] = nowUs + periodUs;
+  return true;
 }
 
-void processCommand(String cmd) {
-  cmd.trim();
-  if (cmd.length() == 0) return;
+void startSampling(int pin, unsigned int periodMs) {
+  samplePeriodMs[pin] = periodMs;
+  nextSampleAt[pin] = micros();
+}
 
-  char type = cmd.charAt(0);
-  if (type == 'D' || type == 'P' || type == 'S') {
-    int firstComma = cmd.indexOf(',');
-    int secondComma = cmd.indexOf(',', firstComma + 1);
-
-    if (firstComma == -1 || secondComma == -1) { sendError("Malformed command"); return; }
-
-    int pin = cmd.substring(firstComma + 1, secondComma).toInt();
-    int value = cmd.substring(secondComma + 1).toInt();
-
-    if (pin < 0 || pin >= NUM_PINS) { sendError("Invalid pin"); return; }
-
-    if (type == 'D') {
-      if (pinModes[pin] != PIN_MODE_OUTPUT) { sendError("Pin not configured as OUTPUT"); return; }
-      digitalWrite(pin, value == 1 ? HIGH : LOW);
-    } else if (type == 'P') {
-      if (pinModes[pin] != PIN_MODE_OUTPUT) { sendError("Pin not configured as OUTPUT"); return; }
-      analogWrite(pin, constrain(value, 0, PWM_MAX_VALUE));
-    } else if (type == 'S') {
-      if (pinModes[pin] != PIN_MODE_SERVO) { sendError("Pin not configured as SERVO"); return; }
-      for (int i = 0; i < numServos; i++) {
-        if (servoPins[i] == pin) {
-          servoObjects[i].write(constrain(value, 0, SERVO_MAX_ANGLE));
-          break;
+// Takes whatever has arrived without waiting for the rest: text collects in commandBuffer until '\n', and a frame
+// waits in the RX buffer until all FRAME_SIZE bytes are there
+void readSerialInput() {
+  while (Serial.available() > 0) {
+    if (commandLength == 0 && !commandOverflow && Serial.peek() == FRAME_SYNC) {
+      if (Serial.available() < FRAME_SIZE) {
+        // A frame the host never finishes is dropped, like the 1 s stream timeout of a blocking read used to
+        if (!frameWaiting) {
+          frameWaiting = true;
+          frameWaitSince = millis();
+        } else if (millis() - frameWaitSince >= FRAME_TIMEOUT_MS) {
+          while (Serial.available() > 0) Serial.read();
+          frameWaiting = false;
         }
+        return;
       }
+      frameWaiting = false;
+      processFrame();
+      continue;
+    }
+    char c = Serial.read();
+    if (c == '\n') {
+      commandBuffer[commandLength] = '\0';
+      if (commandOverflow) {
+        replySeq = -1;
+        sendError(ERR_MALFORMED_COMMAND);
+      } else {
+        processCommand(commandBuffer);
+      }
+      commandLength = 0;
+      commandOverflow = false;
+    } else if (commandLength < COMMAND_BUFFER_SIZE - 1) {
+      commandBuffer[commandLength++] = c;
+    } else {
+      commandOverflow = true;
     }
+  }
+}
+
+// Parses the command in place; the pieces are pointers into cmd, so no command allocates
+void processCommand(char *cmd) {
+  cmd = trim(cmd);
+  if (*cmd == '\0') return;
+
+  replySeq = -1;
+  if (*cmd == '#') {
+    char *space = strchr(cmd, ' ');
+    if (space == NULL) return;
+    replySeq = atol(cmd + 1);
+    cmd = trim(space + 1);
+  }
+
+  char type = cmd[0];
+  if (type == 'D' || type == 'P' || type == 'S') {
+    char *firstComma = strchr(cmd, ',');
+    char *secondComma = firstComma == NULL ? NULL : strchr(firstComma + 1, ',');
+
+    if (secondComma == NULL) { sendError(ERR_MALFORMED_COMMAND); return; }
+
+    int pin = atoi(firstComma + 1);
+    int value = atoi(secondComma + 1);
+    writeOutput(type, pin, value);
     return;
   }
 
-  cmd.toLowerCase();
+  for (char *c = cmd; *c != '\0'; c++) *c = tolower(*c);
   
-  if (cmd.startsWith("pin ")) {
-    String params = cmd.substring(4);
-    int spaceIndex = params.indexOf(' ');
-    if (spaceIndex == -1) { sendError("Malformed pin command"); return; }
+  char *params;
+  if (strncmp(cmd, "pin ", 4) == 0) {
+    configHash = 0;
+    params = trim(cmd + 4);
+    char *space = strchr(params, ' ');
+    if (space == NULL) { sendError(ERR_MALFORMED_PIN_COMMAND); return; }
 
-    int pin = parsePin(params.substring(0, spaceIndex));
-    String action = params.substring(spaceIndex + 1);
+    *space = '\0';
+    int pin = parsePin(params);
+    char *action = space + 1;
 
-    if (pin < 0 || pin >= NUM_PINS) { sendError("Invalid pin number"); return; }
+    if (pin < 0 || pin >= NUM_PINS) { sendError(ERR_INVALID_PIN_NUMBER); return; }
 
-    if (action.startsWith("mode ")) {
-      String modeStr = action.substring(5);
-      if (modeStr == "output") {
+    if (strncmp(action, "mode ", 5) == 0) {
+      char *modeStr = action + 5;
+      if (strcmp(modeStr, "output") == 0) {
         pinMode(pin, OUTPUT);
         pinModes[pin] = PIN_MODE_OUTPUT;
         sendOK();
-      } else if (modeStr == "input") {
+      } else if (strcmp(modeStr, "input") == 0) {
         pinMode(pin, INPUT);
         pinModes[pin] = PIN_MODE_INPUT;
         sendOK();
-      } else if (modeStr == "pullup") {
+      } else if (strcmp(modeStr, "pullup") == 0) {
         pinMode(pin, INPUT_PULLUP);
         pinModes[pin] = PIN_MODE_PULLUP;
         sendOK();
-      } else if (modeStr == "servo") {
-        if (pinModes[pin] != PIN_MODE_UNCONFIGURED) { sendError("Pin already in use"); return; }
-        if (numServos >= MAX_AMOUNT_SERVOS) { sendError("Max servos reached"); return; }
+      } else if (strcmp(modeStr, "servo") == 0) {
+        if (pinModes[pin] != PIN_MODE_UNCONFIGURED) { sendError(ERR_PIN_IN_USE); return; }
+        if (numServos >= MAX_AMOUNT_SERVOS) { sendError(ERR_MAX_SERVOS); return; }
         servoPins[numServos] = pin;
         servoObjects[numServos].attach(pin);
         pinModes[pin] = PIN_MODE_SERVO;
         numServos++;
         sendOK();
-      } else if (modeStr == "unconfigured") {
+      } else if (strcmp(modeStr, "unconfigured") == 0) {
         if (pinModes[pin] == PIN_MODE_SERVO) {
           for (int i = 0; i < numServos; i++) {
             if (servoPins[i] == pin) {
@@ -137,30 +336,108 @@ void processCommand(String cmd) {
         pinModes[pin] = PIN_MODE_UNCONFIGURED;
         sendOK();
       } else {
-        sendError("Invalid pin mode");
+        sendError(ERR_INVALID_PIN_MODE);
       }
-    } else if (action.startsWith("read ")) {
+    } else if (strncmp(action, "read ", 5) == 0) {
       if (pinModes[pin] != PIN_MODE_INPUT && pinModes[pin] != PIN_MODE_PULLUP) {
-        sendError("Pin not configured for input");
+        sendError(ERR_NOT_INPUT);
         return;
       }
-      String readType = action.substring(5);
-      if (readType == "digital") {
+      char *readType = action + 5;
+      char *readParams;
+      if ((readParams = afterWord(readType, "digital")) != NULL) {
+        // constrain() is a macro that evaluates its argument more than once, so each parameter is popped first
+        long debounce = nextParam(readParams, DEFAULT_DEBOUNCE_MS);
+        long periodMs = nextParam(readParams, DEFAULT_DIGITAL_PERIOD_MS);
+        debounceMs[pin] = constrain(debounce, 0L, 255L);
+        digitalPressed[pin] = false;
+        digitalRawPressed[pin] = false;
+        digitalChangedAt[pin] = millis();
+        startSampling(pin, constrain(periodMs, 0L, 65535L));
         addToList(digitalReadPins, numDigitalReadPins, pin);
-      } else if (readType == "analog") {
+      } else if ((readParams = afterWord(readType, "analog")) != NULL) {
+        analogDeadband[pin] = nextParam(readParams, -1);
+        analogMinIntervalMs[pin] = nextParam(readParams, 0);
+        analogMaxIntervalMs[pin] = nextParam(readParams, 0);
+        analogLastSent[pin] = -ADC_RANGE;
+        analogLastSentAt[pin] = millis();
+        long periodMs = nextParam(readParams, DEFAULT_ANALOG_PERIOD_MS);
+        startSampling(pin, constrain(periodMs, 0L, 65535L));
         addToList(analogReadPins, numAnalogReadPins, pin);
-      } else if (readType == "stop") {
+      } else if (strcmp(readType, "stop") == 0) {
         removeFromList(digitalReadPins, numDigitalReadPins, pin);
         removeFromList(analogReadPins, numAnalogReadPins, pin);
       }
       sendOK();
+    } else {
+      sendError(ERR_UNKNOWN_PIN_ACTION);
     }
-  } else if (cmd == "clear") {
+  } else if (strcmp(cmd, "clear") == 0) {
     clearAll();
+    configHash = 0;
     sendOK();
+  } else if (strncmp(cmd, "commit ", 7) == 0) {
+    unsigned long hash = strtoul(cmd + 7, NULL, 16);
+    if (hash == 0) { sendError(ERR_MALFORMED_COMMAND); return; }
+    saveConfig(hash);
+    sendOK();
+  } else if (strncmp(cmd, "proto ", 6) == 0) {
+    params = cmd + 6;
+    if (strcmp(params, "text") == 0) {
+      sendOK();
+      switchProtocol(false, TEXT_BAUD_RATE);
+    } else if (strncmp(params, "binary ", 7) == 0) {
+      long baudRate = atol(params + 7);
+      if (baudRate < TEXT_BAUD_RATE || baudRate > 1000000) { sendError(ERR_INVALID_BAUD_RATE); return; }
+      sendOK();
+      switchProtocol(true, baudRate);
+    } else {
+      sendError(ERR_MALFORMED_COMMAND);
+    }
+  } else {
+    sendError(ERR_UNKNOWN_COMMAND);
   }
 }
 
+void writeOutput(char type, int pin, int value) {
+  if (pin < 0 || pin >= NUM_PINS) { sendError(ERR_INVALID_PIN); return; }
+
+  if (type == 'D') {
+    if (pinModes[pin] != PIN_MODE_OUTPUT) { sendError(ERR_NOT_OUTPUT); return; }
+    digitalWrite(pin, value == 1 ? HIGH : LOW);
+  } else if (type == 'P') {
+    if (pinModes[pin] != PIN_MODE_OUTPUT) { sendError(ERR_NOT_OUTPUT); return; }
+    analogWrite(pin, constrain(value, 0, PWM_MAX_VALUE));
+  } else if (type == 'S') {
+    if (pinModes[pin] != PIN_MODE_SERVO) { sendError(ERR_NOT_SERVO); return; }
+    for (int i = 0; i < numServos; i++) {
+      if (servoPins[i] == pin) {
+        servoObjects[i].write(constrain(value, 0, SERVO_MAX_ANGLE));
+        break;
+      }
+    }
+  } else {
+    sendError(ERR_MALFORMED_COMMAND);
+  }
+}
+
+// Only called once the whole frame is in the RX buffer, so the read returns at once
+void processFrame() {
+  byte frame[FRAME_SIZE];
+  if (Serial.readBytes(frame, FRAME_SIZE) != FRAME_SIZE) return;
+  replySeq = -1;
+  if (crc8(frame + 1, FRAME_SIZE - 2) != frame[FRAME_SIZE - 1]) { sendError(ERR_CORRUPTED_FRAME); return; }
+  writeOutput((char)frame[1], frame[2], frame[3] | (frame[4] << 8));
+}
+
+void switchProtocol(bool binary, long baudRate) {
+  Serial.flush();
+  Serial.end();
+  Serial.begin(baudRate);
+  binaryMode = binary;
+  frameSeq = 0;
+}
+
 void clearAll() {
   for (int i = 0; i < numServos; i++) {
     servoObjects[i].detach();
@@ -179,19 +456,109 @@ void clearAll() {
   digitalWrite(LED_BUILTIN, LOW);
 }
 
-int parsePin(String pinStr) {
-    pinStr.trim();
-    pinStr.toUpperCase();
-    if (pinStr.startsWith("A")) {
-        int n = pinStr.substring(1).toInt();
+bool inList(const int list[], int count, int value) {
+    for (int i = 0; i < count; i++) {
+        if (list[i] == value) return true;
+    }
+    return false;
+}
+
+void saveConfig(unsigned long hash) {
+    StoredConfig config;
+    memset(&config, 0, sizeof(config));
+    config.magic = CONFIG_MAGIC;
+    config.hash = hash;
+    for (int pin = 0; pin < NUM_PINS; pin++) {
+        StoredPin &stored = config.pins[pin];
+        stored.mode = pinModes[pin];
+        if (inList(digitalReadPins, numDigitalReadPins, pin)) stored.read = READ_DIGITAL;
+        else if (inList(analogReadPins, numAnalogReadPins, pin)) stored.read = READ_ANALOG;
+        else stored.read = READ_NONE;
+        stored.debounceMs = debounceMs[pin];
+        stored.deadband = analogDeadband[pin];
+        stored.minIntervalMs = analogMinIntervalMs[pin];
+        stored.maxIntervalMs = analogMaxIntervalMs[pin];
+        stored.samplePeriodMs = samplePeriodMs[pin];
+    }
+    config.crc = crc8((const byte *)&config, offsetof(StoredConfig, crc));
+    // put() only writes the bytes that changed, so committing an unchanged setup costs no EEPROM wear
+    EEPROM.put(0, config);
+    configHash = hash;
+}
+
+void restoreConfig() {
+    StoredConfig config;
+    EEPROM.get(0, config);
+    if (config.magic != CONFIG_MAGIC || crc8((const byte *)&config, offsetof(StoredConfig, crc)) != config.crc) return;
+    unsigned long now = millis();
+    for (int pin = 0; pin < NUM_PINS; pin++) {
+        StoredPin &stored = config.pins[pin];
+        if (stored.mode == PIN_MODE_OUTPUT) pinMode(pin, OUTPUT);
+        else if (stored.mode == PIN_MODE_INPUT) pinMode(pin, INPUT);
+        else if (stored.mode == PIN_MODE_PULLUP) pinMode(pin, INPUT_PULLUP);
+        else if (stored.mode == PIN_MODE_SERVO && numServos < MAX_AMOUNT_SERVOS) {
+            servoPins[numServos] = pin;
+            servoObjects[numServos].attach(pin);
+            numServos++;
+        } else continue;
+        pinModes[pin] = stored.mode;
+        debounceMs[pin] = stored.debounceMs;
+        analogDeadband[pin] = stored.deadband;
+        analogMinIntervalMs[pin] = stored.minIntervalMs;
+        analogMaxIntervalMs[pin] = stored.maxIntervalMs;
+        digitalPressed[pin] = false;
+        digitalRawPressed[pin] = false;
+        digitalChangedAt[pin] = now;
+        analogLastSent[pin] = -ADC_RANGE;
+        analogLastSentAt[pin] = now;
+        startSampling(pin, stored.samplePeriodMs);
+        if (stored.read == READ_DIGITAL) addToList(digitalReadPins, numDigitalReadPins, pin);
+        else if (stored.read == READ_ANALOG) addToList(analogReadPins, numAnalogReadPins, pin);
+    }
+    configHash = config.hash;
+}
+
+// Pops the next space-separated integer off params, or returns defaultValue when there is none
+long nextParam(char *&params, long defaultValue) {
+    while (*params == ' ') params++;
+    if (*params == '\0') return defaultValue;
+    long value = atol(params);
+    while (*params != '\0' && *params != ' ') params++;
+    return value;
+}
+
+// Text past word when text is word alone or word followed by a space, otherwise NULL
+char *afterWord(char *text, const char *word) {
+    size_t length = strlen(word);
+    if (strncmp(text, word, length) != 0 || (text[length] != '\0' && text[length] != ' ')) return NULL;
+    return text + length;
+}
+
+// Strips leading and trailing whitespace (including the '\r' of a CRLF line ending) in place
+char *trim(char *text) {
+    while (isspace(*text)) text++;
+    char *end = text + strlen(text);
+    while (end > text && isspace(end[-1])) *--end = '\0';
+    return text;
+}
+
+int parsePin(char *pinStr) {
+    pinStr = trim(pinStr);
+    if (toupper(pinStr[0]) == 'A') {
+        int n = atoi(pinStr + 1);
         if (n >= 0 && n <= 5) return A0 + n;
     } else {
-        return pinStr.toInt();
+        return atoi(pinStr);
     }
     return -1;
 }
 
-void sendPinCode(int pin) {
+void sendDigitalEdge(int pin, bool pressed) {
+    if (binaryMode) {
+        sendFrame(FRAME_DIGITAL, pin, pressed ? 1 : 0);
+        return;
+    }
+    Serial.print(pressed ? "+" : "-");
     if (pin >= A0 && pin <= A5) {
         Serial.print("A");
         Serial.println(pin - A0);
@@ -201,6 +568,10 @@ void sendPinCode(int pin) {
 }
 
 void sendAnalogValue(int pin, int value) {
+    if (binaryMode) {
+        sendFrame(FRAME_ANALOG, pin, value);
+        return;
+    }
     if (pin >= A0 && pin <= A5) {
         Serial.print("A");
         Serial.print(pin - A0);
@@ -234,5 +605,45 @@ void removeFromList(int list[], int &count, int value) {
     }
 }
 
-void sendOK(){ Serial.println("OK"); }
-void sendError(String err){ Serial.print("ERROR: "); Serial.println(err); }
\ No newline at end of file
+byte crc8(const byte *data, int length) {
+    byte crc = 0;
+    for (int i = 0; i < length; i++) {
+        crc ^= data[i];
+        for (int bit = 0; bit < 8; bit++) {
+            crc = (crc & 0x80) ? (crc << 1) ^ 0x07 : (crc << 1);
+        }
+    }
+    return crc;
+}
+
+void sendFrame(char type, int pin, unsigned int value) {
+    byte frame[FRAME_SIZE];
+    frame[0] = FRAME_SYNC;
+    frame[1] = type;
+    frame[2] = pin;
+    frame[3] = value & 0xFF;
+    frame[4] = value >> 8;
+    frame[5] = frameSeq++;
+    frame[6] = crc8(frame + 1, FRAME_SIZE - 2);
+    Serial.write(frame, FRAME_SIZE);
+}
+
+void sendReplyTag() {
+    if (replySeq < 0) return;
+    Serial.print("#");
+    Serial.print(replySeq);
+    Serial.print(" ");
+}
+
+void sendOK() {
+    if (binaryMode) { sendFrame(FRAME_OK, 0, replySeq < 0 ? 0 : replySeq); return; }
+    sendReplyTag();
+    Serial.println("OK");
+}
+
+void sendError(byte code) {
+    if (binaryMode) { sendFrame(FRAME_ERROR, code, replySeq < 0 ? 0 : replySeq); return; }
+    sendReplyTag();
+    Serial.print("ERROR: ");
+    Serial.println(ERROR_MESSAGES[code]);
+}
\ No newline at end of file
@@ -0,0 +1,183 @@
+// Host stand-in for the parts of the Arduino core that arduino-uno.ino uses, so the firmware can be compiled and run
+// on a PC (see firmware_bench.cpp). Time is simulated: the clock only moves when the firmware does something that takes
+// time on an Uno (an ADC conversion, a serial byte at the current baud rate, an EEPROM write) or when the host calls
+// host::advance(). Serial input is scheduled with Serial.feed() and reaches the 64-byte RX buffer at the baud rate.
+#pragma once
+
+#include <stdint.h>
+#include <stddef.h>
+#include <stdio.h>
+#include <stdlib.h>
+#include <math.h>
+#include <string.h>
+#include <ctype.h>
+#include <deque>
+#include <vector>
+
+typedef uint8_t byte;
+
+#define HIGH 1
+#define LOW 0
+#define INPUT 0
+#define OUTPUT 1
+#define INPUT_PULLUP 2
+#define LED_BUILTIN 13
+#define DEC 10
+#define HEX 16
+#define constrain(amt, low, high) ((amt) < (low) ? (low) : ((amt) > (high) ? (high) : (amt)))
+
+static const uint8_t A0 = 14, A1 = 15, A2 = 16, A3 = 17, A4 = 18, A5 = 19;
+
+// Approximate Uno costs in µs
+#define HOST_ANALOG_READ_US 112
+#define HOST_DIGITAL_IO_US 4
+#define HOST_SERIAL_CALL_US 1
+#define HOST_EEPROM_WRITE_US 3300
+#define HOST_RX_BUFFER_SIZE 64
+#define HOST_TX_BUFFER_SIZE 64
+#define HOST_NUM_PINS 20
+
+namespace host {
+  struct PinEvent { uint64_t time; uint8_t pin; int value; };
+
+  uint64_t clock = 0;
+  uint8_t modes[HOST_NUM_PINS];
+  int levels[HOST_NUM_PINS];
+  int analogValues[6];
+  std::vector<PinEvent> analogReads, digitalReads, digitalWrites;
+
+  inline void advance(uint64_t us) { clock += us; }
+
+  inline void reset() {
+    for (int pin = 0; pin < HOST_NUM_PINS; pin++) { modes[pin] = INPUT; levels[pin] = HIGH; }
+    for (int i = 0; i < 6; i++) analogValues[i] = 0;
+    analogReads.clear(); digitalReads.clear(); digitalWrites.clear();
+  }
+}
+
+inline unsigned long millis() { return host::clock / 1000; }
+inline unsigned long micros() { return host::clock; }
+inline void delay(unsigned long ms) { host::advance(ms * 1000); }
+
+inline void pinMode(uint8_t pin, uint8_t mode) { host::modes[pin] = mode; }
+
+inline int digitalRead(uint8_t pin) {
+  host::advance(HOST_DIGITAL_IO_US);
+  host::digitalReads.push_back({host::clock, pin, host::levels[pin]});
+  return host::levels[pin];
+}
+
+inline void digitalWrite(uint8_t pin, uint8_t value) {
+  host::advance(HOST_DIGITAL_IO_US);
+  host::digitalWrites.push_back({host::clock, pin, value});
+}
+
+inline void analogWrite(uint8_t pin, int value) { digitalWrite(pin, value); }
+
+inline int analogRead(uint8_t pin) {
+  host::advance(HOST_ANALOG_READ_US);
+  int value = host::analogValues[pin - A0];
+  host::analogReads.push_back({host::clock, pin, value});
+  return value;
+}
+
+class HostSerial {
+ public:
+  // Host side: bytes sent to the board with the time they arrive, RX overflow, and bytes from the board with the time
+  // their transmission completes
+  std::deque<std::pair<uint64_t, uint8_t> > wire;
+  std::deque<uint8_t> rx;
+  size_t rxDropped = 0;
+  std::vector<std::pair<uint64_t, uint8_t> > sent;
+
+  void begin(long baudRate) { byteTime = 10000000.0 / baudRate; }
+  void end() {}
+
+  // Schedules data to start arriving at time at; returns when its last byte arrives
+  uint64_t feed(const void *data, size_t length, uint64_t at) {
+    const uint8_t *bytes = (const uint8_t *)data;
+    double arrival = at > wireFreeAt ? (double)at : wireFreeAt;
+    for (size_t i = 0; i < length; i++) {
+      arrival += byteTime;
+      wire.push_back(std::make_pair((uint64_t)arrival, bytes[i]));
+    }
+    wireFreeAt = arrival;
+    return (uint64_t)arrival;
+  }
+  uint64_t feed(const char *text, uint64_t at) { return feed(text, strlen(text), at); }
+
+  int available() { receive(); return (int)rx.size(); }
+  int peek() { receive(); return rx.empty() ? -1 : rx.front(); }
+  int read() {
+    receive();
+    if (rx.empty()) return -1;
+    host::advance(HOST_SERIAL_CALL_US);
+    uint8_t value = rx.front();
+    rx.pop_front();
+    return value;
+  }
+
+  // Like the core's: waits up to the 1 s stream timeout for the rest
+  size_t readBytes(byte *buffer, size_t length) {
+    uint64_t deadline = host::clock + 1000000;
+    size_t count = 0;
+    while (count < length) {
+      int value = read();
+      if (value >= 0) { buffer[count++] = value; continue; }
+      if (wire.empty() || wire.front().first > deadline) { host::clock = deadline; break; }
+      host::clock = wire.front().first;
+    }
+    return count;
+  }
+
+  size_t write(uint8_t value) {
+    // A full TX buffer blocks until the oldest byte has gone out
+    drain();
+    if (pending.size() >= HOST_TX_BUFFER_SIZE) { host::clock = pending.front(); drain(); }
+    host::advance(HOST_SERIAL_CALL_US);
+    txFreeAt = (txFreeAt > host::clock ? txFreeAt : (double)host::clock) + byteTime;
+    pending.push_back((uint64_t)txFreeAt);
+    sent.push_back(std::make_pair((uint64_t)txFreeAt, value));
+    return 1;
+  }
+  size_t write(const uint8_t *data, size_t length) {
+    for (size_t i = 0; i < length; i++) write(data[i]);
+    return length;
+  }
+  void flush() {
+    if (!pending.empty() && pending.back() > host::clock) host::clock = pending.back();
+    drain();
+  }
+
+  size_t print(const char *text) { return write((const uint8_t *)text, strlen(text)); }
+  size_t print(char value) { return write((uint8_t)value); }
+  size_t print(long value, int base = DEC) { return printNumber(base == HEX ? "%lX" : "%ld", value); }
+  size_t print(int value, int base = DEC) { return print((long)value, base); }
+  size_t print(unsigned long value, int base = DEC) { return printNumber(base == HEX ? "%lX" : "%lu", value); }
+  size_t print(unsigned int value, int base = DEC) { return print((unsigned long)value, base); }
+  template <typename T> size_t println(T value) { return print(value) + print("\r\n"); }
+  template <typename T> size_t println(T value, int base) { return print(value, base) + print("\r\n"); }
+
+ private:
+  double byteTime = 10000000.0 / 9600;
+  double wireFreeAt = 0, txFreeAt = 0;
+  std::deque<uint64_t> pending;
+
+  void receive() {
+    while (!wire.empty() && wire.front().first <= host::clock) {
+      if (rx.size() < HOST_RX_BUFFER_SIZE) rx.push_back(wire.front().second);
+      else rxDropped++;
+      wire.pop_front();
+    }
+  }
+  void drain() {
+    while (!pending.empty() && pending.front() <= host::clock) pending.pop_front();
+  }
+  template <typename T> size_t printNumber(const char *format, T value) {
+    char text[24];
+    snprintf(text, sizeof(text), format, value);
+    return print(text);
+  }
+};
+
+HostSerial Serial;
@@ -0,0 +1,31 @@
+// Host stand-in for the EEPROM library: 1 KB starting erased (0xFF); put() writes only changed bytes and each one
+// costs an Uno's EEPROM write time
+#pragma once
+
+#include "Arduino.h"
+
+class EEPROMClass {
+ public:
+  uint8_t data[1024];
+  size_t writes = 0;
+
+  EEPROMClass() { memset(data, 0xFF, sizeof(data)); }
+
+  template <typename T> T &get(int address, T &value) {
+    memcpy(&value, data + address, sizeof(T));
+    return value;
+  }
+
+  template <typename T> const T &put(int address, const T &value) {
+    const uint8_t *bytes = (const uint8_t *)&value;
+    for (size_t i = 0; i < sizeof(T); i++) {
+      if (data[address + i] == bytes[i]) continue;
+      data[address + i] = bytes[i];
+      writes++;
+      host::advance(HOST_EEPROM_WRITE_US);
+    }
+    return value;
+  }
+};
+
+EEPROMClass EEPROM;
@@ -0,0 +1,15 @@
+// Host stand-in for the Servo library: remembers the pin and the last angle
+#pragma once
+
+#include "Arduino.h"
+
+class Servo {
+ public:
+  uint8_t attach(int pin) { attachedPin = pin; return 1; }
+  void detach() { attachedPin = -1; }
+  void write(int value) { angle = value; }
+  bool attached() { return attachedPin >= 0; }
+
+  int attachedPin = -1;
+  int angle = 0;
+};
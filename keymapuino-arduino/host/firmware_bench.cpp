@@ -0,0 +1,160 @@
+// Throughput and timing of arduino-uno.ino, compiled for the host against the stand-in core in this directory:
+//   c++ -std=c++11 -O2 -I keymapuino-arduino/host -o firmware_bench keymapuino-arduino/host/firmware_bench.cpp
+// Time is simulated (see Arduino.h), so the results are deterministic. Prints one JSON object of metrics;
+// keymapuino-bench/bench.py runs this as its "firmware" scenario.
+#include "Arduino.h"
+#include "../arduino-uno.ino"
+
+#include <algorithm>
+
+// One pass of loop() with nothing due, on an Uno
+#define LOOP_PASS_US 10
+#define BENCH_BAUD_RATE 115200
+#define COMMANDS 4000
+#define EDGE_TRIALS 50
+
+struct Frame { uint64_t time; char type; int pin; int value; };
+
+size_t sentIndex = 0;
+
+void runUntil(uint64_t end) {
+  while (host::clock < end) {
+    loop();
+    host::advance(LOOP_PASS_US);
+  }
+}
+
+void send(const char *text) { Serial.feed(text, host::clock); }
+
+// Frames the board finished sending since the last call
+std::vector<Frame> newFrames() {
+  std::vector<Frame> frames;
+  std::vector<std::pair<uint64_t, uint8_t> > &sent = Serial.sent;
+  while (sentIndex + FRAME_SIZE <= sent.size()) {
+    if (sent[sentIndex].second != FRAME_SYNC) { sentIndex++; continue; }
+    byte frame[FRAME_SIZE];
+    for (int i = 0; i < FRAME_SIZE; i++) frame[i] = sent[sentIndex + i].second;
+    if (crc8(frame + 1, FRAME_SIZE - 2) != frame[FRAME_SIZE - 1]) { sentIndex++; continue; }
+    frames.push_back({sent[sentIndex + FRAME_SIZE - 1].first, (char)frame[1], frame[2], frame[3] | (frame[4] << 8)});
+    sentIndex += FRAME_SIZE;
+  }
+  return frames;
+}
+
+// A freshly reset board switched to binary framing, with pullup buttons on pins 2.. and the first analog pins reporting every sample
+void boot(int digitalPins, int analogPins) {
+  host::reset();
+  Serial = HostSerial();
+  sentIndex = 0;
+  setup();
+  send("proto binary 115200\n");
+  runUntil(host::clock + 50000);
+  char line[32];
+  for (int pin = 2; pin < 2 + digitalPins; pin++) {
+    snprintf(line, sizeof(line), "pin %d mode pullup\n", pin); send(line);
+    snprintf(line, sizeof(line), "pin %d read digital\n", pin); send(line);
+  }
+  for (int i = 0; i < analogPins; i++) {
+    snprintf(line, sizeof(line), "pin A%d mode input\n", i); send(line);
+    snprintf(line, sizeof(line), "pin A%d read analog\n", i); send(line);
+  }
+  runUntil(host::clock + 100000);
+  newFrames();
+}
+
+double percentile(std::vector<double> values, double fraction) {
+  if (values.empty()) return 0;
+  std::sort(values.begin(), values.end());
+  return values[std::min(values.size() - 1, (size_t)(fraction * values.size()))];
+}
+
+// Gaps between consecutive reads of each pin after start
+std::vector<double> readGaps(const std::vector<host::PinEvent> &reads, uint64_t start) {
+  std::vector<double> gaps;
+  uint64_t last[HOST_NUM_PINS] = {0};
+  for (size_t i = 0; i < reads.size(); i++) {
+    const host::PinEvent &read = reads[i];
+    if (read.time < start) continue;
+    if (last[read.pin]) gaps.push_back(read.time - last[read.pin]);
+    last[read.pin] = read.time;
+  }
+  return gaps;
+}
+
+double maxOf(const std::vector<double> &values) { return values.empty() ? 0 : *std::max_element(values.begin(), values.end()); }
+
+int main() {
+  // Output commands streamed at line rate while 8 buttons are held and 6 analog pins report every sample
+  boot(8, 6);
+  for (int pin = 2; pin < 10; pin++) host::levels[pin] = LOW;
+  uint64_t start = host::clock;
+  std::vector<uint64_t> arrivals;
+  for (int i = 0; i < COMMANDS; i++) arrivals.push_back(Serial.feed(i % 2 ? "D,13,0\n" : "D,13,1\n", start));
+  runUntil(arrivals.back() + 50000);
+  std::vector<double> latencies;
+  size_t written = 0;
+  uint64_t lastWrite = start;
+  for (size_t i = 0; i < host::digitalWrites.size(); i++) {
+    const host::PinEvent &write = host::digitalWrites[i];
+    if (write.time < start || write.pin != 13 || written >= arrivals.size()) continue;
+    latencies.push_back(write.time - arrivals[written++]);
+    lastWrite = write.time;
+  }
+  double commandsPerSecond = written / ((lastWrite - start) / 1e6);
+  std::vector<double> analogJitter = readGaps(host::analogReads, start);
+  for (size_t i = 0; i < analogJitter.size(); i++) analogJitter[i] = fabs(analogJitter[i] - DEFAULT_ANALOG_PERIOD_MS * 1000.0);
+  double digitalGapMax = maxOf(readGaps(host::digitalReads, start));
+  size_t rxDropped = Serial.rxDropped;
+
+  // Press-to-frame latency on pin 2 with no other button held and with 8 held
+  double edgeLatency[2] = {0, 0};
+  for (int held = 0; held < 2; held++) {
+    boot(9, 6);
+    for (int pin = 3; pin < 3 + held * 8; pin++) host::levels[pin] = LOW;
+    runUntil(host::clock + 50000);
+    newFrames();
+    std::vector<double> trial;
+    for (int i = 0; i < EDGE_TRIALS; i++) {
+      runUntil(host::clock + 1000 + (i * 7919) % 5000);
+      uint64_t pressedAt = host::clock;
+      host::levels[2] = LOW;
+      bool seen = false;
+      while (!seen && host::clock < pressedAt + 100000) {
+        runUntil(host::clock + 100);
+        std::vector<Frame> frames = newFrames();
+        for (size_t f = 0; f < frames.size(); f++) {
+          if (frames[f].type == FRAME_DIGITAL && frames[f].pin == 2 && frames[f].value == 1) { trial.push_back(frames[f].time - pressedAt); seen = true; }
+        }
+      }
+      host::levels[2] = HIGH;
+      runUntil(host::clock + 30000);
+      newFrames();
+    }
+    edgeLatency[held] = maxOf(trial) / 1000.0;
+  }
+
+  // Sampling while a command line and then a binary frame arrive only in part; a command after the dropped frame still gets its reply
+  boot(0, 6);
+  start = host::clock;
+  send("pin 2 read");
+  runUntil(host::clock + 500000);
+  send("\n");
+  runUntil(host::clock + 20000);
+  const uint8_t partialFrame[] = {FRAME_SYNC, FRAME_DIGITAL, 13};
+  Serial.feed(partialFrame, sizeof(partialFrame), host::clock);
+  runUntil(host::clock + 500000);
+  newFrames();
+  send("clear\n");
+  runUntil(host::clock + 20000);
+  std::vector<Frame> frames = newFrames();
+  bool answered = false;
+  for (size_t f = 0; f < frames.size(); f++) answered = answered || frames[f].type == FRAME_OK;
+  double partialGapMax = maxOf(readGaps(host::analogReads, start)) / 1000.0;
+
+  printf("{\"commands_per_s\": %.1f, \"command_latency_p99_us\": %.0f, \"rx_dropped_bytes\": %u, "
+         "\"analog_jitter_p99_us\": %.0f, \"analog_jitter_max_us\": %.0f, \"digital_gap_max_us\": %.0f, "
+         "\"edge_max_ms\": %.3f, \"edge_8_held_max_ms\": %.3f, \"partial_input_gap_ms\": %.3f, \"lost_replies\": %d}\n",
+         commandsPerSecond, percentile(latencies, 0.99), (unsigned)rxDropped, percentile(analogJitter, 0.99), maxOf(analogJitter),
+         digitalGapMax, edgeLatency[0], edgeLatency[1], partialGapMax, answered ? 0 : 1);
+  return 0;
+}
@@ -0,0 +1,468 @@
+import os
+import sys
+import json
+import time
+import shutil
+import tempfile
+import socket
+import struct
+import argparse
+import subprocess
+import threading
+import importlib.util
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BENCH_DIR)
+from emulator import ArduinoEmulator, sine, ladder
+
+CLI_PATH = os.path.join(BENCH_DIR, "..", "keymapuino-cli", "keymapuino-cli.py")
+sys.path.insert(1, os.path.dirname(CLI_PATH))
+from scope import SCOPE_FRAME, ScopeTrace
+PLUGINS_DIR = os.path.join(BENCH_DIR, "..", "plugins")
+FIRMWARE_BENCH_PATH = os.path.join(BENCH_DIR, "..", "keymapuino-arduino", "host", "firmware_bench.cpp")
+BASELINES_PATH = os.path.join(BENCH_DIR, "baselines.json")
+# Absolute slack per metric suffix, so that sub-millisecond noise on a fast machine is not reported as a regression;
+# per-sample costs of a few µs move by as much again with the CPU's frequency and cache state
+ABSOLUTE_SLACK = {'_ms': 2.0, '_pct': 2.0, '_us_per_sample': 5.0}
+# Tail latencies, whose runs spread by several ms on a loaded machine: --update stores the widest their runs were apart,
+# and that spread is allowed on top of the baseline
+TAIL_SUFFIX = '_p99_ms'
+
+def load_cli():
+    spec = importlib.util.spec_from_file_location("keymapuino_cli", CLI_PATH)
+    module = importlib.util.module_from_spec(spec); spec.loader.exec_module(module)
+    return module
+
+def percentile(values, fraction):
+    if not values: return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+def ms(seconds): return round(seconds * 1000, 3)
+
+class Session:
+    # One emulator per board plus one KeymapuinoCLI running its main loop on a background thread;
+    # key_mapping is either one mapping or a list with one mapping per board; eeproms carries the boards' stored setups across sessions
+    def __init__(self, cli, key_mapping, protocol='binary', boot_delay=0.2, eeproms=None, plugins=(), plugins_dir=None, record=None, scope_port=None, chords=()):
+        self.cli = cli; self.protocol = protocol; self.plugins = list(plugins); self.plugins_dir = plugins_dir; self.record = record; self.scope_port = scope_port
+        self.chords = list(chords)
+        self.key_mappings = key_mapping if isinstance(key_mapping, list) else [key_mapping]
+        eeproms = eeproms or [None] * len(self.key_mappings)
+        self.emulators = [ArduinoEmulator(boot_delay=boot_delay, eeprom=eeprom) for eeprom in eeproms]; self.emulator = self.emulators[0]
+        self.keyboard = cli.RecordingKeyboard()
+    def __enter__(self):
+        ports = [emulator.listen() for emulator in self.emulators]
+        if len(ports) == 1: config = {"port": ports[0], "key_mapping": self.key_mappings[0], "plugins": self.plugins, "chords": self.chords}
+        else: config = {"devices": [{"name": f"b{board}", "port": port, "key_mapping": mapping} for board, (port, mapping) in enumerate(zip(ports, self.key_mappings))], "plugins": self.plugins}
+        handle, self.config_path = tempfile.mkstemp(suffix=".json")
+        with os.fdopen(handle, 'w') as config_file: json.dump(config, config_file)
+        self.app = self.cli.KeymapuinoCLI(self.config_path, log_level=0, protocol=self.protocol, keyboard=self.keyboard, plugins_dir=self.plugins_dir, record=self.record,
+                                          scope_port=self.scope_port)
+        self.thread = threading.Thread(target=self._run, name="keymapuino-cli", daemon=True); self.thread.start()
+        deadline = time.monotonic() + 10
+        while self.app.startup_time is None:
+            if time.monotonic() > deadline: raise RuntimeError("CLI did not finish configuring the emulator")
+            time.sleep(0.005)
+        return self
+    def _run(self):
+        try: self.app.main_loop()
+        except SystemExit: pass
+    def __exit__(self, *exc):
+        self.app.running = False; self.thread.join(5)
+        for emulator in self.emulators: emulator.stop()
+        os.remove(self.config_path)
+    def emulator_cpu_time(self): return sum(emulator.cpu_time() for emulator in self.emulators)
+    def cpu_start(self): self._cpu = (time.monotonic(), time.process_time(), self.emulator_cpu_time())
+    def cpu_percent(self):
+        # Process CPU minus the emulators' own threads, as a percentage of one core
+        wall, process, emulators = self._cpu
+        return round(((time.process_time() - process) - (self.emulator_cpu_time() - emulators)) / (time.monotonic() - wall) * 100, 2)
+
+def sleep_until(deadline):
+    delay = deadline - time.monotonic()
+    if delay > 0: time.sleep(delay)
+
+def bench_startup(cli, duration):
+    mapping = {str(pin): {"key": key} for pin, key in zip(range(2, 8), "abcdef")}; results = {}
+    for name, boards in (('startup_ms', 1), ('startup_4_boards_ms', 4)):
+        times = []
+        for _ in range(3):
+            with Session(cli, [mapping] * boards, boot_delay=0) as session: times.append(session.app.startup_time)
+        results[name] = ms(min(times))
+    # A board that already stored this setup in its EEPROM is only switched to the binary protocol
+    times = []
+    for _ in range(3):
+        eeproms = [{}]
+        with Session(cli, mapping, boot_delay=0, eeproms=eeproms): pass
+        with Session(cli, mapping, boot_delay=0, eeproms=eeproms) as session: times.append(session.app.startup_time)
+    results['startup_stored_ms'] = ms(min(times))
+    return results
+
+def bench_digital(cli, duration, protocol='binary', boards=1):
+    pins = ("2", "3", "4", "5")
+    # Every board gets keys of its own, so the latency of each edge can be told apart
+    mappings = [{pin: {"key": chr(ord('a') + board * len(pins) + index)} for index, pin in enumerate(pins)} for board in range(boards)]
+    with Session(cli, mappings, protocol) as session:
+        inputs = [(emulator, pin) for pin in pins for emulator in session.emulators]
+        session.cpu_start(); start = time.monotonic(); step = 0.05 / boards; hold = 0.06; releases = []
+        for index in range(int(duration / step)):
+            at = start + index * step
+            while releases and releases[0][0] <= at: sleep_until(releases[0][0]); emulator, pin = releases.pop(0)[1]; emulator.release(pin)
+            sleep_until(at); emulator, pin = inputs[index % len(inputs)]; emulator.press(pin); releases.append((at + hold, (emulator, pin)))
+        for at, (emulator, pin) in releases: sleep_until(at); emulator.release(pin)
+        time.sleep(0.2)
+        cpu = session.cpu_percent(); elapsed = time.monotonic() - start
+        press, release, missed = [], [], 0
+        for emulator, mapping in zip(session.emulators, mappings):
+            for pin, entry in mapping.items():
+                edges = [(t, pressed) for t, edge_pin, pressed in emulator.edges if edge_pin == pin]
+                typed = [(t, pressed) for t, pressed, typed_key in session.keyboard.events if typed_key == entry["key"]]
+                missed += abs(len(edges) - len(typed))
+                for (edge_time, pressed), (typed_time, _) in zip(edges, typed): (press if pressed else release).append(typed_time - edge_time)
+    return {'edges_per_s': round((len(press) + len(release)) / elapsed, 1), 'press_p50_ms': ms(percentile(press, 0.5)), 'press_p99_ms': ms(percentile(press, 0.99)),
+            'release_p99_ms': ms(percentile(release, 0.99)), 'missed_edges': missed, 'cpu_pct': cpu}
+
+def bench_digital_text(cli, duration): return bench_digital(cli, duration, 'text')
+
+def bench_boards(cli, duration): return bench_digital(cli, duration, boards=4)
+
+def bench_framing(cli, duration):
+    # Round trips of the binary codec: press/release frames for four keys with line noise, a corrupted copy of a frame and
+    # a frame cut short (the next one has to be found inside its 7 bytes) mixed in, decoded from odd-sized chunks and then
+    # sent by the emulator in pieces through the real link. Each mismatch counts a frame recovered wrongly, lost or
+    # invented, and any difference in the CRC errors or lost frames
+    mapping = {pin: {"key": key} for pin, key in zip(("2", "3", "4", "5"), "abcd")}
+    with Session(cli, mapping) as session:
+        controller = session.app.controller; emulator = session.emulator; seq = emulator.frame_seq
+        frames = [('D', 2 + index // 2 % 4, 1 - index % 2, (seq + index) & 0xFF) for index in range(64)]
+        corrupted = bytearray(controller.encode_frame('D', 2, 1)); corrupted[-1] ^= 0x5A
+        stream = bytearray()
+        for index, frame in enumerate(frames):
+            if index == 20: stream += corrupted
+            if index == 30: stream += controller.encode_frame('D', 3, 1)[:4]
+            if index == 40: stream += b"\x00\xff\x13"
+            stream += controller.encode_frame(*frame)
+        chunks = []; offset = 0
+        while offset < len(stream): size = (1, 2, 3, 5, 8, 13)[len(chunks) % 6]; chunks.append(bytes(stream[offset:offset + size])); offset += size
+        errors = controller.crc_errors; buffer = bytearray(); decoded = []
+        for chunk in chunks: buffer += chunk; decoded += controller.decode_frames(buffer)
+        codec = sum(a != b for a, b in zip(frames, decoded)) + abs(len(frames) - len(decoded)) + abs(controller.crc_errors - errors - 2)
+        errors = controller.crc_errors; lost = controller.frames_lost
+        for chunk in chunks: emulator.send_raw(chunk); time.sleep(0.001)
+        expected = [(value == 1, mapping[str(pin)]["key"]) for _, pin, value, _ in frames]
+        deadline = time.monotonic() + 2
+        while len(session.keyboard.events) < len(expected) and time.monotonic() < deadline: time.sleep(0.01)
+        typed = [(pressed, key) for _, pressed, key in session.keyboard.events]
+        loopback = sum(a != b for a, b in zip(expected, typed)) + abs(len(expected) - len(typed)) + abs(controller.crc_errors - errors - 2) + controller.frames_lost - lost
+        # Decoding throughput on a long clean stream read in 4 KB pieces
+        stream = b"".join(controller.encode_frame('A', 14 + index % 6, index % 1024, index) for index in range(60000)); buffer = bytearray(); count = 0
+        start = time.perf_counter()
+        for offset in range(0, len(stream), 4096): buffer += stream[offset:offset + 4096]; count += len(controller.decode_frames(buffer))
+        elapsed = time.perf_counter() - start
+    return {'codec_mismatches': codec, 'loopback_mismatches': loopback, 'decode_frames_per_s': round(count / elapsed)}
+
+def bench_analog(cli, duration):
+    bands = ((0, 300), (700, 1023)); mapping = {}; keys = {}
+    for pin in range(6):
+        mapping[f"A{pin}"] = [{"key": f"{pin}{band}", "threshold": list(bands[band])} for band in range(len(bands))]
+        for band in range(len(bands)): keys[f"{pin}{band}"] = (f"A{pin}", bands[band])
+    with Session(cli, mapping) as session:
+        emulator = session.emulator
+        for pin in range(6): emulator.set_waveform(f"A{pin}", sine(period=0.5, phase=pin / 6))
+        time.sleep(0.3); session.cpu_start(); lines = session.app.controller.lines_received; start = time.monotonic()
+        time.sleep(duration)
+        cpu = session.cpu_percent(); lines = session.app.controller.lines_received - lines; elapsed = time.monotonic() - start
+        for pin in range(6): emulator.set_analog(f"A{pin}", 500)
+        time.sleep(0.2)
+        samples = {}; latencies = []
+        for sample_time, pin, value in emulator.samples: samples.setdefault(pin, []).append((sample_time, value))
+        for t, pressed, key in session.keyboard.events:
+            pin, (low, high) = keys[key]
+            # A key event is caused by the first sample of the run of samples on its side of the band that precedes it
+            cause = None
+            for sample_time, value in samples.get(pin, ()):
+                if sample_time > t: break
+                if (low <= value <= high) != pressed: cause = None
+                elif cause is None: cause = sample_time
+            if cause is not None: latencies.append(t - cause)
+    return {'samples_per_s': round(lines / elapsed, 1), 'key_p50_ms': ms(percentile(latencies, 0.5)), 'key_p99_ms': ms(percentile(latencies, 0.99)), 'cpu_pct': cpu}
+
+def bench_scope(cli, duration):
+    # Six analog sines with the scope port open: CLI CPU without and with a client draining the stream, the share of the
+    # handled samples that reached the client, and the client's decimation and redraw cost on the captured stream
+    mapping = {f"A{pin}": [{"key": f"{pin}0", "threshold": [0, 300]}, {"key": f"{pin}1", "threshold": [700, 1023]}] for pin in range(6)}
+    with socket.socket() as probe: probe.bind(('127.0.0.1', 0)); port = probe.getsockname()[1]
+    with Session(cli, mapping, scope_port=port) as session:
+        for pin in range(6): session.emulator.set_waveform(f"A{pin}", sine(period=0.5, phase=pin / 6))
+        time.sleep(0.3); session.cpu_start(); time.sleep(duration / 2); cpu_off = session.cpu_percent()
+        # Samples are only collected while a client is connected, and every send is whole frames, so the stream parses from its start
+        stream = bytearray(); client = socket.create_connection(('127.0.0.1', port))
+        lines = session.app.controller.lines_received; session.cpu_start()
+        def drain():
+            try:
+                while chunk := client.recv(65536): stream.extend(chunk)
+            except OSError: pass
+        reader = threading.Thread(target=drain, daemon=True); reader.start()
+        time.sleep(duration / 2)
+        cpu_on = session.cpu_percent(); lines = session.app.controller.lines_received - lines
+        client.shutdown(socket.SHUT_RDWR); reader.join(1); client.close()
+    traces = {}; samples = 0; decimate = 0.0; offset = 0; header = SCOPE_FRAME.size
+    while offset + header <= len(stream):
+        name_length, count, sent = SCOPE_FRAME.unpack_from(stream, offset)
+        values_offset = offset + header + name_length; offset = values_offset + 2 * count
+        if offset > len(stream): break
+        values = struct.unpack_from(f'<{count}H', stream, values_offset); samples += count
+        trace = traces.setdefault(bytes(stream[values_offset - name_length:values_offset]), ScopeTrace())
+        begin = time.perf_counter(); trace.add(values, sent); decimate += time.perf_counter() - begin
+    begin = time.perf_counter()
+    for trace in traces.values(): trace.points(600, 120)
+    return {'cpu_pct_no_client': cpu_off, 'cpu_pct_client': cpu_on, 'delivered_pct': round(samples / max(1, lines) * 100, 1),
+            'decimate_us_per_sample': round(decimate / max(1, samples) * 1e6, 3), 'redraw_ms': ms(time.perf_counter() - begin)}
+
+def bench_ladder(cli, duration):
+    # A four-button resistor ladder with contact bounce and 2% spikes, read raw on A0 and through a spike filter and a median
+    # on A1..A5, all six at the full sample rate; a press is false unless it is the first of its button within a scheduled press
+    levels = (0, 256, 512, 768); filters = [{"type": "spike", "max_jump": 100}, {"type": "median", "window": 3}]
+    mapping = {}
+    for pin in range(6):
+        thresholds = [{"key": f"{pin}{button}", "threshold": [max(0, level - 60), level + 60], "hysteresis": 10} for button, level in enumerate(levels)]
+        mapping[f"A{pin}"] = {"thresholds": thresholds, "filter": filters} if pin else thresholds
+    with Session(cli, mapping) as session:
+        start = time.monotonic() + 0.3; presses = []; at = start
+        while at + 0.2 < start + duration: presses.append((at, at + 0.2, len(presses) % len(levels))); at += 0.35
+        for pin in range(6): session.emulator.set_waveform(f"A{pin}", ladder(presses, levels, seed=1))
+        session.cpu_start(); sleep_until(start + duration + 0.2); cpu = session.cpu_percent()
+        false = [0] * 6; missed = [0] * 6; delays = ([], []); matched = set()
+        for t, pressed, key in session.keyboard.events:
+            # Before start the pins still read the emulator's default of 0 rather than the ladder
+            if not pressed or t < start: continue
+            pin, button = int(key[0]), int(key[1])
+            press = next((index for index, (begin, end, wanted) in enumerate(presses) if wanted == button and begin <= t <= end + 0.1), None)
+            if press is None or (pin, press) in matched: false[pin] += 1; continue
+            matched.add((pin, press))
+            delays[pin > 0].append(t - presses[press][0])
+        for pin in range(6): missed[pin] = len(presses) - sum(1 for matched_pin, _ in matched if matched_pin == pin)
+    # Filtered counts are per pin, averaged over A1..A5
+    return {'false_presses_raw': false[0], 'false_presses_filtered': round(sum(false[1:]) / 5, 1), 'missed_presses_raw': missed[0],
+            'missed_presses_filtered': round(sum(missed[1:]) / 5, 1),
+            'press_p50_raw_ms': ms(percentile(delays[0], 0.5)), 'press_p50_filtered_ms': ms(percentile(delays[1], 0.5)), 'cpu_pct': cpu}
+
+def bench_outputs(cli, duration):
+    with Session(cli, {}) as session:
+        app = session.app; emulator = session.emulator
+        for pin in (9, 10):
+            ok, message = app.controller.configure_pin(pin, "servo")
+            if not ok: raise RuntimeError(f"Emulator rejected servo pin {pin}: {message}")
+        session.cpu_start(); start = time.monotonic(); sent = 0; markers = {}
+        # A plugin hammering servo 9 at 1 kHz through the core's output queue; every 100th write also moves servo 10,
+        # and the time until the emulator applies that marker is the lag of a fresh target while the link is saturated
+        while time.monotonic() - start < duration:
+            sent += 1; app.post(app.controller.send_output, 'S', 9, sent % 180)
+            if sent % 100 == 0: marker = len(markers) % 180; markers[marker] = time.monotonic(); app.post(app.controller.send_output, 'S', 10, marker)
+            time.sleep(0.001)
+        stopped = time.monotonic(); cpu = session.cpu_percent(); time.sleep(0.5)
+        lags = []
+        for t, kind, pin, value in emulator.outputs:
+            if pin == 10 and value in markers: lags.append(t - markers.pop(value))
+        writes = [t for t, kind, pin, value in emulator.outputs if start <= t <= stopped]
+    return {'writes_per_s': round(len(writes) / (stopped - start), 1), 'output_lag_ms': ms(sum(lags) / len(lags)) if lags else ms(1.0),
+            'lost_targets': len(markers), 'rx_dropped': emulator.rx_dropped, 'cpu_pct': cpu}
+
+def bench_macros(cli, duration):
+    # Four macro pins, each tapping ten keys 20 ms apart, are pressed in turn every 20 ms, so about ten runs overlap;
+    # plain keys on pins 3 and 4 measure key latency meanwhile
+    macro_pins = ("2", "5", "6", "7"); steps = 10; gap = 0.02
+    mapping = {pin: {"macro": [step for index in range(steps) for step in ((f"{pin}.{index}",) if index == 0 else ({"delay_ms": gap * 1000}, f"{pin}.{index}"))]}
+               for pin in macro_pins}
+    mapping.update({"3": {"key": "a"}, "4": {"key": "b"}})
+    inputs = ("2", "3", "5", "6", "4", "7")
+    with Session(cli, mapping) as session:
+        emulator = session.emulator
+        session.cpu_start(); start = time.monotonic(); step = 0.02; hold = 0.06; releases = []
+        for index in range(int(duration / step)):
+            at = start + index * step
+            while releases and releases[0][0] <= at: sleep_until(releases[0][0]); emulator.release(releases.pop(0)[1])
+            sleep_until(at); pin = inputs[index % len(inputs)]; emulator.press(pin); releases.append((at + hold, pin))
+        for at, pin in releases: sleep_until(at); emulator.release(pin)
+        time.sleep(steps * gap + 0.1)
+        cpu = session.cpu_percent()
+        typed = {}
+        for t, pressed, key in session.keyboard.events:
+            if pressed: typed.setdefault(key, []).append(t)
+        errors = []; missed = 0; latencies = []
+        for pin in macro_pins:
+            runs = typed.get(f"{pin}.0", [])
+            for index in range(1, steps):
+                times = typed.get(f"{pin}.{index}", [])
+                missed += abs(len(times) - len(runs))
+                errors.extend(abs(t - run - index * gap) for run, t in zip(runs, times))
+        for pin, key in (("3", "a"), ("4", "b")):
+            edges = [t for t, edge_pin, pressed in emulator.edges if edge_pin == pin and pressed]
+            latencies.extend(t - edge for edge, t in zip(edges, typed.get(key, [])))
+    return {'macro_err_p50_ms': ms(percentile(errors, 0.5)), 'macro_err_p99_ms': ms(percentile(errors, 0.99)), 'missed_steps': missed,
+            'press_p99_ms': ms(percentile(latencies, 0.99)), 'cpu_pct': cpu}
+
+def bench_chords(cli, duration):
+    # Pins 2 and 3 form a chord; each round presses the chord, pin 2 followed by the plain key on pin 4 within the
+    # window, or pin 2 alone. order_mismatches counts rounds whose keys were not typed as expected, in that order
+    window = 0.05; period = 0.25
+    mapping = {"2": {"key": "x"}, "3": {"key": "y"}, "4": {"key": "a"}}
+    rounds = ((("2", "3"), ["c"]), (("2", "4"), ["x", "a"]), (("2",), ["x"]))
+    with Session(cli, mapping, chords=[{"pins": [2, 3], "key": "c", "window_ms": window * 1000}]) as session:
+        emulator = session.emulator; start = time.monotonic(); expected = []
+        for index in range(int(duration / period)):
+            at = start + index * period; pins, keys = rounds[index % len(rounds)]
+            for offset, pin in enumerate(pins): sleep_until(at + offset * 0.01); emulator.press(pin)
+            sleep_until(at + 2 * window)
+            for pin in pins: emulator.release(pin)
+            expected.append((at, len(pins), keys))
+        time.sleep(period)
+        presses = [(t, key) for t, pressed, key in session.keyboard.events if pressed]
+        mismatches = 0; latencies = []
+        for at, count, keys in expected:
+            typed = [(t, key) for t, key in presses if at <= t < at + period]
+            if [key for t, key in typed] != keys: mismatches += 1
+            # From the second press, which completes the chord or flushes the held-back one, to the first key
+            elif count == 2:
+                edges = [t for t, pin, pressed in emulator.edges if pressed and at <= t < at + period]
+                if len(edges) >= 2: latencies.append(typed[0][0] - edges[1])
+    return {'order_mismatches': mismatches, 'press_p99_ms': ms(percentile(latencies, 0.99))}
+
+def bench_plugins(cli, duration):
+    # Cold: no registry cache yet, so every ui.json is parsed; warm: the cache from the run before is reused.
+    # The registry is timed over 50 copies of the bundled plugin, and the CLI's plugin loading (registry scan, imports,
+    # creating the plugins) with four instances of it on one board
+    results = {}
+    with tempfile.TemporaryDirectory() as temp_dir:
+        plugins_dir = os.path.join(temp_dir, "plugins")
+        for index in range(50): shutil.copytree(os.path.join(PLUGINS_DIR, "servo_sweeper"), os.path.join(plugins_dir, f"sweeper_{index}"), ignore=shutil.ignore_patterns("__pycache__"))
+        registry_file = cli.PluginRegistry(plugins_dir).cache_path
+        for name in ('registry_cold_ms', 'registry_warm_ms'):
+            times = []
+            for _ in range(5):
+                if name == 'registry_cold_ms' and os.path.exists(registry_file): os.remove(registry_file)
+                start = time.perf_counter(); cli.PluginRegistry(plugins_dir).scan(); times.append(time.perf_counter() - start)
+            results[name] = ms(min(times))
+        mapping = {str(pin): {"key": key} for pin, key in zip(range(2, 6), "abcd")}
+        plugins = [{"name": f"sweeper_{index}", "settings": {"pin": pin, "step_delay_ms": 50}} for index, pin in enumerate((6, 7, 8, 9))]
+        for name in ('plugin_load_cold_ms', 'plugin_load_warm_ms'):
+            times = []
+            for _ in range(3):
+                if name == 'plugin_load_cold_ms' and os.path.exists(registry_file): os.remove(registry_file)
+                for module in [module for module in sys.modules if module == "plugins" or module.startswith("plugins.")]: del sys.modules[module]
+                with Session(cli, mapping, boot_delay=0, plugins=plugins, plugins_dir=plugins_dir) as session: times.append(session.app.plugin_load_time)
+            results[name] = ms(min(times))
+    return results
+
+def bench_replay(cli, duration):
+    # Records digital presses and six analog sines, then plays the recording back as fast as possible through a fresh CLI;
+    # the replay has to type exactly what the live session typed
+    mapping = {str(pin): {"key": key} for pin, key in zip(range(2, 6), "abcd")}
+    mapping.update({f"A{pin}": [{"key": f"{pin}0", "threshold": [0, 300]}, {"key": f"{pin}1", "threshold": [700, 1023]}] for pin in range(6)})
+    with tempfile.TemporaryDirectory() as temp_dir:
+        path = os.path.join(temp_dir, "session.kmr")
+        with Session(cli, mapping, record=path) as session:
+            for pin in range(6): session.emulator.set_waveform(f"A{pin}", sine(period=0.5, phase=pin / 6))
+            start = time.monotonic(); index = 0
+            while time.monotonic() < start + duration:
+                pin = str(2 + index % 4); session.emulator.press(pin); time.sleep(0.06); session.emulator.release(pin); time.sleep(0.06); index += 1
+        typed = [(pressed, key) for _, pressed, key in session.keyboard.events]
+        recording = cli.SessionRecording(path); size = os.path.getsize(path)
+        handle, config_path = tempfile.mkstemp(suffix=".json", dir=temp_dir)
+        with os.fdopen(handle, 'w') as config_file: config_file.write(recording.config_text)
+        recording.close()
+        keyboard = cli.RecordingKeyboard(); start = time.monotonic()
+        app = cli.KeymapuinoCLI(config_path, log_level=0, keyboard=keyboard, replay=path, replay_speed=0)
+        try: app.main_loop()
+        except SystemExit: pass
+        elapsed = time.monotonic() - start
+    replayed = [(pressed, key) for _, pressed, key in keyboard.events]
+    mismatches = sum(a != b for a, b in zip(typed, replayed)) + abs(len(typed) - len(replayed))
+    frames = app.controller.lines_received
+    return {'replay_frames_per_s': round(frames / elapsed, 1), 'replay_speedup': round(duration / elapsed, 1), 'key_mismatches': mismatches,
+            'bytes_per_frame': round(size / max(1, frames), 2)}
+
+def bench_idle(cli, duration):
+    mapping = {str(pin): {"key": key} for pin, key in zip(range(2, 8), "abcdef")}
+    mapping.update({f"A{pin}": {"thresholds": [{"key": "x", "threshold": [0, 100]}], "deadband": 4} for pin in range(6)})
+    with Session(cli, mapping) as session:
+        for pin in range(6): session.emulator.set_analog(f"A{pin}", 512)
+        time.sleep(0.3); session.cpu_start(); time.sleep(duration)
+        return {'cpu_pct': session.cpu_percent()}
+
+def bench_firmware(cli, duration):
+    # The sketch itself, compiled for this machine against the stand-in core in keymapuino-arduino/host; its clock is
+    # simulated, so the numbers are those of an Uno and do not depend on duration or on this machine's load
+    compiler = shutil.which(os.environ.get('CXX', 'c++'))
+    if compiler is None: print("firmware: no C++ compiler found (set CXX), skipped"); return {}
+    with tempfile.TemporaryDirectory() as temp_dir:
+        binary = os.path.join(temp_dir, "firmware_bench")
+        subprocess.run([compiler, "-std=c++11", "-O2", "-I", os.path.dirname(FIRMWARE_BENCH_PATH), "-o", binary, FIRMWARE_BENCH_PATH], check=True)
+        return json.loads(subprocess.run([binary], check=True, capture_output=True, text=True).stdout)
+
+SCENARIOS = {'startup': bench_startup, 'digital': bench_digital, 'digital_text': bench_digital_text, 'boards': bench_boards, 'framing': bench_framing,
+             'analog': bench_analog, 'scope': bench_scope, 'ladder': bench_ladder, 'outputs': bench_outputs, 'macros': bench_macros, 'chords': bench_chords, 'plugins': bench_plugins, 'replay': bench_replay, 'idle': bench_idle,
+             'firmware': bench_firmware}
+
+def regressed(name, value, base, tolerance, spread=0):
+    slack = max(abs(base) * tolerance, spread, next((s for suffix, s in ABSOLUTE_SLACK.items() if name.endswith(suffix)), 0))
+    return value < base - slack if name.endswith('_per_s') else value > base + slack
+
+def median_metrics(runs): return {name: percentile([run[name] for run in runs], 0.5) for name in runs[0]}
+
+def tail_spread(runs): return {name: round(max(run[name] for run in runs) - min(run[name] for run in runs), 3) for name in runs[0] if name.endswith(TAIL_SUFFIX)}
+
+def run_scenario(cli, scenario, duration, repeat, baselines=None, spreads=None, tolerance=0):
+    # Returns the runs; each metric is judged on their median, so one run disturbed by the machine's load does not fail the suite.
+    # Against baselines, the scenario is only run again while it regresses; without them (new baselines) it runs repeat times
+    runs = [SCENARIOS[scenario](cli, duration)]
+    while len(runs) < repeat:
+        if baselines is not None:
+            base = baselines.get(scenario, {}); spread = (spreads or {}).get(scenario, {})
+            if not any(name in base and regressed(name, value, base[name], tolerance, spread.get(name, 0)) for name, value in median_metrics(runs).items()): break
+        runs.append(SCENARIOS[scenario](cli, duration))
+    return runs
+
+def compare(results, baselines, tolerance, spreads, tails=True):
+    # tails=False shows tail latencies without judging them, for single runs
+    regressions = []
+    print(f"{'scenario':<14}{'metric':<22}{'value':>10}{'baseline':>10}  status")
+    for scenario, metrics in results.items():
+        for name, value in metrics.items():
+            base = baselines.get(scenario, {}).get(name); status = "-"
+            if base is not None and (tails or not name.endswith(TAIL_SUFFIX)):
+                status = "REGRESSION" if regressed(name, value, base, tolerance, spreads.get(scenario, {}).get(name, 0)) else "ok"
+                if status != "ok": regressions.append(f"{scenario}.{name}")
+            print(f"{scenario:<14}{name:<22}{value:>10}{'' if base is None else base:>10}  {status}")
+    return regressions
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Keymapuino CLI benchmarks against the Arduino emulator")
+    parser.add_argument('scenarios', nargs='*', help=f"Scenarios to run: {', '.join(SCENARIOS)} (default: all)")
+    parser.add_argument('--duration', type=float, default=3.0, help='Seconds per scenario')
+    parser.add_argument('--tolerance', type=float, help='Allowed relative regression (default: from baselines.json)')
+    parser.add_argument('--update', action='store_true', help='Store the results as the new baselines')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs of a regressing scenario to take the median of (--update: runs of every scenario); with 1, p99 latencies are not compared')
+    args = parser.parse_args()
+    unknown = [name for name in args.scenarios if name not in SCENARIOS]
+    if unknown: parser.error(f"unknown scenario(s): {', '.join(unknown)}")
+    try:
+        with open(BASELINES_PATH) as baselines_file: stored = json.load(baselines_file)
+    except FileNotFoundError: stored = {"tolerance": 0.5, "scenarios": {}}
+    tolerance = args.tolerance if args.tolerance is not None else stored["tolerance"]
+    cli = load_cli()
+    spreads = stored.setdefault("spread", {})
+    runs = {name: run_scenario(cli, name, args.duration, args.repeat, None if args.update else stored["scenarios"], spreads, tolerance) for name in (args.scenarios or SCENARIOS)}
+    results = {name: median_metrics(scenario_runs) for name, scenario_runs in runs.items()}
+    if args.update:
+        stored["scenarios"].update(results)
+        # The widest spread seen is kept: the machine's load comes and goes, and one quiet update must not leave
+        # the tails without slack for the next loaded run. A single run says nothing about it
+        if args.repeat > 1:
+            for name, scenario_runs in runs.items():
+                spread = spreads.setdefault(name, {})
+                for metric, value in tail_spread(scenario_runs).items(): spread[metric] = max(spread.get(metric, 0), value)
+        with open(BASELINES_PATH, 'w') as baselines_file: json.dump(stored, baselines_file, indent=2); baselines_file.write("\n")
+    regressions = compare(results, stored["scenarios"], tolerance, spreads, args.repeat > 1)
+    if args.repeat < 2: print("Single runs: p99 latencies are shown but not compared, as they vary by several ms from run to run; use --repeat 3 to judge them.")
+    if regressions: print(f"Regressions: {', '.join(regressions)}"); sys.exit(1)
@@ -0,0 +1,442 @@
+import os
+import sys
+import math
+import random
+import time
+import socket
+import struct
+import argparse
+import threading
+import collections
+
+# Software stand-in for keymapuino-arduino/arduino-uno.ino: same commands, replies, framing and timing model
+# (per-pin sample periods, 64-byte RX buffer, UART paced at the current baud rate), reachable over a pty or a TCP socket
+
+TEXT_BAUD_RATE = 9600
+RX_BUFFER_SIZE = 64
+TX_BUFFER_SIZE = 64
+NUM_PINS = 20
+A0 = 14
+MAX_SERVOS = 8
+MAX_PINS_MONITORED = 20
+DEFAULT_DEBOUNCE_MS = 10
+DEFAULT_DIGITAL_PERIOD_MS = 1
+DEFAULT_ANALOG_PERIOD_MS = 20
+FRAME_TIMEOUT = 0.1
+ADC_RANGE = 1024
+# The firmware polls continuously; the emulator sleeps until a sample or a received byte is due, or a level changes.
+# A sample period of 0 (every pass of loop()) is emulated as 1 ms
+MIN_SAMPLE_PERIOD = 0.001
+IDLE_WAKEUP = 0.05
+
+FRAME_SYNC = 0xA5
+FRAME_SIZE = 7
+FRAME_BODY = struct.Struct('<BBHB')
+
+UNCONFIGURED, OUTPUT, INPUT, PULLUP, SERVO = range(5)
+PIN_MODES = {'output': OUTPUT, 'input': INPUT, 'pullup': PULLUP, 'servo': SERVO, 'unconfigured': UNCONFIGURED}
+
+(ERR_MALFORMED_COMMAND, ERR_INVALID_PIN, ERR_NOT_OUTPUT, ERR_NOT_SERVO, ERR_MALFORMED_PIN_COMMAND, ERR_INVALID_PIN_NUMBER,
+ ERR_INVALID_PIN_MODE, ERR_PIN_IN_USE, ERR_MAX_SERVOS, ERR_NOT_INPUT, ERR_UNKNOWN_PIN_ACTION, ERR_UNKNOWN_COMMAND,
+ ERR_CORRUPTED_FRAME, ERR_INVALID_BAUD_RATE) = range(1, 15)
+ERROR_MESSAGES = (
+    "Unknown error", "Malformed command", "Invalid pin", "Pin not configured as OUTPUT", "Pin not configured as SERVO",
+    "Malformed pin command", "Invalid pin number", "Invalid pin mode", "Pin already in use", "Max servos reached",
+    "Pin not configured for input", "Unknown pin action", "Unknown command", "Corrupted frame", "Invalid baud rate")
+
+def crc8(data):
+    crc = 0
+    for byte in data:
+        crc ^= byte
+        for _ in range(8): crc = ((crc << 1) ^ 0x07) & 0xFF if crc & 0x80 else (crc << 1) & 0xFF
+    return crc
+
+def to_int(text):
+    # Arduino's String.toInt(): leading integer or 0
+    text = text.strip(); end = 1 if text[:1] in '+-' else 0
+    while end < len(text) and text[end].isdigit(): end += 1
+    try: return int(text[:end])
+    except ValueError: return 0
+
+def parse_pin(text):
+    text = text.strip().upper()
+    if text.startswith('A'):
+        number = to_int(text[1:])
+        return A0 + number if 0 <= number <= 5 and text[1:2].isdigit() else -1
+    return to_int(text)
+
+def pin_name(pin): return f"A{pin - A0}" if pin >= A0 else str(pin)
+
+def sine(low=0, high=1023, period=1.0, phase=0.0):
+    middle = (low + high) / 2; amplitude = (high - low) / 2
+    return lambda t: int(round(middle + amplitude * math.sin(2 * math.pi * (t / period + phase))))
+
+def ladder(presses, levels, idle=ADC_RANGE - 1, settle=0.01, noise=3.0, spikes=0.02, seed=0):
+    # A resistor-ladder keypad: presses are (start, end, button) in time.monotonic() seconds. Within settle of an edge a reading
+    # lands anywhere between the old and the new level, and a spikes share of readings are random values; equal seeds read the same
+    rng = random.Random(seed)
+    def level(t):
+        return next((levels[button] for start, end, button in presses if start <= t < end), idle)
+    def waveform(t):
+        value = level(t)
+        for start, end, _ in presses:
+            for edge in (start, end):
+                if edge <= t < edge + settle: old = level(edge - 1e-6); value = old + (value - old) * rng.random()
+        if rng.random() < spikes: return rng.randrange(ADC_RANGE)
+        return value + rng.gauss(0, noise)
+    return waveform
+
+class ArduinoEmulator:
+    # eeprom holds what "commit" stored; pass the same dict to a new emulator to power-cycle a board that keeps its setup
+    def __init__(self, boot_delay=0.2, banner="READY bin", log_func=None, eeprom=None):
+        self.boot_delay = boot_delay; self.banner = banner
+        self.eeprom = {} if eeprom is None else eeprom
+        self.log = log_func or (lambda message: None)
+        self.levels = [1] * NUM_PINS; self.analog_values = [0] * 6; self.waveforms = {}
+        self.outputs = []; self.edges = []; self.samples = []
+        self.rx_dropped = 0; self.commands = 0; self.resets = 0
+        self.port = None
+        self._lock = threading.Lock(); self._wire = collections.deque(); self._tx = collections.deque()
+        self._tx_ready = threading.Condition(self._lock); self._wakeup = threading.Event()
+        self._rx_free_at = 0.0; self._tx_free_at = 0.0
+        self._running = False; self._master = self._slave = None; self._server = self._client = None
+        self._booted_at = 0.0
+        self._cpu = {}
+        self._reset()
+
+    # Transports
+    def open_pty(self):
+        import tty
+        self._master, self._slave = os.openpty(); tty.setraw(self._slave)
+        self.port = os.ttyname(self._slave)
+        self._start(self._read_pty)
+        return self.port
+    def listen(self, host='127.0.0.1', port=0):
+        self._server = socket.create_server((host, port))
+        self.port = f"socket://{host}:{self._server.getsockname()[1]}"
+        self._start(self._accept)
+        return self.port
+    def _start(self, reader):
+        self._running = True; self._booted_at = time.monotonic() + self.boot_delay
+        for name, target in (('reader', reader), ('tx', self._tx_loop), ('loop', self._run)):
+            threading.Thread(target=self._track, args=(name, target), name=f"emulator-{name}", daemon=True).start()
+    def _track(self, name, target):
+        try: target()
+        finally: self._cpu[name] = time.thread_time()
+    def stop(self):
+        self._running = False
+        with self._lock: self._tx_ready.notify_all()
+        for closer in (self._client, self._server):
+            if closer is not None:
+                try: closer.close()
+                except OSError: pass
+        for fd in (self._master, self._slave):
+            if fd is not None:
+                try: os.close(fd)
+                except OSError: pass
+    def cpu_time(self): return sum(self._cpu.values())
+    def _read_pty(self):
+        while self._running:
+            try: data = os.read(self._master, 4096)
+            except OSError: return
+            self._cpu['reader'] = time.thread_time()
+            if data: self._receive(data)
+    def _accept(self):
+        while self._running:
+            try: client, _ = self._server.accept()
+            except OSError: return
+            client.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            # Opening the port resets a real Uno, so every new connection boots the emulator again
+            with self._lock: self._client = client; self._tx.clear(); self._wire.clear(); self._pending_reset = True
+            while self._running:
+                try: data = client.recv(4096)
+                except OSError: data = b""
+                self._cpu['reader'] = time.thread_time()
+                if not data: break
+                self._receive(data)
+            with self._lock:
+                if self._client is client: self._client = None
+    def _receive(self, data):
+        # Bytes reach the RX buffer no faster than the UART delivers them
+        with self._lock:
+            now = time.monotonic()
+            self._rx_free_at = max(now, self._rx_free_at) + len(data) * self._byte_time
+            self._wire.append((self._rx_free_at, data))
+        self._wakeup.set()
+    def _write(self, data):
+        # Serial.write() returns once the data fits in the TX buffer; the bytes reach the host after transmission
+        with self._lock:
+            now = time.monotonic()
+            self._tx_free_at = max(now, self._tx_free_at) + len(data) * self._byte_time
+            self._tx.append((self._tx_free_at, data)); self._tx_ready.notify()
+            blocked = self._tx_free_at - TX_BUFFER_SIZE * self._byte_time - now
+        if blocked > 0: time.sleep(blocked)
+        return self._tx_free_at
+    def _tx_loop(self):
+        while self._running:
+            with self._lock:
+                while self._running and not self._tx: self._tx_ready.wait(0.5)
+                if not self._tx: continue
+                due, data = self._tx[0]
+            delay = due - time.monotonic()
+            if delay > 0: time.sleep(delay)
+            with self._lock:
+                if self._tx and self._tx[0][1] is data: self._tx.popleft()
+                client = self._client
+            try:
+                if self._master is not None: os.write(self._master, data)
+                elif client is not None: client.sendall(data)
+            except OSError: pass
+            self._cpu['tx'] = time.thread_time()
+    def _flush(self):
+        while self._running:
+            with self._lock:
+                if not self._tx: return
+            time.sleep(0.001)
+
+    # Injection
+    def press(self, pin): self.levels[parse_pin(str(pin))] = 0; self._wakeup.set()
+    def release(self, pin): self.levels[parse_pin(str(pin))] = 1; self._wakeup.set()
+    def send_raw(self, data): return self._write(bytes(data))      # line noise, hand-made or split frames
+    def set_analog(self, pin, value): pin = parse_pin(str(pin)); self.waveforms.pop(pin, None); self.analog_values[pin - A0] = value
+    def set_waveform(self, pin, waveform): self.waveforms[parse_pin(str(pin))] = waveform
+    def analog_read(self, pin, now):
+        waveform = self.waveforms.get(pin)
+        value = waveform(now) if waveform is not None else self.analog_values[pin - A0]
+        return max(0, min(ADC_RANGE - 1, int(value)))
+
+    # Firmware
+    def _reset(self):
+        self.baud_rate = TEXT_BAUD_RATE; self._byte_time = 10.0 / TEXT_BAUD_RATE
+        self.binary = False; self.frame_seq = 0; self.reply_seq = -1
+        self.pin_modes = [UNCONFIGURED] * NUM_PINS; self.servos = []
+        self.digital_read_pins = []; self.analog_read_pins = []
+        self.pressed = [False] * NUM_PINS; self.raw_pressed = [False] * NUM_PINS
+        self.changed_at = [0] * NUM_PINS; self.debounce_ms = [DEFAULT_DEBOUNCE_MS] * NUM_PINS
+        self.deadband = [-1] * NUM_PINS; self.min_interval_ms = [0] * NUM_PINS; self.max_interval_ms = [0] * NUM_PINS
+        self.last_sent = [0] * NUM_PINS; self.last_sent_at = [0] * NUM_PINS
+        self.sample_period_ms = [0] * NUM_PINS; self.next_sample_at = [0.0] * NUM_PINS
+        self._rx = bytearray(); self._frame_wait_since = None; self._pending_reset = False; self._sent_banner = False
+        self.pin_modes[13] = OUTPUT
+        self.config_hash = 0; self._restore_config()
+    def millis(self): return int((time.monotonic() - self._booted_at) * 1000)
+    def _run(self):
+        while self._running:
+            if self._pending_reset:
+                self._reset(); self.resets += 1; self._booted_at = time.monotonic() + self.boot_delay
+            if time.monotonic() < self._booted_at: time.sleep(0.001); continue
+            if not self._sent_banner:
+                self._sent_banner = True; self._println(f"{self.banner} cfg={self.config_hash:X}")
+            self._wakeup.clear()
+            self._loop()
+            self._cpu['loop'] = time.thread_time()
+            self._wakeup.wait(max(0.0, self._next_due() - time.monotonic()))
+    def _next_due(self):
+        due = time.monotonic() + IDLE_WAKEUP
+        with self._lock:
+            if self._wire: due = min(due, self._wire[0][0])
+        if self._frame_wait_since is not None: due = min(due, self._frame_wait_since + FRAME_TIMEOUT)
+        for pin in self.analog_read_pins: due = min(due, self.next_sample_at[pin])
+        for pin in self.digital_read_pins:
+            # A button at its debounced level has nothing to report until press() or release() wakes the loop
+            if (self.levels[pin] == 0) != self.pressed[pin] or self.raw_pressed[pin] != self.pressed[pin]: due = min(due, self.next_sample_at[pin])
+        return due
+    def _sample_due(self, pin, now):
+        if now < self.next_sample_at[pin]: return False
+        period = max(self.sample_period_ms[pin] / 1000.0, MIN_SAMPLE_PERIOD)
+        self.next_sample_at[pin] += period
+        if self.next_sample_at[pin] <= now: self.next_sample_at[pin] = now + period
+        return True
+    def _start_sampling(self, pin, period_ms):
+        self.sample_period_ms[pin] = period_ms; self.next_sample_at[pin] = time.monotonic()
+    def _loop(self):
+        now = time.monotonic()
+        with self._lock:
+            while self._wire and self._wire[0][0] <= now:
+                data = self._wire.popleft()[1]
+                room = RX_BUFFER_SIZE - len(self._rx)
+                if len(data) > room: self.rx_dropped += len(data) - room; data = data[:room]
+                self._rx += data
+        self._process_input(now)
+        millis = self.millis()
+        for pin in self.digital_read_pins:
+            if not self._sample_due(pin, now): continue
+            pressed = self.levels[pin] == 0
+            if pressed != self.raw_pressed[pin]: self.raw_pressed[pin] = pressed; self.changed_at[pin] = millis
+            if pressed != self.pressed[pin] and millis - self.changed_at[pin] >= self.debounce_ms[pin]:
+                self.pressed[pin] = pressed
+                self.edges.append((self._send_digital_edge(pin, pressed), pin_name(pin), pressed))
+        for pin in self.analog_read_pins:
+            if not self._sample_due(pin, now): continue
+            value = self.analog_read(pin, now)
+            if self.deadband[pin] >= 0:
+                elapsed = millis - self.last_sent_at[pin]
+                changed = abs(value - self.last_sent[pin]) > self.deadband[pin] and elapsed >= self.min_interval_ms[pin]
+                keepalive = self.max_interval_ms[pin] > 0 and elapsed >= self.max_interval_ms[pin]
+                if not changed and not keepalive: continue
+            self.last_sent[pin] = value; self.last_sent_at[pin] = millis
+            self.samples.append((self._send_analog_value(pin, value), pin_name(pin), value))
+    def _process_input(self, now):
+        rx = self._rx
+        while rx:
+            if rx[0] == FRAME_SYNC:
+                if len(rx) < FRAME_SIZE:
+                    # A frame the host never finishes is dropped after FRAME_TIMEOUT, and sampling goes on meanwhile
+                    if self._frame_wait_since is None: self._frame_wait_since = now
+                    elif now - self._frame_wait_since >= FRAME_TIMEOUT: del rx[:]; self._frame_wait_since = None
+                    return
+                self._frame_wait_since = None
+                frame = bytes(rx[:FRAME_SIZE]); del rx[:FRAME_SIZE]
+                self.reply_seq = -1; self.commands += 1
+                if crc8(frame[1:FRAME_SIZE - 1]) != frame[FRAME_SIZE - 1]: self._send_error(ERR_CORRUPTED_FRAME); continue
+                frame_type, pin, value, _ = FRAME_BODY.unpack_from(frame, 1)
+                self._write_output(chr(frame_type), pin, value)
+                continue
+            end = rx.find(b'\n')
+            if end < 0: return
+            line = rx[:end].decode('latin-1'); del rx[:end + 1]
+            self.commands += 1
+            self._process_command(line)
+    def _process_command(self, cmd):
+        cmd = cmd.strip()
+        if not cmd: return
+        self.reply_seq = -1
+        if cmd[0] == '#':
+            tag, _, rest = cmd.partition(' ')
+            if not rest: return
+            self.reply_seq = to_int(tag[1:]); cmd = rest.strip()
+        kind = cmd[0]
+        if kind in 'DPS':
+            fields = cmd.split(',')
+            if len(fields) < 3: self._send_error(ERR_MALFORMED_COMMAND); return
+            self._write_output(kind, to_int(fields[1]), to_int(fields[2])); return
+        cmd = cmd.lower()
+        if cmd.startswith("pin "):
+            self.config_hash = 0
+            target, _, action = cmd[4:].partition(' ')
+            if not action: self._send_error(ERR_MALFORMED_PIN_COMMAND); return
+            pin = parse_pin(target)
+            if not 0 <= pin < NUM_PINS: self._send_error(ERR_INVALID_PIN_NUMBER); return
+            if action.startswith("mode "): self._set_mode(pin, action[5:])
+            elif action.startswith("read "): self._set_read(pin, action[5:])
+            else: self._send_error(ERR_UNKNOWN_PIN_ACTION)
+        elif cmd == "clear": self._clear(); self.config_hash = 0; self._send_ok()
+        elif cmd.startswith("commit "):
+            try: config_hash = int(cmd[7:], 16) & 0xFFFFFFFF
+            except ValueError: config_hash = 0
+            if not config_hash: self._send_error(ERR_MALFORMED_COMMAND); return
+            self._save_config(config_hash); self._send_ok()
+        elif cmd.startswith("proto "):
+            params = cmd[6:]
+            if params == "text": self._send_ok(); self._switch_protocol(False, TEXT_BAUD_RATE)
+            elif params.startswith("binary "):
+                baud_rate = to_int(params[7:])
+                if not TEXT_BAUD_RATE <= baud_rate <= 1000000: self._send_error(ERR_INVALID_BAUD_RATE); return
+                self._send_ok(); self._switch_protocol(True, baud_rate)
+            else: self._send_error(ERR_MALFORMED_COMMAND)
+        else: self._send_error(ERR_UNKNOWN_COMMAND)
+    def _set_mode(self, pin, mode):
+        if mode not in PIN_MODES: self._send_error(ERR_INVALID_PIN_MODE); return
+        mode = PIN_MODES[mode]
+        if mode == SERVO:
+            if self.pin_modes[pin] != UNCONFIGURED: self._send_error(ERR_PIN_IN_USE); return
+            if len(self.servos) >= MAX_SERVOS: self._send_error(ERR_MAX_SERVOS); return
+            self.servos.append(pin)
+        elif mode == UNCONFIGURED and pin in self.servos: self.servos.remove(pin)
+        self.pin_modes[pin] = mode
+        self._send_ok()
+    def _set_read(self, pin, read_type):
+        if self.pin_modes[pin] not in (INPUT, PULLUP): self._send_error(ERR_NOT_INPUT); return
+        millis = self.millis()
+        if read_type == "digital" or read_type.startswith("digital "):
+            params = read_type[8:].split()
+            self.debounce_ms[pin] = max(0, min(255, to_int(params[0]))) if params else DEFAULT_DEBOUNCE_MS
+            self.pressed[pin] = self.raw_pressed[pin] = False; self.changed_at[pin] = millis
+            self._start_sampling(pin, max(0, min(65535, to_int(params[1]))) if len(params) > 1 else DEFAULT_DIGITAL_PERIOD_MS)
+            self._add(self.digital_read_pins, pin)
+        elif read_type == "analog" or read_type.startswith("analog "):
+            params = read_type[6:].split()
+            self.deadband[pin] = to_int(params[0]) if params else -1
+            self.min_interval_ms[pin] = to_int(params[1]) if len(params) > 1 else 0
+            self.max_interval_ms[pin] = to_int(params[2]) if len(params) > 2 else 0
+            self.last_sent[pin] = -ADC_RANGE; self.last_sent_at[pin] = millis
+            self._start_sampling(pin, max(0, min(65535, to_int(params[3]))) if len(params) > 3 else DEFAULT_ANALOG_PERIOD_MS)
+            self._add(self.analog_read_pins, pin)
+        elif read_type == "stop":
+            for pins in (self.digital_read_pins, self.analog_read_pins):
+                if pin in pins: pins.remove(pin)
+        self._send_ok()
+    def _add(self, pins, pin):
+        if pin not in pins and len(pins) < MAX_PINS_MONITORED: pins.append(pin)
+    def _clear(self):
+        self.servos = []; self.digital_read_pins = []; self.analog_read_pins = []
+        self.pin_modes = [UNCONFIGURED] * NUM_PINS; self.pin_modes[13] = OUTPUT
+    def _save_config(self, config_hash):
+        reads = [1 if pin in self.digital_read_pins else 2 if pin in self.analog_read_pins else 0 for pin in range(NUM_PINS)]
+        self.eeprom.update(hash=config_hash, pins=list(zip(self.pin_modes, reads, self.debounce_ms, self.deadband, self.min_interval_ms, self.max_interval_ms, self.sample_period_ms)))
+        self.config_hash = config_hash
+    def _restore_config(self):
+        if 'hash' not in self.eeprom: return
+        for pin, (mode, read, debounce_ms, deadband, min_interval_ms, max_interval_ms, sample_period_ms) in enumerate(self.eeprom['pins']):
+            if mode == UNCONFIGURED or (mode == SERVO and len(self.servos) >= MAX_SERVOS): continue
+            if mode == SERVO: self.servos.append(pin)
+            self.pin_modes[pin] = mode; self.debounce_ms[pin] = debounce_ms
+            self.deadband[pin] = deadband; self.min_interval_ms[pin] = min_interval_ms; self.max_interval_ms[pin] = max_interval_ms
+            self.last_sent[pin] = -ADC_RANGE; self._start_sampling(pin, sample_period_ms)
+            if read: self._add(self.digital_read_pins if read == 1 else self.analog_read_pins, pin)
+        self.config_hash = self.eeprom['hash']
+    def _write_output(self, kind, pin, value):
+        if not 0 <= pin < NUM_PINS: self._send_error(ERR_INVALID_PIN); return
+        if kind in 'DP' and self.pin_modes[pin] != OUTPUT: self._send_error(ERR_NOT_OUTPUT); return
+        if kind == 'S' and self.pin_modes[pin] != SERVO: self._send_error(ERR_NOT_SERVO); return
+        if kind not in 'DPS': self._send_error(ERR_MALFORMED_COMMAND); return
+        value = (1 if value == 1 else 0) if kind == 'D' else max(0, min(255 if kind == 'P' else 180, value))
+        self.outputs.append((time.monotonic(), kind, pin, value))
+    def _switch_protocol(self, binary, baud_rate):
+        self._flush()
+        self.binary = binary; self.baud_rate = baud_rate; self._byte_time = 10.0 / baud_rate; self.frame_seq = 0
+        self.log(f"Switched to {'binary' if binary else 'text'} protocol at {baud_rate} baud")
+
+    def _println(self, text): return self._write(f"{text}\r\n".encode('latin-1'))
+    def _send_frame(self, kind, pin, value):
+        body = FRAME_BODY.pack(ord(kind), pin, value & 0xFFFF, self.frame_seq); self.frame_seq = (self.frame_seq + 1) & 0xFF
+        return self._write(bytes((FRAME_SYNC,)) + body + bytes((crc8(body),)))
+    def _tag(self): return f"#{self.reply_seq} " if self.reply_seq >= 0 else ""
+    def _send_ok(self):
+        if self.binary: return self._send_frame('K', 0, max(0, self.reply_seq))
+        return self._println(f"{self._tag()}OK")
+    def _send_error(self, code):
+        if self.binary: return self._send_frame('E', code, max(0, self.reply_seq))
+        return self._println(f"{self._tag()}ERROR: {ERROR_MESSAGES[code]}")
+    def _send_digital_edge(self, pin, pressed):
+        if self.binary: return self._send_frame('D', pin, 1 if pressed else 0)
+        return self._println(f"{'+' if pressed else '-'}{pin_name(pin)}")
+    def _send_analog_value(self, pin, value):
+        if self.binary: return self._send_frame('A', pin, value)
+        return self._println(f"{pin_name(pin)}:{value}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Keymapuino Arduino emulator")
+    parser.add_argument('--listen', type=str, help='Serve on HOST:PORT (connect with --port socket://HOST:PORT) instead of a pty')
+    parser.add_argument('--boot-delay', type=float, default=1.5, help='Seconds between a reset and the READY banner')
+    args = parser.parse_args()
+    emulator = ArduinoEmulator(boot_delay=args.boot_delay, log_func=print)
+    if args.listen:
+        host, _, port = args.listen.rpartition(':')
+        print(f"Listening on {emulator.listen(host or '127.0.0.1', int(port))}")
+    else: print(f"Serial port: {emulator.open_pty()}")
+    print("Commands: press <pin>, release <pin>, analog <pin> <value>, sine <pin> <period_s>, quit")
+    try:
+        for line in sys.stdin:
+            words = line.split()
+            if not words: continue
+            try:
+                if words[0] == 'press': emulator.press(words[1])
+                elif words[0] == 'release': emulator.release(words[1])
+                elif words[0] == 'analog': emulator.set_analog(words[1], int(words[2]))
+                elif words[0] == 'sine': emulator.set_waveform(words[1], sine(period=float(words[2])))
+                elif words[0] == 'quit': break
+                else: print(f"Unknown command: {words[0]}")
+            except (IndexError, ValueError) as e: print(f"Invalid command: {e}")
+    except KeyboardInterrupt: pass
+    emulator.stop()
@@ -12,209 +12,1765 @@ sys.path.insert(0, get_base_path())
 
 import json
 import time
+import mmap
+import bisect
+import tempfile
+import queue
+import struct
+import threading
 import serial
 import argparse
 import signal
+import atexit
+import socket
+import heapq
+import itertools
 import importlib
-from pynput.keyboard import Controller
+import zlib
+from collections import deque
+from functools import partial
+from plugin_registry import PluginRegistry
+from scope import ScopeServer
+
+ADC_MAX = 1023
+RX_BUFFER_SIZE = 64
+TEXT_BAUD_RATE = 9600
+BINARY_BAUD_RATE = 115200
+# The firmware drains its RX buffer once per loop pass (delay(20) plus the pass itself); outputs get a burst of
+# half the buffer plus a refill of the other half per pass, so one pass never receives more than RX_BUFFER_SIZE
+FIRMWARE_LOOP_INTERVAL = 0.025
+OUTPUT_BURST = RX_BUFFER_SIZE // 2
+WATCHDOG_INTERVAL = 0.1
+WATCHDOG_REPORT_INTERVAL = 1.0
+PLUGIN_BACKLOG = 1000
+LOG_BUFFER_SIZE = 4096
+LOG_FLUSH_INTERVAL = 0.05
+CONFIG_POLL_INTERVAL = 0.5
+# Queued serial events handled per main loop pass before timers run and the keyboard batch is flushed
+EVENT_BATCH_SIZE = 64
+
+# Session recordings (--record / --replay): a header, one record per serial read or write, then a time index and footer.
+# A record is the time since the previous record in µs, kind, port index and length, followed by the data; a recording
+# that was not closed cleanly has no index, and the reader builds one by scanning it
+RECORD_MAGIC = b'KMAPREC1'
+RECORD_INDEX_MAGIC = b'KMAPIDX1'
+RECORD_HEADER = struct.Struct('<8sdd')       # magic, time.monotonic() and time.time() when recording started
+RECORD = struct.Struct('<IBBH')              # µs since the previous record, kind, port, data length
+RECORD_TIME = struct.Struct('<Q')            # REC_TIME data: µs since start, for gaps too long for a record's delta
+RECORD_INDEX_ENTRY = struct.Struct('<QQ')    # µs since start, file offset of the record
+RECORD_FOOTER = struct.Struct('<QII8s')      # index offset, index entries, size of the JSON port list after them, magic
+REC_CONFIG, REC_PORT, REC_RX, REC_COMMAND, REC_OUTPUT, REC_TIME, REC_END, REC_READY = range(8)
+RECORD_INDEX_INTERVAL = 1_000_000
+RECORD_MAX_DATA = 0xFFFF
+# A replayed reply waits this long for the command it answered before it is delivered anyway
+REPLAY_COMMAND_WAIT = 2.5
+# Replaying as fast as possible pauses reading while this many events are waiting for the main loop
+REPLAY_BACKLOG = 1000
+
+# Binary frame: SYNC, type, pin, value (uint16 LE), seq, CRC-8 (poly 0x07) over type..seq
+FRAME_SYNC = 0xA5
+FRAME_SIZE = 7
+FRAME_BODY = struct.Struct('<BBHB')
+
+def _crc8_table():
+    table = []
+    for crc in range(256):
+        for _ in range(8): crc = ((crc << 1) ^ 0x07) & 0xFF if crc & 0x80 else (crc << 1) & 0xFF
+        table.append(crc)
+    return tuple(table)
+
+CRC8_TABLE = _crc8_table()
+
+PIN_NAMES = tuple(str(i) for i in range(14)) + tuple(f"A{i}" for i in range(6))
+PIN_NUMBERS = {name: number for number, name in enumerate(PIN_NAMES)}
+ERROR_MESSAGES = (
+    "Unknown error", "Malformed command", "Invalid pin", "Pin not configured as OUTPUT", "Pin not configured as SERVO",
+    "Malformed pin command", "Invalid pin number", "Invalid pin mode", "Pin already in use", "Max servos reached",
+    "Pin not configured for input", "Unknown pin action", "Unknown command", "Corrupted frame", "Invalid baud rate")
+
+def analog_thresholds(mapping):
+    if isinstance(mapping, list): return mapping
+    if isinstance(mapping, dict) and 'thresholds' in mapping: return mapping['thresholds']
+    return None
+
+def config_digest(commands):
+    # Identifies a pin setup to the firmware, which stores it with "commit" and reports it back in its banner; 0 means none
+    return zlib.crc32("\n".join(commands).encode('utf-8')) or 1
+
+def mapping_keys(mapping):
+    # Every key a digital mapping (or a chord, tap or hold target) can press
+    if isinstance(mapping, str): yield mapping; return
+    if 'key' in mapping: yield mapping['key']
+    for step in mapping.get('macro', ()):
+        if isinstance(step, str): yield step
+        else: yield from (step[kind] for kind in ('tap', 'press', 'release') if kind in step)
+    for kind in ('tap', 'hold'):
+        if kind in mapping: yield from mapping_keys(mapping[kind])
+
+def compile_analog_filter(mapping):
+    # "filter" is one stage or a list of stages run in order, e.g. [{"type": "spike", "max_jump": 150}, {"type": "median", "window": 5}]
+    stages = mapping.get('filter') if isinstance(mapping, dict) else None
+    if not stages: return ()
+    if isinstance(stages, dict): stages = [stages]
+    compiled = []
+    for options in stages:
+        if not isinstance(options, dict): raise ValueError(f"An analog filter stage must be an object with a 'type': {options}")
+        stage = ANALOG_FILTERS.get(options.get('type'))
+        if stage is None: raise ValueError(f"Unknown analog filter '{options.get('type')}' (choose from {', '.join(ANALOG_FILTERS)})")
+        compiled.append(stage(options))
+    return tuple(compiled)
+
+def analog_read_type(mapping):
+    if not isinstance(mapping, dict): return "analog"
+    period = f" {int(mapping['sample_interval_ms'])}" if 'sample_interval_ms' in mapping else ""
+    if not any(k in mapping for k in ('deadband', 'min_interval_ms', 'max_interval_ms')): return f"analog -1 0 0{period}" if period else "analog"
+    return f"analog {int(mapping.get('deadband', 0))} {int(mapping.get('min_interval_ms', 0))} {int(mapping.get('max_interval_ms', 1000))}{period}"
+
+class Histogram:
+    # Power-of-two microsecond buckets: constant-time add, percentiles within a factor of two
+    __slots__ = ('counts', 'count', 'total', 'max')
+    def __init__(self):
+        self.counts = [0] * 32; self.count = 0; self.total = 0.0; self.max = 0.0
+    def add(self, seconds):
+        self.counts[min(31, int(seconds * 1e6).bit_length())] += 1
+        self.count += 1; self.total += seconds
+        if seconds > self.max: self.max = seconds
+    def percentile(self, fraction):
+        rank = fraction * self.count
+        for bucket, count in enumerate(self.counts):
+            rank -= count
+            if rank <= 0: return min(self.max, (1 << bucket) / 1e6)
+        return self.max
+    def summary(self):
+        if not self.count: return {'count': 0}
+        return {'count': self.count, 'mean_ms': round(self.total / self.count * 1000, 3), 'p50_ms': round(self.percentile(0.5) * 1000, 3),
+                'p99_ms': round(self.percentile(0.99) * 1000, 3), 'max_ms': round(self.max * 1000, 3)}
+
+class Metrics:
+    def __init__(self):
+        self.started = time.monotonic()
+        self.latency = Histogram(); self.loop = Histogram(); self.rtt = Histogram()
+        self.event_received = None
+
+def run_concurrently(function, items):
+    # One thread per extra item, the first one on the calling thread; waits for all of them
+    threads = [threading.Thread(target=function, args=(item,), daemon=True) for item in items[1:]]
+    for thread in threads: thread.start()
+    if items: function(items[0])
+    for thread in threads: thread.join()
+
+class KeyboardBackend:
+    # press() and release() only queue the event; the main loop calls flush() once per pass, so every key event
+    # produced while handling one burst of serial input reaches the operating system as one batch;
+    # modules names what the backend imports, so startup can load it while the boards reset
+    modules = ()
+    def __init__(self): self.pending = []
+    def press(self, key): self.pending.append((True, key))
+    def release(self, key): self.pending.append((False, key))
+    def flush(self):
+        if self.pending: self._emit(self.pending); self.pending = []
+    def close(self): self.flush()
+
+class PynputKeyboard(KeyboardBackend):
+    modules = ('pynput.keyboard',)
+    def __init__(self, log_func):
+        super().__init__()
+        from pynput.keyboard import Controller, Key
+        self.controller = Controller(); self.special_keys = Key; self.log = log_func
+    def _resolve(self, key):
+        # Single characters are typed as they are, longer names ("space", "enter", "f5") are looked up in pynput's Key
+        if len(key) == 1: return key
+        return getattr(self.special_keys, key.lower(), None)
+    def _emit(self, events):
+        controller = self.controller
+        for pressed, key in events:
+            resolved = self._resolve(key)
+            if resolved is None: self.log("[ERROR] Unknown key: %s", key, level=1); continue
+            if pressed: controller.press(resolved)
+            else: controller.release(resolved)
+
+class UinputKeyboard(KeyboardBackend):
+    # Writes to a virtual keyboard through /dev/uinput (Linux, python-evdev); the whole batch shares one SYN_REPORT
+    # evdev names for characters and for pynput key names that differ; other names map directly (page_up -> KEY_PAGEUP)
+    KEY_NAMES = {' ': 'SPACE', '-': 'MINUS', '=': 'EQUAL', '[': 'LEFTBRACE', ']': 'RIGHTBRACE', ';': 'SEMICOLON', "'": 'APOSTROPHE',
+                 '`': 'GRAVE', '\\': 'BACKSLASH', ',': 'COMMA', '.': 'DOT', '/': 'SLASH', '\t': 'TAB', '\n': 'ENTER',
+                 'alt': 'LEFTALT', 'alt_l': 'LEFTALT', 'alt_r': 'RIGHTALT', 'ctrl': 'LEFTCTRL', 'ctrl_l': 'LEFTCTRL', 'ctrl_r': 'RIGHTCTRL',
+                 'shift': 'LEFTSHIFT', 'shift_l': 'LEFTSHIFT', 'shift_r': 'RIGHTSHIFT', 'cmd': 'LEFTMETA', 'cmd_l': 'LEFTMETA', 'cmd_r': 'RIGHTMETA',
+                 'print_screen': 'SYSRQ', 'menu': 'COMPOSE'}
+    modules = ('evdev',)
+    def __init__(self, log_func):
+        super().__init__()
+        from evdev import UInput, ecodes
+        self.ecodes = ecodes; self.log = log_func; self.codes = {}
+        self.device = UInput(name="keymapuino")
+    def _resolve(self, key):
+        # A key resolves to the codes to hold, e.g. "A" to left shift plus A; unknown keys resolve to ()
+        codes = self.codes.get(key)
+        if codes is None:
+            name = self.KEY_NAMES.get(key.lower() if len(key) > 1 else key)
+            if name is None and (len(key) > 1 or key.isalnum()): name = key.upper().replace('_', '')
+            code = self.ecodes.ecodes.get(f"KEY_{name}") if name else None
+            codes = () if code is None else (self.ecodes.KEY_LEFTSHIFT, code) if key.isupper() and len(key) == 1 else (code,)
+            if not codes: self.log("[ERROR] Unknown key: %s", key, level=1)
+            self.codes[key] = codes
+        return codes
+    def _emit(self, events):
+        device = self.device; EV_KEY = self.ecodes.EV_KEY
+        for pressed, key in events:
+            codes = self._resolve(key)
+            for code in (codes if pressed else reversed(codes)): device.write(EV_KEY, code, 1 if pressed else 0)
+        device.syn()
+    def close(self): super().close(); self.device.close()
+
+class RecordingKeyboard(KeyboardBackend):
+    # Keeps (time, pressed, key) in memory instead of typing; for tests and the benchmarks
+    def __init__(self, log_func=None):
+        super().__init__(); self.events = []; self.batches = 0
+    def _emit(self, events):
+        now = time.monotonic(); self.batches += 1
+        self.events.extend((now, pressed, key) for pressed, key in events)
+
+KEYBOARD_BACKENDS = {'pynput': PynputKeyboard, 'uinput': UinputKeyboard, 'recording': RecordingKeyboard}
+
+def create_keyboard(name, log_func):
+    backend = KEYBOARD_BACKENDS.get(name)
+    if backend is None: raise ValueError(f"Unknown keyboard backend '{name}' (choose from {', '.join(KEYBOARD_BACKENDS)})")
+    try: return backend(log_func)
+    except ImportError as e: raise ValueError(f"Keyboard backend '{name}' is not available: {e}")
+    except OSError as e: raise ValueError(f"Could not open keyboard backend '{name}': {e}")
+
+class TimedKeyboard:
+    # Records the time from receiving the serial data behind a key event to its batch being flushed to the backend
+    def __init__(self, keyboard, metrics):
+        self.keyboard = keyboard; self.metrics = metrics; self.received = []
+    def press(self, key): self.keyboard.press(key); self._record()
+    def release(self, key): self.keyboard.release(key); self._record()
+    def _record(self):
+        received = self.metrics.event_received
+        if received is not None: self.received.append(received)
+    def flush(self):
+        self.keyboard.flush()
+        if self.received:
+            now = time.monotonic()
+            for received in self.received: self.metrics.latency.add(now - received)
+            self.received = []
+    def close(self): self.keyboard.close()
+
+class LogSink:
+    # Enabled log records are queued in a bounded ring and formatted and written by a background thread in batches,
+    # so logging costs the key path a deque append instead of a formatted write and flush
+    def __init__(self, stream=None, capacity=LOG_BUFFER_SIZE, flush_interval=LOG_FLUSH_INTERVAL):
+        self.stream = stream if stream is not None else sys.stdout
+        self.records = deque(maxlen=capacity); self.dropped = 0
+        self.flush_interval = flush_interval; self.running = True
+        self.wakeup = threading.Event(); self.lock = threading.Lock()
+        self.thread = threading.Thread(target=self._run, name="log-writer", daemon=True); self.thread.start()
+
+    def write(self, message, args):
+        records = self.records
+        if len(records) == records.maxlen: self.dropped += 1
+        records.append((message, args))
+        if not self.wakeup.is_set(): self.wakeup.set()
+
+    def _run(self):
+        while self.running:
+            self.wakeup.wait()
+            time.sleep(self.flush_interval)  # let a burst of records pile up into one write
+            self.wakeup.clear(); self.flush()
+
+    def flush(self):
+        with self.lock:
+            records = self.records; lines = []
+            while records:
+                message, args = records.popleft()
+                try: lines.append(message % args if args else message)
+                except (TypeError, ValueError) as e: lines.append(f"{message} {args!r} (log format error: {e})")
+            if self.dropped: lines.append(f"[WARNING] Log buffer full; dropped {self.dropped} record(s)."); self.dropped = 0
+            if lines:
+                try: self.stream.write("\n".join(lines) + "\n"); self.stream.flush()
+                except (OSError, ValueError): pass
+
+    def close(self):
+        self.running = False; self.wakeup.set(); self.thread.join(timeout=1.0); self.flush()
 
 class CoreAPI:
-    def __init__(self, controller, log_function, plugin_name="Core"):
+    def __init__(self, controller, log_function, plugin_name="Core", core=None, runner=None):
         self.controller = controller
         self._log = log_function
         self._plugin_name = plugin_name
+        self._core = core
+        self._runner = runner
+
+    def _to_core(self, callback, *args):
+        # Plugins running on their own thread hand every call over to the core thread
+        if self._runner is None or self._runner.thread is None: callback(*args)
+        elif self._runner.alive: self._core.post(callback, *args)
 
     def set_digital_state(self, pin, state):
-        cmd = f"D,{pin},{1 if state else 0}"
-        self.controller.send_command_no_wait(cmd)
+        self._to_core(self.controller.send_output, 'D', pin, 1 if state else 0)
 
     def set_pwm_value(self, pin, value):
         value = max(0, min(255, int(value)))
-        cmd = f"P,{pin},{value}"
-        self.controller.send_command_no_wait(cmd)
+        self._to_core(self.controller.send_output, 'P', pin, value)
 
     def set_servo_angle(self, pin, angle):
         angle = max(0, min(180, int(angle)))
-        cmd = f"S,{pin},{angle}"
-        self.controller.send_command_no_wait(cmd)
+        self._to_core(self.controller.send_output, 'S', pin, angle)
+
+    def call_later(self, delay, callback, *args):
+        timer = PluginTimer(callback, args, 0, time.monotonic() + max(0.0, delay), self._runner)
+        self._to_core(self._core.start_plugin_timer, timer)
+        return timer
+
+    def call_every(self, period, callback, *args):
+        timer = PluginTimer(callback, args, period, time.monotonic() + max(0.0, period), self._runner)
+        self._to_core(self._core.start_plugin_timer, timer)
+        return timer
+
+    def cancel(self, timer):
+        if timer is not None: timer.cancelled = True
+
+    def subscribe_digital(self, pin, callback):
+        subscription = Subscription(pin, callback, runner=self._runner, prefix=self.controller.pin_prefix)
+        self._to_core(self._core.subscribe, subscription)
+        return subscription
+
+    def subscribe_analog(self, pin, callback, decimate=1, block_size=1):
+        subscription = Subscription(pin, callback, decimate, block_size, self._runner, self.controller.pin_prefix)
+        self._to_core(self._core.subscribe, subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        if subscription is not None: self._to_core(self._core.unsubscribe, subscription)
         
     def log(self, message, level='info'):
         level_map = {'debug': 4, 'info': 2, 'warning': 1, 'error': 1}
         numeric_level = level_map.get(level.lower(), 2)
-        self._log(f"[Plugin: {self._plugin_name}] {message}", level=numeric_level)
+        self._log("[Plugin: %s] %s", self._plugin_name, message, level=numeric_level)
+
+class PluginRunner:
+    # Runs one plugin's code and times every call; with threaded=True the calls run on a thread of its own,
+    # so a slow plugin cannot hold up key handling and can be replaced by a fresh instance when it hangs
+    def __init__(self, name, module, settings, budget, log_func, threaded=True, device=None):
+        self.name = name; self.module = module; self.settings = settings; self.device = device
+        self.budget = budget; self.log = log_func
+        self.plugin = None; self.alive = True
+        self.busy_since = None; self.resume_at = 0.0
+        self.overruns = 0; self.reported_overruns = 0; self.longest = 0.0; self.dropped = 0; self.reported_at = 0.0
+        self.calls = 0; self.busy_total = 0.0; self.busy_max = 0.0
+        self.inbox = queue.SimpleQueue(); self.thread = None
+        if threaded:
+            self.thread = threading.Thread(target=self._run, name=f"plugin-{name}", daemon=True)
+            self.thread.start()
+    @property
+    def idle(self): return self.busy_since is None and self.inbox.empty()
+    def post(self, callback, args):
+        if self.thread is None: self._call(callback, args)
+        elif self.inbox.qsize() < PLUGIN_BACKLOG: self.inbox.put((callback, args))
+        else: self.dropped += 1
+    def stop(self):
+        self.alive = False
+        if self.thread is not None: self.inbox.put(None)
+    def _run(self):
+        while True:
+            call = self.inbox.get()
+            if call is None or not self.alive: return
+            self._call(*call)
+    def _call(self, callback, args):
+        start = self.busy_since = time.monotonic()
+        try: callback(*args)
+        except Exception as e: self.log("[ERROR] Plugin '%s' failed: %s", self.name, e, level=1)
+        end = time.monotonic(); self.busy_since = None
+        elapsed = end - start
+        self.calls += 1; self.busy_total += elapsed
+        if elapsed > self.busy_max: self.busy_max = elapsed
+        if elapsed > self.budget:
+            # Periodic calls pause for as long as the overrunning call took, so a slow plugin gets at most half a core
+            self.overruns += 1; self.longest = max(self.longest, elapsed); self.resume_at = end + elapsed
+
+class PluginTimer:
+    __slots__ = ('callback', 'args', 'period', 'deadline', 'cancelled', 'runner')
+    def __init__(self, callback, args, period, deadline, runner=None):
+        self.callback = callback; self.args = args; self.period = period; self.deadline = deadline; self.cancelled = False
+        self.runner = runner
+
+class Subscription:
+    # Delivers every decimate-th value of a pin, either one by one or as lists of block_size values;
+    # pin is the device-qualified name events carry, local_pin the name the plugin is called with
+    __slots__ = ('pin', 'local_pin', 'callback', 'decimate', 'block_size', 'skipped', 'block', 'runner')
+    def __init__(self, pin, callback, decimate=1, block_size=1, runner=None, prefix=""):
+        self.local_pin = str(pin).upper(); self.pin = prefix + self.local_pin; self.callback = callback
+        self.decimate = max(1, int(decimate)); self.block_size = max(1, int(block_size))
+        self.skipped = 0; self.block = []; self.runner = runner
+
+class KeyState:
+    __slots__ = ('key', 'pressed', 'hold_time', 'queued')
+    def __init__(self, key):
+        self.key = key; self.pressed = False; self.hold_time = 0.0; self.queued = False
+
+class AnalogThreshold:
+    __slots__ = ('state', 't_min', 't_max', 'hysteresis', 'hold_required', 'enter_time')
+    def __init__(self, state, entry):
+        self.state = state; self.t_min, self.t_max = entry['threshold']
+        self.hysteresis = max(0, int(entry.get('hysteresis', 0)))
+        self.hold_required = entry.get('hold_time_ms', 0) / 1000.0
+        self.enter_time = 0.0
+
+class AnalogPin:
+    # enter[v] / stay[v] are bitmasks of the thresholds whose band (without / with hysteresis) contains sample v
+    __slots__ = ('pin', 'thresholds', 'enter', 'stay', 'active', 'pending')
+    def __init__(self, pin, thresholds):
+        self.pin = pin; self.thresholds = thresholds
+        self.enter = [0] * (ADC_MAX + 1); self.stay = [0] * (ADC_MAX + 1)
+        self.active = 0; self.pending = 0
+        for i, threshold in enumerate(thresholds):
+            bit = 1 << i
+            for v in range(max(0, threshold.t_min), min(ADC_MAX, threshold.t_max) + 1): self.enter[v] |= bit
+            for v in range(max(0, threshold.t_min - threshold.hysteresis), min(ADC_MAX, threshold.t_max + threshold.hysteresis) + 1): self.stay[v] |= bit
+
+# Analog filter stages: run(block) takes a list of samples and returns the samples to pass on, which may be fewer.
+# Stages keep their state between blocks, so splitting a stream into blocks does not change what comes out
+class SpikeFilter:
+    # Drops a sample that jumps more than max_jump from the last one passed, unless confirm samples in a row agree on the jump
+    __slots__ = ('max_jump', 'confirm', 'last', 'candidate', 'count')
+    def __init__(self, options):
+        self.max_jump = int(options.get('max_jump', 100)); self.confirm = max(1, int(options.get('confirm', 2)))
+        self.last = None; self.candidate = 0; self.count = 0
+    def run(self, block):
+        out = []; last = self.last; candidate = self.candidate; count = self.count; max_jump = self.max_jump
+        for value in block:
+            if last is None or abs(value - last) <= max_jump: last = value; count = 0; out.append(value); continue
+            if count and abs(value - candidate) <= max_jump: count += 1
+            else: candidate = value; count = 1
+            if count >= self.confirm: last = value; count = 0; out.append(value)
+        self.last = last; self.candidate = candidate; self.count = count
+        return out
+
+class DebounceFilter:
+    # Passes samples only once samples of them in a row stayed within tolerance of the first of the run
+    __slots__ = ('samples', 'tolerance', 'anchor', 'count')
+    def __init__(self, options):
+        self.samples = max(1, int(options.get('samples', 3))); self.tolerance = int(options.get('tolerance', 8))
+        self.anchor = None; self.count = 0
+    def run(self, block):
+        out = []; anchor = self.anchor; count = self.count; tolerance = self.tolerance
+        for value in block:
+            if anchor is not None and abs(value - anchor) <= tolerance: count += 1
+            else: anchor = value; count = 1
+            if count >= self.samples: out.append(value)
+        self.anchor = anchor; self.count = count
+        return out
+
+class MovingAverage:
+    # Rounded mean of the last window samples (of fewer while the window fills)
+    __slots__ = ('window', 'history', 'total')
+    def __init__(self, options):
+        self.window = max(1, int(options.get('window', 4))); self.history = deque(maxlen=self.window); self.total = 0
+    def run(self, block):
+        history = self.history; window = self.window; out = []; total = self.total
+        for value in block:
+            if len(history) == window: total -= history[0]
+            history.append(value); total += value; count = len(history)
+            out.append((total + count // 2) // count)
+        self.total = total
+        return out
+
+class MovingMedian:
+    # Median of the last window samples; an even count averages the middle two
+    __slots__ = ('window', 'history')
+    def __init__(self, options):
+        self.window = max(1, int(options.get('window', 5))); self.history = deque(maxlen=self.window)
+    def run(self, block):
+        history = self.history; out = []
+        for value in block:
+            history.append(value); ordered = sorted(history); count = len(ordered)
+            out.append((ordered[(count - 1) // 2] + ordered[count // 2] + 1) // 2)
+        return out
+
+class ExponentialAverage:
+    # level += alpha * (sample - level), starting at the first sample
+    __slots__ = ('alpha', 'level')
+    def __init__(self, options):
+        self.alpha = min(1.0, max(0.001, float(options.get('alpha', 0.3)))); self.level = None
+    def run(self, block):
+        alpha = self.alpha; level = self.level; out = []
+        for value in block:
+            level = value if level is None else level + alpha * (value - level)
+            out.append(int(level + 0.5))
+        self.level = level
+        return out
+
+ANALOG_FILTERS = {'spike': SpikeFilter, 'debounce': DebounceFilter, 'average': MovingAverage, 'median': MovingMedian, 'ema': ExponentialAverage}
+
+class AnalogConditioner:
+    # An analog pin with filter stages; its samples are collected while the main loop drains the serial events and filtered as one block
+    __slots__ = ('analog', 'stages', 'block', 'queued')
+    def __init__(self, analog, stages):
+        self.analog = analog; self.stages = stages; self.block = []; self.queued = False
+
+MACRO_PRESS, MACRO_RELEASE, MACRO_DELAY = range(3)
+
+class Macro:
+    # A compiled key sequence of (MACRO_PRESS, KeyState), (MACRO_RELEASE, KeyState) and (MACRO_DELAY, seconds) steps
+    __slots__ = ('steps', 'triggered', 'cancelled', 'runs')
+    def __init__(self, steps):
+        self.steps = steps; self.triggered = 0.0; self.cancelled = False; self.runs = []
+
+class MacroRun:
+    # One playback of a macro; every trigger starts its own, so runs of the same or different macros overlap freely
+    __slots__ = ('macro', 'index', 'deadline', 'held')
+    def __init__(self, macro, start):
+        self.macro = macro; self.index = 0; self.deadline = start; self.held = []
+
+class TapHold:
+    # tap and hold are compiled actions; generation invalidates the hold timer of an earlier press
+    __slots__ = ('tap', 'hold', 'hold_time', 'down', 'holding', 'generation')
+    def __init__(self, tap, hold, hold_time):
+        self.tap = tap; self.hold = hold; self.hold_time = hold_time
+        self.down = False; self.holding = False; self.generation = 0
+
+class Chord:
+    __slots__ = ('pins', 'action', 'window', 'active', 'members')
+    def __init__(self, pins, action, window):
+        self.pins = pins; self.action = action; self.window = window; self.active = False; self.members = []
+
+class ChordPin:
+    # A pin taking part in chords; handler is its own action, used when its press does not complete a chord.
+    # chord is the chord its press fired, consumed marks a press that went to a chord which has already ended
+    __slots__ = ('pin', 'chords', 'handler', 'chord', 'consumed')
+    def __init__(self, pin, chords, handler):
+        self.pin = pin; self.chords = chords; self.handler = handler; self.chord = None; self.consumed = False
+
+class Device:
+    # One board: its port, its part of the key mapping and the plugins driving its pins; with several boards
+    # every pin name in events, handlers and subscriptions is prefixed with "<name>:"
+    def __init__(self, name, port, key_mapping, plugin_configs, chords=()):
+        self.name = name; self.port = port
+        self.key_mapping = key_mapping; self.plugin_configs = plugin_configs; self.chords = chords
+        self.pin_prefix = f"{name}:" if name else ""
+        self.controller = None
+        self.pin_setup = {}  # pin -> (mode, read) as last sent to the board
+
+class SessionRecorder:
+    # Writes every serial read and write of every board with its time; reads come from the reader threads, so writes are locked
+    def __init__(self, path, config_text=""):
+        self.file = open(path, 'wb'); self.lock = threading.Lock(); self.ports = []
+        self.start = time.monotonic(); self.last_us = 0; self.next_index_us = 0; self.index = []
+        self.file.write(RECORD_HEADER.pack(RECORD_MAGIC, self.start, time.time())); self.offset = RECORD_HEADER.size
+        self.record(REC_CONFIG, 0, config_text.encode('utf-8'))
+    def open_port(self, port):
+        with self.lock: self.ports.append(port); index = len(self.ports) - 1
+        self.record(REC_PORT, index, port.encode('utf-8'))
+        return index
+    def record(self, kind, port, data):
+        with self.lock:
+            if self.file is None: return
+            now_us = max(self.last_us, int((time.monotonic() - self.start) * 1_000_000))
+            if now_us - self.last_us > 0xFFFFFFFF: self._write(0, REC_TIME, 0, RECORD_TIME.pack(now_us))
+            if now_us >= self.next_index_us:
+                # Flushed once per index entry, so a crash loses at most about a second
+                self.index.append((now_us, self.offset)); self.next_index_us = now_us + RECORD_INDEX_INTERVAL; self.file.flush()
+            delta = now_us - self.last_us; self.last_us = now_us
+            for start in range(0, max(1, len(data)), RECORD_MAX_DATA):
+                self._write(delta, kind, port, data[start:start + RECORD_MAX_DATA]); delta = 0
+    def _write(self, delta, kind, port, data):
+        self.file.write(RECORD.pack(delta, kind, port, len(data))); self.file.write(data); self.offset += RECORD.size + len(data)
+    def close(self):
+        with self.lock:
+            if self.file is None: return
+            ports = json.dumps(self.ports).encode('utf-8')
+            for entry in self.index: self.file.write(RECORD_INDEX_ENTRY.pack(*entry))
+            self.file.write(ports); self.file.write(RECORD_FOOTER.pack(self.offset, len(self.index), len(ports), RECORD_INDEX_MAGIC))
+            self.file.close(); self.file = None
+
+class SessionRecording:
+    # Read side of a recording. The file is memory-mapped and records(start) seeks through the time index,
+    # so a capture of any length is neither loaded into memory nor scanned up to the point of interest
+    def __init__(self, path):
+        self.file = open(path, 'rb')
+        try: self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError: raise ValueError(f"{path} is not a Keymapuino recording")
+        if len(self.map) < RECORD_HEADER.size or self.map[:len(RECORD_MAGIC)] != RECORD_MAGIC: raise ValueError(f"{path} is not a Keymapuino recording")
+        _, self.start_monotonic, self.start_time = RECORD_HEADER.unpack_from(self.map, 0)
+        self.end = len(self.map); self.index = None; self.ports = []
+        if self.end >= RECORD_HEADER.size + RECORD_FOOTER.size:
+            index_offset, count, ports_size, magic = RECORD_FOOTER.unpack_from(self.map, self.end - RECORD_FOOTER.size)
+            if magic == RECORD_INDEX_MAGIC:
+                self.index = [RECORD_INDEX_ENTRY.unpack_from(self.map, index_offset + i * RECORD_INDEX_ENTRY.size) for i in range(count)]
+                ports_offset = index_offset + count * RECORD_INDEX_ENTRY.size
+                self.ports = json.loads(self.map[ports_offset:ports_offset + ports_size]); self.end = index_offset
+        if self.index is None: self._scan()
+        self.index_times = [entry[0] for entry in self.index]
+        first = next(self.records(), None)
+        self.config_text = first[3].decode('utf-8') if first is not None and first[1] == REC_CONFIG else None
+    def _scan(self):
+        self.index = []; next_index_us = 0
+        for offset, t, kind, port, data in self._read(0, RECORD_HEADER.size, False):
+            if t >= next_index_us: self.index.append((t, offset)); next_index_us = t + RECORD_INDEX_INTERVAL
+            if kind == REC_PORT: self.ports.append(data.decode('utf-8'))
+    def _read(self, t, offset, absolute):
+        # absolute: t is the time of the record at offset itself (an index entry) rather than of the one before it
+        data_map = self.map; end = self.end
+        while offset + RECORD.size <= end:
+            delta, kind, port, length = RECORD.unpack_from(data_map, offset)
+            if offset + RECORD.size + length > end: break
+            data = data_map[offset + RECORD.size:offset + RECORD.size + length]
+            if absolute: absolute = False
+            else: t += delta
+            if kind == REC_TIME: t = RECORD_TIME.unpack(data)[0]
+            else: yield offset, t, kind, port, data
+            offset += RECORD.size + length
+    def records(self, start=0.0):
+        # (seconds since the recording started, kind, port, data) for every record from start on
+        start_us = int(start * 1_000_000)
+        position = bisect.bisect_right(self.index_times, start_us) - 1
+        t, offset = self.index[position] if position >= 0 else (0, RECORD_HEADER.size)
+        for _, t, kind, port, data in self._read(t, offset, position >= 0):
+            if t >= start_us: yield t / 1_000_000, kind, port, data
+    @property
+    def duration(self):
+        last = self.index[-1] if self.index else (0, RECORD_HEADER.size)
+        return max((t for _, t, _, _, _ in self._read(last[0], last[1], bool(self.index))), default=0) / 1_000_000
+    def close(self): self.map.close(); self.file.close()
+
+class SessionReplay:
+    # Plays a recording back to the controllers through ReplaySerial ports; speed 1 is real time, 0 as fast as the CLI keeps up
+    # start skips ahead: the boards' setup is replayed first, then every port continues at start, found through the time index
+    def __init__(self, recording, speed=1.0, events=None, on_end=None, start=0.0):
+        self.recording = recording; self.speed = speed; self.events = events; self.on_end = on_end; self.seek = start; self.shift = 0.0
+        self.start = time.monotonic(); self.lock = threading.Lock(); self.claimed = []; self.open_ports = 0; self.finished = 0
+    def open_port(self, port):
+        # Ports are matched by name; a port the recording does not know takes the first unclaimed recorded one
+        ports = self.recording.ports
+        with self.lock:
+            index = ports.index(port) if port in ports and ports.index(port) not in self.claimed else next((i for i in range(len(ports)) if i not in self.claimed), None)
+            if index is None: raise serial.SerialException(f"not in the recording (recorded: {', '.join(ports) or 'none'})")
+            self.claimed.append(index); self.open_ports += 1
+        return ReplaySerial(self, index)
+    def due(self, t):
+        if t >= self.seek: t -= self.shift
+        return self.start + t / self.speed if self.speed else 0.0
+    def resume_at(self, t):
+        # Called by each port at the recorded end of the setup (t); the skipped time does not count towards due()
+        if self.seek <= t: return None
+        self.shift = self.seek - t
+        return self.recording.records(self.seek)
+    def backlogged(self): return not self.speed and self.events is not None and self.events.qsize() > REPLAY_BACKLOG
+    def port_finished(self):
+        with self.lock: self.finished += 1; done = self.finished == self.open_ports
+        if done and self.on_end is not None: self.on_end()
+
+class ReplaySerial:
+    # Stands in for one serial port during a replay. Recorded input is served at its recorded time, and not before the CLI
+    # has sent as many commands on this port as it had when that input arrived, so every reply follows its command
+    def __init__(self, replay, port):
+        self.replay = replay; self.port = port; self.records = replay.recording.records()
+        self.is_open = True; self.baudrate = TEXT_BAUD_RATE; self.timeout = 1
+        self.buffer = bytearray(); self.pending = None; self.held_since = None; self.ended = False
+        self.commands_sent = 0; self.commands_recorded = 0; self.changed = threading.Condition()
+    @property
+    def in_waiting(self): return len(self.buffer)
+    def write(self, data): return len(data)
+    def command_written(self):
+        with self.changed: self.commands_sent += 1; self.changed.notify_all()
+    def _next_input(self):
+        for t, kind, port, data in iter(lambda: next(self.records, None), None):
+            if kind == REC_END: break
+            if kind == REC_READY: self.records = self.replay.resume_at(t) or self.records
+            elif port != self.port: continue
+            elif kind == REC_COMMAND: self.commands_recorded += 1
+            elif kind == REC_RX: return t, self.commands_recorded, data
+        self.ended = True; self.replay.port_finished()
+        return None
+    def _fill(self, deadline):
+        # Moves the next due input into buffer; False if there is none before deadline
+        if self.pending is None and not self.ended: self.pending = self._next_input(); self.held_since = None
+        with self.changed:
+            if self.pending is None: self.changed.wait(max(0.0, deadline - time.monotonic())); return False
+            t, commands, data = self.pending; due = self.replay.due(t)
+            while self.is_open:
+                now = time.monotonic()
+                if now < due: wake = due
+                elif self.commands_sent < commands and now < (self.held_since or now) + REPLAY_COMMAND_WAIT:
+                    if self.held_since is None: self.held_since = now
+                    wake = self.held_since + REPLAY_COMMAND_WAIT
+                elif self.replay.backlogged(): wake = now + 0.001
+                else: break
+                if now >= deadline: return False
+                self.changed.wait(min(wake, deadline) - now)
+            if not self.is_open: return False
+        self.buffer += data; self.pending = None
+        return True
+    def read(self, size=1):
+        deadline = time.monotonic() + self.timeout
+        while not self.buffer and self.is_open and self._fill(deadline): pass
+        data = bytes(self.buffer[:size]); del self.buffer[:size]
+        return data
+    def readline(self):
+        deadline = time.monotonic() + self.timeout
+        while b'\n' not in self.buffer and self.is_open and self._fill(deadline): pass
+        end = self.buffer.find(b'\n') + 1 or len(self.buffer)
+        data = bytes(self.buffer[:end]); del self.buffer[:end]
+        return data
+    def cancel_read(self):
+        with self.changed: self.is_open = False; self.changed.notify_all()
+    def close(self): self.cancel_read()
 
 class ArduinoController:
-    def __init__(self, port, baud_rate=9600, timeout=1, log_func=print):
-        try: self.ser = serial.Serial(port, baud_rate, timeout=timeout)
-        except serial.SerialException as e: print(f"[ERROR] Could not open serial port '{port}': {e}"); sys.exit(1)
-        self.log = log_func; time.sleep(2)
+    def __init__(self, port, baud_rate=TEXT_BAUD_RATE, timeout=1, log_func=print, reset_timeout=2.0, events=None, pin_prefix="", recorder=None, replay=None):
+        try: self.ser = replay.open_port(port) if replay is not None else serial.serial_for_url(port, baud_rate, timeout=timeout)
+        except serial.SerialException as e: raise serial.SerialException(f"Could not open serial port '{port}': {e}") from e
+        # Every read and write is recorded with --record; during a replay the port counts the commands it is sent
+        self.recorder = recorder; self.record_port = recorder.open_port(port) if recorder is not None else None
+        self.replaying = replay is not None
+        # socket:// ports (ser2net, the emulator) would otherwise hold small commands back until earlier ones are acknowledged
+        if getattr(self.ser, '_socket', None) is not None: self.ser._socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.port = port
+        self.log = log_func
+        self.text_baud_rate = baud_rate
+        # Several controllers may share one events queue, which the main loop then waits on for all of them
+        self.events = events if events is not None else queue.Queue()
+        self.pin_prefix = pin_prefix; self.pin_names = tuple(pin_prefix + name for name in PIN_NAMES)
+        self.responses = queue.Queue()
+        self.ready = threading.Event(); self.banner = None; self.config_hash = None
+        self.binary = False; self.crc_errors = 0; self.frames_lost = 0
+        self._switch_to = None; self._rx_buffer = bytearray(); self._rx_seq = None
+        self._awaiting = False
+        self.metrics = None
+        self.bytes_in = 0; self.bytes_out = 0; self.lines_received = 0; self.parse_errors = 0
+        self.outputs = {}; self.outputs_sent = 0; self.outputs_merged = 0; self.outputs_dropped = 0
+        self._output_tokens = OUTPUT_BURST; self._output_refill = time.monotonic()
+        self._seq = itertools.cycle(range(1, 0x10000))
+        self._closing = False; self._write_lock = threading.Lock()
+        self._reader = threading.Thread(target=self._read_loop, name="serial-reader", daemon=True)
+        self._reader.start()
+        if self.ready.wait(reset_timeout): self.log("Arduino on %s ready: %s", port, self.banner, level=3)
+        else: self.log("No READY banner from Arduino on %s, assuming legacy firmware.", port, level=2)
+    @staticmethod
+    def crc8(data):
+        crc = 0
+        for byte in data: crc = CRC8_TABLE[crc ^ byte]
+        return crc
+    @classmethod
+    def encode_frame(cls, frame_type, pin, value, seq=0):
+        body = FRAME_BODY.pack(ord(frame_type), pin, value & 0xFFFF, seq & 0xFF)
+        return bytes((FRAME_SYNC,)) + body + bytes((cls.crc8(body),))
+    def decode_frames(self, buffer):
+        frames = []
+        while True:
+            start = buffer.find(FRAME_SYNC)
+            if start < 0: buffer.clear(); break
+            if start: del buffer[:start]
+            if len(buffer) < FRAME_SIZE: break
+            if self.crc8(buffer[1:FRAME_SIZE - 1]) != buffer[FRAME_SIZE - 1]:
+                self.crc_errors += 1; del buffer[0]
+                self.log("Dropped corrupted frame (%d so far).", self.crc_errors, level=2)
+                continue
+            frame_type, pin, value, seq = FRAME_BODY.unpack_from(buffer, 1)
+            frames.append((chr(frame_type), pin, value, seq)); del buffer[:FRAME_SIZE]
+        return frames
+    def _read_loop(self):
+        while not self._closing:
+            try:
+                if self.binary: self._read_frames()
+                else: self._read_text()
+            except (serial.SerialException, OSError, TypeError, AttributeError) as e:
+                if not self._closing: self.log("[ERROR] Serial read on %s failed: %s", self.port, e, level=1); self.events.put(('disconnect', self.port, None, None))
+                return
+    def _read_text(self):
+        raw = self.ser.readline()
+        if not raw: return
+        if self.recorder is not None: self.recorder.record(REC_RX, self.record_port, raw)
+        received = time.monotonic(); self.bytes_in += len(raw)
+        line = raw.decode('utf-8', errors='replace').strip()
+        if not line: return
+        if line.upper() == 'OK' or line.startswith('ERROR:') or line.startswith('#'): self._put_response(line); return
+        if line.startswith('READY'):
+            if self.ready.is_set(): self.log("[WARNING] Arduino on %s reset detected.", self.port, level=1)
+            fields = dict(field.split('=', 1) for field in line.split()[1:] if '=' in field)
+            try: self.config_hash = int(fields['cfg'], 16)
+            except (KeyError, ValueError): self.config_hash = None
+            self.banner = line; self.ready.set(); return
+        self.log("Received from Arduino: %s", line, level=4)
+        event = self._parse_line(line, received)
+        if event: self.lines_received += 1; self.events.put(event)
+    def _read_frames(self):
+        # At least the rest of the current frame, so a recording gets one record per frame rather than per byte
+        data = self.ser.read(max(self.ser.in_waiting, FRAME_SIZE - len(self._rx_buffer)))
+        if not data: return
+        if self.recorder is not None: self.recorder.record(REC_RX, self.record_port, data)
+        received = time.monotonic(); self.bytes_in += len(data)
+        self._rx_buffer += data
+        for frame_type, pin, value, seq in self.decode_frames(self._rx_buffer):
+            if self._rx_seq is not None and seq != self._rx_seq: self.frames_lost += (seq - self._rx_seq) & 0xFF
+            self._rx_seq = (seq + 1) & 0xFF
+            self.log("Received frame from Arduino: %s pin=%s value=%s seq=%s", frame_type, pin, value, seq, level=4)
+            pin_name = self.pin_names[pin] if pin < len(self.pin_names) else f"{self.pin_prefix}{pin}"
+            if frame_type == 'A': self.lines_received += 1; self.events.put(('analog', pin_name, value, received))
+            elif frame_type == 'D': self.lines_received += 1; self.events.put(('digital', pin_name, 1 if value else 0, received))
+            elif frame_type == 'K': self._put_response(f"#{value} OK" if value else "OK")
+            elif frame_type == 'E':
+                message = ERROR_MESSAGES[pin] if pin < len(ERROR_MESSAGES) else ERROR_MESSAGES[0]
+                self._put_response(f"#{value} ERROR: {message}" if value else f"ERROR: {message}")
+    def _put_response(self, response):
+        if self._switch_to is not None and response.upper().endswith('OK'):
+            self.binary, baud_rate = self._switch_to; self._switch_to = None
+            self.ser.baudrate = baud_rate; self._rx_buffer.clear(); self._rx_seq = None
+        if self._awaiting: self.responses.put(response)
+        else: self.log("Arduino reported: %s", response, level=2)
+    def _parse_line(self, line, received=None):
+        prefix = self.pin_prefix
+        if line[0] in '+-': return ('digital', prefix + line[1:], 1 if line[0] == '+' else 0, received)
+        if ':' in line:
+            pin, value_str = line.split(':', 1)
+            try: return ('analog', prefix + pin, int(value_str), received)
+            except ValueError: self.parse_errors += 1; self.log("Could not parse analog value: %s", line, level=2); return None
+        return ('digital', prefix + line, None, received)
+    def _write(self, data, command=True):
+        # command: data the firmware answers; outputs are written with command=False
+        # A config reload sends its pin commands from its own thread while the main loop writes outputs
+        with self._write_lock: self.bytes_out += len(data); self.ser.write(data)
+        if self.recorder is not None: self.recorder.record(REC_COMMAND if command else REC_OUTPUT, self.record_port, data)
+        if command and self.replaying: self.ser.command_written()
     def _send_and_wait(self, command, timeout=2.0):
-        self.ser.write(f"{command}\n".encode('utf-8')); self.log(f"Sent: {command}", level=4); start_time = time.time()
-        while time.time() - start_time < timeout:
-            if self.ser.in_waiting > 0:
-                response = self.ser.readline().decode('utf-8').strip(); self.log(f"Received: {response}", level=4)
-                if response == 'OK': return True, "OK"
-                if response.startswith('ERROR:'): return False, response
-        return False, "Timeout"
+        while not self.responses.empty(): self.responses.get_nowait()
+        self._awaiting = True
+        try:
+            self._write(f"{command}\n".encode('utf-8')); self.log("Sent: %s", command, level=4)
+            sent = time.monotonic()
+            response = self.responses.get(timeout=timeout)
+            if self.metrics is not None: self.metrics.rtt.add(time.monotonic() - sent)
+        except queue.Empty: return False, "Timeout"
+        finally: self._awaiting = False
+        self.log("Received: %s", response, level=4)
+        if response.upper() == 'OK': return True, "OK"
+        return False, response
+    def send_batch(self, commands, timeout=2.0):
+        if not self.ready.is_set(): return [(command, *self._send_and_wait(command, timeout)) for command in commands]
+        while not self.responses.empty(): self.responses.get_nowait()
+        results = [(command, False, "Timeout") for command in commands]
+        pending = {}; in_flight = 0
+        self._awaiting = True
+        try:
+            for index, command in enumerate(commands):
+                seq = next(self._seq)
+                data = f"#{seq} {command}\n".encode('utf-8')
+                while pending and in_flight + len(data) > RX_BUFFER_SIZE:
+                    freed = self._collect_reply(pending, results, timeout)
+                    if freed is None: pending.clear(); in_flight = 0
+                    else: in_flight -= freed
+                self._write(data); self.log("Sent: #%d %s", seq, command, level=4)
+                pending[seq] = (index, len(data), time.monotonic()); in_flight += len(data)
+            while pending:
+                if self._collect_reply(pending, results, timeout) is None: break
+        finally: self._awaiting = False
+        return results
+    def _collect_reply(self, pending, results, timeout):
+        while True:
+            try: response = self.responses.get(timeout=timeout)
+            except queue.Empty: return None
+            self.log("Received: %s", response, level=4)
+            tag, _, body = response.partition(' ')
+            try: index, size, sent = pending.pop(int(tag[1:]))
+            except (ValueError, KeyError): continue
+            if self.metrics is not None: self.metrics.rtt.add(time.monotonic() - sent)
+            results[index] = (results[index][0], body == 'OK', body)
+            return size
     def configure_pin(self, pin, mode): return self._send_and_wait(f"pin {pin} mode {mode}")
     def start_reading(self, pin, read_type): return self._send_and_wait(f"pin {pin} read {read_type}")
-    def send_command_no_wait(self, command): self.ser.write(f"{command}\n".encode('utf-8')); self.log(f"Sent (no-wait): {command}", level=4)
-    def clear_all(self): return self._send_and_wait("clear")
-    def read_line(self):
-        if self.ser.in_waiting > 0: return self.ser.readline().decode('utf-8').strip()
-        return None
+    def set_protocol(self, binary, baud_rate=BINARY_BAUD_RATE, timeout=2.0):
+        if binary and 'bin' not in (self.banner or '').split()[1:]: return False
+        baud_rate = baud_rate if binary else self.text_baud_rate
+        self._switch_to = (binary, baud_rate)
+        ok, message = self._send_and_wait(f"proto binary {baud_rate}" if binary else "proto text", timeout)
+        if not ok:
+            self._switch_to = None
+            self.log("Could not switch serial protocol: %s", message, level=2); return False
+        self.log("Using %s serial protocol at %d baud.", 'binary' if binary else 'text', baud_rate, level=2)
+        return True
+    def send_output(self, kind, pin, value):
+        # Only the newest value per (kind, pin) is kept; flush_outputs() sends them as the link budget allows
+        key = (kind, str(pin).upper())
+        if key[1] not in PIN_NUMBERS: self.outputs_dropped += 1; self.log("[ERROR] Invalid output pin: %s", pin, level=1); return
+        if key in self.outputs: self.outputs_merged += 1
+        self.outputs[key] = value
+    def _encode_output(self, kind, pin, value):
+        if self.binary: return self.encode_frame(kind, PIN_NUMBERS[pin], value)
+        return f"{kind},{pin},{value}\n".encode('utf-8')
+    def flush_outputs(self):
+        outputs = self.outputs
+        if not outputs: return None
+        now = time.monotonic()
+        rate = min(self.ser.baudrate / 10, OUTPUT_BURST / FIRMWARE_LOOP_INTERVAL)
+        tokens = min(OUTPUT_BURST, self._output_tokens + (now - self._output_refill) * rate); self._output_refill = now
+        data = bytearray()
+        while outputs:
+            key = next(iter(outputs))
+            encoded = self._encode_output(*key, outputs[key])
+            if len(data) + len(encoded) > tokens: break
+            data += encoded; self.outputs_sent += 1
+            self.log("Sent (no-wait): %s,%s,%s", key[0], key[1], outputs.pop(key), level=4)
+        if data: self._write(data, command=False)
+        self._output_tokens = tokens - len(data)
+        if not outputs: return None
+        return (len(encoded) - self._output_tokens) / rate
+    def discard_outputs(self):
+        self.outputs_dropped += len(self.outputs); self.outputs.clear()
+    def send_command_no_wait(self, command): self._write(f"{command}\n".encode('utf-8')); self.log("Sent (no-wait): %s", command, level=4)
+    def clear_all(self): self.discard_outputs(); return self._send_and_wait("clear")
+    def commit_config(self, digest):
+        ok, message = self._send_and_wait(f"commit {digest:08X}")
+        if ok: self.config_hash = digest
+        return ok, message
+    def read_event(self, timeout=None):
+        try: return self.events.get(timeout=timeout)
+        except queue.Empty: return None
     def close(self):
-        if self.ser and self.ser.is_open: self.ser.close()
+        self._closing = True
+        if self.ser and self.ser.is_open:
+            if hasattr(self.ser, 'cancel_read'): self.ser.cancel_read()
+            self.ser.close()
+        self._reader.join(timeout=1.0)
 
 class KeymapuinoCLI:
-    def __init__(self, config_path, log_level=2, port=None):
+    def __init__(self, config_path, log_level=2, port=None, protocol='binary', plugin_mode='thread', plugin_budget_ms=5, stats_interval=0, stats_port=None, keyboard=None,
+                 config_poll=CONFIG_POLL_INTERVAL, plugins_dir=None, record=None, replay=None, replay_speed=1.0, replay_start=0.0, scope_port=None):
+        self.start_time = time.monotonic()
         self.config_path = config_path
         self.log_level = log_level
         self.port_override = port
+        self.protocol = protocol
+        self.plugin_mode = plugin_mode
+        self.plugin_budget = plugin_budget_ms / 1000.0
+        self.plugin_restart_after = 2.0
+        self.stats_interval = stats_interval
+        self.stats_port = stats_port
+        self.config_poll = config_poll
+        self.reload_requested = False; self._reload_thread = None
+        self.metrics = Metrics() if stats_interval or stats_port else None
+        self._last_stats = None
+        self.scope = ScopeServer(scope_port, self.log, self.start_time) if scope_port else None
         self.running = True
+        self.startup_time = None; self.plugin_load_time = None; self._import_time = 0.0
+        self.log_sink = LogSink()
+        atexit.register(self.log_sink.flush)
         
         self.key_states = {}
+        self.chord_pending = []; self.chord_generation = 0; self.chord_signatures = {}
+        self.filter_queue = []
+        self.timers = []
+        self._timer_seq = itertools.count()
         self.max_hold_time = 0.1
+        self.idle_timeout = 0.5
+        self.plugin_tick = 0.001
+        self.output_wait = None
+        self.subscriptions = {}
+
+        self.events = queue.Queue()
+        self.pin_handlers = {}
+        self.pin_mappings = {}
+        self._watchdog_started = False
+        self.plugin_registry = PluginRegistry(plugins_dir or os.path.join(get_base_path(), "plugins"))
+        plugins_parent = os.path.dirname(os.path.abspath(self.plugin_registry.plugins_dir))
+        if plugins_parent not in sys.path: sys.path.insert(1, plugins_parent)
 
         self.load_config()
+        # record is a file to write the serial traffic to; replay a recording played back instead of opening the ports
+        self.recorder = self.replay = None
+        try:
+            if record: self.recorder = SessionRecorder(record, self._config_text())
+            if replay:
+                recording = SessionRecording(replay)
+                if replay_start > recording.duration: raise ValueError(f"{replay} ends after {recording.duration:.1f} s, before the replay start")
+                self.replay = SessionReplay(recording, replay_speed, self.events, on_end=partial(self.post, self._replay_finished), start=replay_start)
+        except (OSError, ValueError) as e: print(f"[ERROR] {e}"); sys.exit(1)
         
-        self.keyboard = Controller()
-        self.controller = ArduinoController(self.port, log_func=self.log)
+        # keyboard is a backend name (overriding the config's "keyboard") or a ready backend object;
+        # the backend's and the plugins' modules are imported while the boards reset
+        if keyboard is None or isinstance(keyboard, str): keyboard = keyboard or self.keyboard_name
+        # plugin_load_time adds up the registry scan, the imports and creating the plugins, without the wait for the boards
+        scan_start = time.monotonic(); modules = self._startup_modules(keyboard); scan_time = time.monotonic() - scan_start
+        prefetch = threading.Thread(target=self._import_modules, args=(modules,), name="prefetch", daemon=True)
+        prefetch.start()
+        self._open_devices()
+        prefetch.join()
+        if isinstance(keyboard, str):
+            try: keyboard = create_keyboard(keyboard, self.log)
+            except ValueError as e:
+                print(f"[ERROR] {e}")
+                for device in self.devices: device.controller.close()
+                sys.exit(1)
+        self.keyboard = keyboard
+        self.controller = self.devices[0].controller
+        self.controllers = tuple(device.controller for device in self.devices)
+        if self.metrics is not None:
+            self.keyboard = TimedKeyboard(self.keyboard, self.metrics)
+            for controller in self.controllers: controller.metrics = self.metrics
+        load_start = time.monotonic()
         self.plugins = self._load_plugins()
+        self.plugin_load_time = scan_time + self._import_time + (time.monotonic() - load_start)
         
         signal.signal(signal.SIGINT, self.handle_sigint)
+        if hasattr(signal, 'SIGHUP'): signal.signal(signal.SIGHUP, self.handle_sighup)
 
-    def log(self, message, level=1):
-        if self.log_level >= level: print(message, flush=True)
+    def log(self, message, *args, level=1):
+        # Formatting is left to the log writer thread, so a suppressed level costs only this comparison
+        if self.log_level >= level: self.log_sink.write(message, args)
 
     def load_config(self):
         try:
-            with open(self.config_path) as config_file: config = json.load(config_file)
-            self.port = self.port_override if self.port_override else config['port']
-            self.key_mapping = config.get('key_mapping', {})
-            self.plugin_configs = config.get('plugins', [])
-            
-            for mapping in self.key_mapping.values():
-                if isinstance(mapping, dict):
-                    self.key_states[mapping['key']] = {'pressed': False, 'hold_time': 0}
-                elif isinstance(mapping, list):
-                    for entry in mapping: self.key_states[entry['key']] = {'pressed': False, 'hold_time': 0}
+            self.devices = self._read_config()
+            self._compile_key_mapping()
         except FileNotFoundError: print(f"[ERROR] Config file not found at: {self.config_path}"); sys.exit(1)
         except json.JSONDecodeError: print(f"[ERROR] Could not parse config file: {self.config_path}"); sys.exit(1)
+        except ValueError as e: print(f"[ERROR] {e}"); sys.exit(1)
+
+    def _config_stamp(self):
+        try: stat = os.stat(self.config_path)
+        except OSError: return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def _config_text(self):
+        try:
+            with open(self.config_path, 'r', encoding='utf-8') as f: return f.read()
+        except OSError: return ""
+
+    def _replay_finished(self):
+        self.log("Replay finished.", level=1); self.running = False
+
+    def _read_config(self):
+        # Stamped before reading, so a file caught halfway through being written is read again once the writer is done
+        self.config_stamp = self._config_stamp()
+        with open(self.config_path) as config_file: config = json.load(config_file)
+        self.keyboard_name = config.get('keyboard', 'pynput')
+        if self.keyboard_name not in KEYBOARD_BACKENDS: raise ValueError(f"Unknown keyboard backend '{self.keyboard_name}' (choose from {', '.join(KEYBOARD_BACKENDS)})")
+        return self._parse_devices(config)
+
+    def _parse_devices(self, config):
+        # {"devices": [{"name", "port", "key_mapping", "plugins"}, ...]} or the single-board form with port and key_mapping at the top;
+        # top-level plugins belong to the first board
+        shared_plugins = config.get('plugins', [])
+        if 'devices' not in config:
+            devices = [Device("", self.port_override or config['port'], config.get('key_mapping', {}), shared_plugins, config.get('chords', []))]
+        else:
+            devices = [Device(str(entry.get('name', index + 1)), entry['port'], entry.get('key_mapping', {}), entry.get('plugins', []) + (shared_plugins if index == 0 else []),
+                              entry.get('chords', []))
+                       for index, entry in enumerate(config['devices'])]
+            if not devices: raise ValueError(f"No devices in config file: {self.config_path}")
+        if self.port_override: devices[0].port = self.port_override
+        return devices
+
+    def _open_devices(self):
+        # Every board waits for its own reset and READY banner, so they are opened side by side; if one fails, the
+        # others are still waited for and closed before exiting
+        def open_device(device):
+            try: device.controller = ArduinoController(device.port, log_func=self.log, events=self.events, pin_prefix=device.pin_prefix, recorder=self.recorder, replay=self.replay)
+            except serial.SerialException as e: print(f"[ERROR] {e}")
+        run_concurrently(open_device, self.devices)
+        if any(device.controller is None for device in self.devices):
+            for device in self.devices:
+                if device.controller is not None: device.controller.close()
+            sys.exit(1)
+
+    def _key_state(self, key):
+        state = self.key_states.get(key)
+        if state is None: state = self.key_states[key] = KeyState(key)
+        return state
+
+    def _compile_key_mapping(self): self._install_key_mapping(*self._build_key_mapping(self.devices))
+
+    def _build_key_mapping(self, devices):
+        # Key states are shared, so the same key mapped on two boards is pressed once and released once.
+        # Pins whose mapping did not change keep their handler, and with it any hold or hysteresis state.
+        # Nothing running is touched until _install_key_mapping, so a mapping that does not compile leaves the old one
+        # in place; key states created for its keys are dropped again
+        handlers = {}; mappings = {}; keys = set(); signatures = {}; known = set(self.key_states)
+        try:
+            for device in devices:
+                chord_pins = self._compile_chords(device, handlers, keys, signatures)
+                for pin, mapping in device.key_mapping.items():
+                    pin = device.pin_prefix + pin
+                    entries = analog_thresholds(mapping)
+                    mappings[pin] = mapping
+                    if entries is not None: keys.update(entry['key'] for entry in entries)
+                    elif isinstance(mapping, dict): keys.update(mapping_keys(mapping))
+                    if pin in chord_pins: continue
+                    if pin in self.pin_handlers and self.pin_mappings.get(pin) == mapping: handlers[pin] = self.pin_handlers[pin]; continue
+                    if entries is not None:
+                        thresholds = tuple(AnalogThreshold(self._key_state(entry['key']), entry) for entry in entries)
+                        analog = AnalogPin(pin, thresholds); stages = compile_analog_filter(mapping)
+                        handlers[pin] = partial(self.handle_filtered_input, AnalogConditioner(analog, stages)) if stages else partial(self.handle_analog_input, analog)
+                    elif isinstance(mapping, dict): handlers[pin] = self._compile_action(mapping)
+        except Exception:
+            for key in set(self.key_states) - known: del self.key_states[key]
+            raise
+        return handlers, mappings, keys, signatures
+
+    def _install_key_mapping(self, handlers, mappings, keys, signatures):
+        for pin, handler in self.pin_handlers.items():
+            if handlers.get(pin) is not handler: self._retire_handler(handler)
+        self.pin_handlers = handlers; self.pin_mappings = mappings; self.chord_signatures = signatures
+        for key, state in list(self.key_states.items()):
+            if key in keys: continue
+            if state.pressed: self.keyboard.release(key); state.pressed = False; self.log("Released key: %s", key, level=1)
+            del self.key_states[key]
+
+    def _compile_action(self, mapping):
+        # A digital mapping, chord, tap or hold target compiled into a handler taking 1 (pressed), 0 (released) or None (legacy repeat)
+        if isinstance(mapping, str): mapping = {"key": mapping}
+        if 'macro' in mapping: return partial(self.handle_macro_input, self._compile_macro(mapping))
+        if 'tap' in mapping or 'hold' in mapping:
+            if 'tap' not in mapping or 'hold' not in mapping: raise ValueError(f"A tap/hold mapping needs both 'tap' and 'hold': {mapping}")
+            return partial(self.handle_tap_hold_input, TapHold(self._compile_action(mapping['tap']), self._compile_action(mapping['hold']), mapping.get('hold_ms', 200) / 1000.0))
+        if 'key' not in mapping: raise ValueError(f"A mapping needs 'key', 'macro' or 'tap' and 'hold': {mapping}")
+        return partial(self.handle_digital_input, self._key_state(mapping['key']))
+
+    def _compile_macro(self, mapping):
+        # Steps are key names (tapped), {"tap"|"press"|"release": key} or {"delay_ms": n}; interval_ms is waited after every key event
+        interval = mapping.get('interval_ms', 0) / 1000.0; steps = []
+        for step in mapping['macro']:
+            if isinstance(step, str): step = {"tap": step}
+            if 'delay_ms' in step: steps.append((MACRO_DELAY, step['delay_ms'] / 1000.0)); continue
+            kind = next((kind for kind in ('tap', 'press', 'release') if kind in step), None)
+            if kind is None: raise ValueError(f"Invalid macro step: {step}")
+            state = self._key_state(step[kind])
+            for action in ((MACRO_PRESS, MACRO_RELEASE) if kind == 'tap' else (MACRO_PRESS,) if kind == 'press' else (MACRO_RELEASE,)):
+                steps.append((action, state))
+                if interval: steps.append((MACRO_DELAY, interval))
+        if interval and steps: steps.pop()
+        return Macro(tuple(steps))
+
+    def _compile_chords(self, device, handlers, keys, signatures):
+        # Chord pins are rebuilt together whenever the board's chords or the mapping of any of their pins changed
+        prefix = device.pin_prefix; local_pins = {str(pin) for chord in device.chords for pin in chord['pins']}
+        for chord in device.chords: keys.update(mapping_keys(chord))
+        signature = signatures[device.name] = (device.chords, {pin: device.key_mapping.get(pin) for pin in local_pins})
+        if self.chord_signatures.get(device.name) == signature:
+            for pin in local_pins: handlers[prefix + pin] = self.pin_handlers[prefix + pin]
+            return {prefix + pin for pin in local_pins}
+        chords = tuple(Chord(frozenset(prefix + str(pin) for pin in chord['pins']), self._compile_action(chord), chord.get('window_ms', 50) / 1000.0) for chord in device.chords)
+        for pin in local_pins:
+            mapping = device.key_mapping.get(pin)
+            if analog_thresholds(mapping) is not None: raise ValueError(f"Chord pin {pin} has an analog mapping")
+            handler = self._compile_action(mapping) if mapping is not None else None
+            chord_pin = ChordPin(prefix + pin, tuple(chord for chord in chords if prefix + pin in chord.pins), handler)
+            for chord in chord_pin.chords: chord.members.append(chord_pin)
+            handlers[prefix + pin] = partial(self.handle_chord_input, chord_pin)
+        return {prefix + pin for pin in local_pins}
+
+    def _retire_handler(self, handler):
+        # A replaced handler must not act on timers it left on the heap, and must not leave its chord or hold key down
+        func = handler.func; target = handler.args[0]
+        if func == self.handle_analog_input: target.pending = 0
+        elif func == self.handle_filtered_input:
+            target.analog.pending = 0; target.block = []
+            if target.queued: target.queued = False; self.filter_queue.remove(target)
+        elif func == self.handle_macro_input:
+            target.cancelled = True
+            for run in target.runs:
+                for state in run.held:
+                    if state.pressed: self.keyboard.release(state.key); state.pressed = False
+            target.runs = []
+        elif func == self.handle_tap_hold_input:
+            target.generation += 1
+            if target.holding: target.holding = False; target.hold(0)
+            self._retire_handler(target.tap); self._retire_handler(target.hold)
+        elif func == self.handle_chord_input:
+            if target in self.chord_pending: self.chord_pending = []; self.chord_generation += 1
+            for chord in target.chords:
+                if chord.active: chord.active = False; chord.action(0)
+                self._retire_handler(chord.action)
+            if target.handler is not None: self._retire_handler(target.handler)
+
+    def _startup_modules(self, keyboard):
+        backend = KEYBOARD_BACKENDS.get(keyboard) if isinstance(keyboard, str) else None
+        manifests = self.plugin_registry.scan()
+        entries = [manifests[name]['entry'] for name in dict.fromkeys(config.get("name") for device in self.devices for config in device.plugin_configs)
+                   if name in manifests and manifests[name]['entry']]
+        return list(backend.modules if backend else ()) + entries
+
+    def _import_modules(self, names):
+        # Failures are left to the import on the main thread, which reports them
+        start = time.monotonic()
+        for name in names:
+            try: importlib.import_module(name)
+            except Exception: pass
+        self._import_time = time.monotonic() - start
 
     def _load_plugins(self):
         plugins = []
-        plugin_dir = os.path.join(get_base_path(), "plugins")
-        if not os.path.isdir(plugin_dir): return plugins
-        for config in self.plugin_configs:
-            name = config.get("name")
-            settings = config.get("settings", {})
-            if not name: continue
-            try:
-                plugin_api = CoreAPI(self.controller, self.log, plugin_name=name)
-                module = importlib.import_module(f"plugins.{name}.main")
-                plugin_instance = module.Plugin(plugin_api, settings)
-                plugins.append(plugin_instance)
-                self.log(f"Plugin '{name}' loaded.", level=2)
-            except Exception as e:
-                self.log(f"Error loading plugin '{name}': {e}", level=1)
+        for device in self.devices:
+            for config in device.plugin_configs:
+                runner = self._load_plugin(device, config)
+                if runner is not None: plugins.append(runner)
         return plugins
 
+    def _load_plugin(self, device, config):
+        name = config.get("name")
+        settings = config.get("settings", {})
+        if not name: return None
+        manifest = self.plugin_registry.get(name)
+        if manifest is None or manifest['entry'] is None:
+            self.log("Error loading plugin '%s': no main.py in %s", name, os.path.join(self.plugin_registry.plugins_dir, name), level=1)
+            return None
+        try:
+            module = importlib.import_module(manifest['entry'])
+            runner = PluginRunner(name, module, settings, self.plugin_budget, self.log, threaded=self.plugin_mode == 'thread', device=device)
+            try: self._start_plugin(runner, schedule=False)
+            except Exception: runner.stop(); raise
+            self.log("Plugin '%s' loaded.", name, level=2)
+            return runner
+        except Exception as e:
+            self.log("Error loading plugin '%s': %s", name, e, level=1)
+            return None
+
+    def _start_plugin(self, runner, schedule=True):
+        plugin_api = CoreAPI(runner.device.controller, self.log, plugin_name=runner.name, core=self, runner=runner)
+        runner.plugin = runner.module.Plugin(plugin_api, runner.settings)
+        if schedule: plugin_api._to_core(self._schedule_plugin_update, runner)
+
+    def _stop_plugin(self, runner):
+        # Its timers die with runner.alive; its subscriptions have to go explicitly
+        runner.stop()
+        for subscriptions in list(self.subscriptions.values()):
+            for subscription in subscriptions:
+                if subscription.runner is runner: self.unsubscribe(subscription)
+
+    def _restart_plugin(self, runner, stuck_for):
+        self.log("[ERROR] Plugin '%s' has been stuck for %.1f s; restarting it.", runner.name, stuck_for, level=1)
+        self._stop_plugin(runner)
+        fresh = PluginRunner(runner.name, runner.module, runner.settings, runner.budget, self.log, device=runner.device)
+        self.plugins[self.plugins.index(runner)] = fresh
+        fresh.post(self._start_plugin, (fresh,))
+
+    def _watch_plugins(self, now):
+        for runner in list(self.plugins):
+            busy_since = runner.busy_since
+            if runner.thread is not None and busy_since is not None and now - busy_since > self.plugin_restart_after:
+                self._restart_plugin(runner, now - busy_since); continue
+            if now - runner.reported_at < WATCHDOG_REPORT_INTERVAL: continue
+            runner.reported_at = now
+            if runner.overruns != runner.reported_overruns:
+                self.log("[WARNING] Plugin '%s' overran its %.0f ms budget %d time(s), longest %.0f ms; throttling it.",
+                         runner.name, runner.budget * 1000, runner.overruns - runner.reported_overruns, runner.longest * 1000, level=1)
+                runner.reported_overruns = runner.overruns; runner.longest = 0.0
+            if runner.dropped:
+                self.log("[WARNING] Plugin '%s' is falling behind; dropped %d call(s).", runner.name, runner.dropped, level=1); runner.dropped = 0
+        self.schedule(now + WATCHDOG_INTERVAL, self._watch_plugins)
+
     def handle_sigint(self, signum, frame):
         self.log("\n[INFO] Shutting down...", level=1); self.running = False
 
+    def handle_sighup(self, signum, frame):
+        self.reload_requested = True
+
+    def _watch_config(self, now):
+        # A request arriving while the last reload is still sending is picked up once it is done
+        reloading = self._reload_thread is not None and self._reload_thread.is_alive()
+        if not reloading and self.reload_requested or (self.config_poll and self._config_stamp() != self.config_stamp):
+            self.reload_requested = False; self.reload_config()
+        self.schedule(now + (self.config_poll or CONFIG_POLL_INTERVAL), self._watch_config)
+
+    def _start_watchdog(self):
+        if self._watchdog_started: return
+        self._watchdog_started = True; self.schedule(time.monotonic() + WATCHDOG_INTERVAL, self._watch_plugins)
+
+    def reload_config(self):
+        # Applies a changed config to the running boards: only pins whose mode or read type changed get commands,
+        # only plugins whose entry changed are restarted, and keys that stay mapped stay held
+        start = time.monotonic()
+        try: devices = self._read_config()
+        except (OSError, ValueError, KeyError, TypeError, AttributeError) as e:
+            self.log("[ERROR] Could not reload config: %s", e, level=1); return False
+        if [(device.name, device.port) for device in devices] != [(device.name, device.port) for device in self.devices]:
+            self.log("[WARNING] Boards or ports changed in the config; restart to apply.", level=1); return False
+        # The new mapping is compiled before any board, plugin or handler changes, so a bad one changes nothing
+        try: key_mapping = self._build_key_mapping(devices)
+        except (ValueError, KeyError, TypeError) as e:
+            self.log("[ERROR] Could not apply key mapping: %s", e, level=1); return False
+        added = []
+        for device, fresh in zip(self.devices, devices):
+            device.key_mapping = fresh.key_mapping; device.chords = fresh.chords
+            wanted = [(config.get("name"), config.get("settings", {})) for config in fresh.plugin_configs]
+            for runner in [runner for runner in self.plugins if runner.device is device]:
+                if (runner.name, runner.settings) in wanted: wanted.remove((runner.name, runner.settings)); continue
+                self._stop_plugin(runner); self.plugins.remove(runner)
+                self.log("Plugin '%s' unloaded.", runner.name, level=2)
+            for name, settings in wanted:
+                runner = self._load_plugin(device, {"name": name, "settings": settings})
+                if runner is not None: self.plugins.append(runner); added.append(runner)
+            device.plugin_configs = fresh.plugin_configs
+        self._install_key_mapping(*key_mapping)
+        # The pin commands are sent pipelined from a thread, as at startup; the main loop keeps handling events
+        # and finishes the reload once the boards answered
+        updates = [(device, *self._pin_update(device)) for device in self.devices]
+        def send():
+            run_concurrently(lambda update: self._send_pin_update(*update), updates)
+            self.post(self._reload_finished, added, start, sum(len(commands) for device, commands, digest in updates))
+        self._reload_thread = threading.Thread(target=send, name="reload", daemon=True); self._reload_thread.start()
+        return True
+
+    def _reload_finished(self, added, start, count):
+        for runner in added: self._schedule_plugin_update(runner)
+        if added: self._start_watchdog()
+        self.log("Config reloaded in %.1f ms (%d pin command(s)).", (time.monotonic() - start) * 1000, count, level=1)
+
     def setup_arduino(self):
         self.log("Sending configuration to Arduino...", level=1)
-        self.controller.clear_all()
+        run_concurrently(self._setup_device, self.devices)
+        self.log("Configuration sent successfully.", level=1)
+        self.startup_time = time.monotonic() - self.start_time
+        if self.recorder is not None: self.recorder.record(REC_READY, 0, b"")
+        self.log("Startup took %.0f ms.", self.startup_time * 1000, level=2)
+
+    def _setup_device(self, device):
+        controller = device.controller
+        if self.protocol == 'binary': controller.set_protocol(True)
+        pin_setup = self._pin_setup(device)
+        commands = self._setup_commands(pin_setup); digest = config_digest(commands)
+        if controller.config_hash == digest:
+            self.log("Arduino on %s restored this configuration from EEPROM, skipping upload.", device.port, level=2)
+        elif self._send_pin_commands(device, ["clear", *commands]): self._commit_config(device, digest)
+        device.pin_setup = pin_setup
+
+    def _pin_update(self, device):
+        # The commands taking a board from its current pin setup to the configured one, and the digest to commit after them
+        old = device.pin_setup; new = self._pin_setup(device); commands = []
+        for pin, (mode, read_type) in old.items():
+            if pin in new: continue
+            if read_type: commands.append(f"pin {pin} read stop")
+            if mode: commands.append(f"pin {pin} mode unconfigured")
+        for pin, (mode, read_type) in new.items():
+            old_mode, old_read = old.get(pin, (None, None))
+            if (mode, read_type) == (old_mode, old_read): continue
+            # A pin moving between the digital and analog lists, or leaving them, has to stop first; new analog options apply in place
+            if old_read and (read_type is None or old_read.split()[0] != read_type.split()[0]): commands.append(f"pin {pin} read stop")
+            if mode != old_mode:
+                # Only an unconfigured pin can become a servo, and only unconfiguring detaches one
+                if old_mode and (mode is None or 'servo' in (mode, old_mode)): commands.append(f"pin {pin} mode unconfigured")
+                if mode: commands.append(f"pin {pin} mode {mode}")
+            if read_type and (read_type != old_read or mode != old_mode): commands.append(f"pin {pin} read {read_type}")
+        device.pin_setup = new
+        return commands, config_digest(self._setup_commands(new))
+
+    def _send_pin_update(self, device, commands, digest):
+        try:
+            if commands and self._send_pin_commands(device, commands): self._commit_config(device, digest)
+        except serial.SerialException as e: self.log("[ERROR] Could not update Arduino on %s: %s", device.port, e, level=1)
 
+    def _pin_setup(self, device):
+        setup = {}
         self.log("Configuring pins for key mapping...", level=2)
-        for pin, mapping in self.key_mapping.items():
-            is_analog = isinstance(mapping, list)
-            mode = "input" if is_analog else "pullup"
-            self.controller.configure_pin(pin, mode)
-            read_type = "analog" if is_analog else "digital"
-            self.controller.start_reading(pin, read_type)
+        for pin, mapping in device.key_mapping.items():
+            is_analog = analog_thresholds(mapping) is not None
+            setup[str(pin).upper()] = ("input" if is_analog else "pullup", analog_read_type(mapping) if is_analog else "digital")
+        for chord in device.chords:
+            for pin in chord['pins']: setup.setdefault(str(pin).upper(), ("pullup", "digital"))
 
         self.log("Configuring pins for plugins...", level=2)
-        for plugin in self.plugins:
-            if hasattr(plugin, 'get_pins_to_setup'):
-                pins_to_setup = plugin.get_pins_to_setup()
-                for pin, setup in pins_to_setup.items():
-                    mode = setup.get('mode')
-                    read_type = setup.get('read')
-
-                    if mode:
-                        self.controller.configure_pin(pin, mode)
-                    if read_type:
-                        self.controller.start_reading(pin, read_type)
-                        
-        self.log("Configuration sent successfully.", level=1)
+        for runner in self.plugins:
+            if runner.device is device and hasattr(runner.plugin, 'get_pins_to_setup'):
+                pins_to_setup = runner.plugin.get_pins_to_setup()
+                for pin, pin_setup in pins_to_setup.items():
+                    mode, read_type = setup.get(str(pin).upper(), (None, None))
+                    setup[str(pin).upper()] = (pin_setup.get('mode') or mode, pin_setup.get('read') or read_type)
+        return setup
+
+    def _setup_commands(self, pin_setup):
+        commands = []
+        for pin, (mode, read_type) in pin_setup.items():
+            if mode: commands.append(f"pin {pin} mode {mode}")
+            if read_type: commands.append(f"pin {pin} read {read_type}")
+        return commands
+
+    def _send_pin_commands(self, device, commands):
+        accepted = True
+        for command, ok, message in device.controller.send_batch(commands):
+            if not ok: accepted = False; self.log("[ERROR] Arduino on %s rejected '%s': %s", device.port, command, message, level=1)
+        return accepted
+
+    def _commit_config(self, device, digest):
+        # Only firmware that reported a config hash can store one; a setup with rejected commands is never committed
+        controller = device.controller
+        if controller.config_hash is None: return
+        ok, message = controller.commit_config(digest)
+        if ok: self.log("Configuration stored in EEPROM of Arduino on %s.", device.port, level=3)
+        else: self.log("[WARNING] Arduino on %s could not store the configuration: %s", device.port, message, level=1)
 
     def main_loop(self):
         self.log("STARTING", level=2)
         self.setup_arduino()
+        for runner in self.plugins: self._schedule_plugin_update(runner)
+        if self.plugins: self._start_watchdog()
+        self.schedule(time.monotonic() + (self.config_poll or CONFIG_POLL_INTERVAL), self._watch_config)
+        if self.stats_interval: self.schedule(time.monotonic() + self.stats_interval, self._report_stats)
+        if self.stats_port: self._serve_stats()
+        if self.scope is not None and not self.scope.start(): self.scope = None
+        metrics = self.metrics; events = self.events; keyboard = self.keyboard
         while self.running:
-            for plugin in self.plugins: plugin.update()
-            line = self.controller.read_line()
-            if line and line.upper() != 'OK' and not line.startswith('ERROR:'):
-                self.log(f"Received from Arduino: {line}", level=4)
-                if ':' in line:
-                    pin, value_str = line.split(':', 1)
-                    try: self.handle_analog_input(pin, int(value_str))
-                    except ValueError: self.log(f"Could not parse analog value: {line}", level=2)
-                else:
-                    self.handle_digital_input(line)
-            self.check_and_release_keys()
-            time.sleep(0.001)
+            try: event = events.get(timeout=self._next_timeout())
+            except queue.Empty: event = None
+            if metrics is not None: iteration_start = time.monotonic()
+            # Events that arrived together (one serial read often carries several) are handled before the keyboard is flushed
+            handled = 0
+            while event is not None:
+                kind, pin, value, received = event
+                if metrics is not None: metrics.event_received = received
+                handler = self.pin_handlers.get(pin)
+                if handler is not None:
+                    # Chord presses still held back happened before this edge of another pin, so they are passed on first
+                    if self.chord_pending and kind == 'digital' and getattr(handler, 'func', None) != self.handle_chord_input: self._resolve_chord()
+                    handler(value)
+                elif kind == 'call': pin(*value)
+                elif kind == 'disconnect': self.log("[ERROR] Lost connection to Arduino on %s.", pin, level=1); self.running = False
+                subscriptions = self.subscriptions.get(pin)
+                if subscriptions: self._notify(subscriptions, pin, 1 if value is None else value)
+                if metrics is not None: metrics.event_received = None
+                handled += 1
+                if handled == EVENT_BATCH_SIZE: break
+                try: event = events.get_nowait()
+                except queue.Empty: break
+            if self.filter_queue: self._run_filters()
+            self.run_timers()
+            keyboard.flush()
+            self.output_wait = self.flush_outputs()
+            if metrics is not None: metrics.loop.add(time.monotonic() - iteration_start)
         self.cleanup()
+
+    # Subscriber lists are replaced rather than mutated, so callbacks may (un)subscribe while being notified
+    def subscribe(self, subscription):
+        self.subscriptions[subscription.pin] = self.subscriptions.get(subscription.pin, ()) + (subscription,)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        subscriptions = tuple(s for s in self.subscriptions.get(subscription.pin, ()) if s is not subscription)
+        if subscriptions: self.subscriptions[subscription.pin] = subscriptions
+        else: self.subscriptions.pop(subscription.pin, None)
+
+    def _notify(self, subscriptions, pin, value):
+        for subscription in subscriptions:
+            if subscription.decimate > 1:
+                subscription.skipped += 1
+                if subscription.skipped < subscription.decimate: continue
+                subscription.skipped = 0
+            if subscription.block_size > 1:
+                subscription.block.append(value)
+                if len(subscription.block) < subscription.block_size: continue
+                subscription.runner.post(subscription.callback, (subscription.local_pin, subscription.block)); subscription.block = []
+            else: subscription.runner.post(subscription.callback, (subscription.local_pin, value))
+
+    def post(self, callback, *args):
+        # Runs callback on the core thread; used by plugins running on their own threads
+        self.events.put(('call', callback, args, None))
+
+    def flush_outputs(self):
+        wait = None
+        for controller in self.controllers:
+            controller_wait = controller.flush_outputs()
+            if controller_wait is not None and (wait is None or controller_wait < wait): wait = controller_wait
+        return wait
+
+    def stats_snapshot(self):
+        controllers = self.controllers; metrics = self.metrics
+        def total(name): return sum(getattr(controller, name) for controller in controllers)
+        return {
+            'uptime_s': round(time.monotonic() - metrics.started, 3),
+            'key_latency': metrics.latency.summary(), 'loop_time': metrics.loop.summary(), 'round_trip': metrics.rtt.summary(),
+            'lines_received': total('lines_received'), 'parse_errors': total('parse_errors'),
+            'crc_errors': total('crc_errors'), 'frames_lost': total('frames_lost'),
+            'bytes_in': total('bytes_in'), 'bytes_out': total('bytes_out'),
+            'outputs': {'sent': total('outputs_sent'), 'merged': total('outputs_merged'), 'dropped': total('outputs_dropped')},
+            'plugins': {runner.name: {'calls': runner.calls, 'mean_ms': round(runner.busy_total / runner.calls * 1000, 3) if runner.calls else 0,
+                                      'max_ms': round(runner.busy_max * 1000, 3), 'overruns': runner.overruns} for runner in self.plugins},
+        }
+
+    def _report_stats(self, now):
+        stats = self.stats_snapshot(); last = self._last_stats or {'uptime_s': 0, 'lines_received': 0, 'bytes_in': 0, 'bytes_out': 0}
+        elapsed = max(stats['uptime_s'] - last['uptime_s'], 1e-9)
+        latency = stats['key_latency']; loop = stats['loop_time']
+        self.log("[STATS] %.0f lines/s, in %.0f B/s, out %.0f B/s, %d parse errors, key latency p50 %s ms p99 %s ms, loop p99 %s ms",
+                 (stats['lines_received'] - last['lines_received']) / elapsed, (stats['bytes_in'] - last['bytes_in']) / elapsed,
+                 (stats['bytes_out'] - last['bytes_out']) / elapsed, stats['parse_errors'], latency.get('p50_ms', 0), latency.get('p99_ms', 0),
+                 loop.get('p99_ms', 0), level=1)
+        for name, plugin in stats['plugins'].items():
+            self.log("[STATS] plugin %s: %d calls, mean %s ms, max %s ms", name, plugin['calls'], plugin['mean_ms'], plugin['max_ms'], level=1)
+        self._last_stats = stats
+        self.schedule(now + self.stats_interval, self._report_stats)
+
+    def _serve_stats(self):
+        # Every connection to the stats port receives one JSON snapshot, e.g. `nc 127.0.0.1 <port>`
+        try:
+            server = socket.create_server(('127.0.0.1', self.stats_port))
+        except OSError as e: self.log("[ERROR] Could not open stats port %d: %s", self.stats_port, e, level=1); return
+        def serve():
+            while True:
+                connection, _ = server.accept()
+                with connection:
+                    try: connection.sendall(json.dumps(self.stats_snapshot()).encode('utf-8') + b"\n")
+                    except (OSError, RuntimeError): pass
+        threading.Thread(target=serve, name="stats-server", daemon=True).start()
+        self.log("Serving stats on 127.0.0.1:%d", self.stats_port, level=2)
+
+    def _schedule_plugin_update(self, runner):
+        # Plugins may declare update_interval (seconds); plugins with a bare update() keep being polled every tick
+        plugin = runner.plugin
+        if not runner.alive or not hasattr(plugin, 'update'): return
+        interval = getattr(plugin, 'update_interval', None) or self.plugin_tick
+        self.start_plugin_timer(PluginTimer(plugin.update, (), interval, time.monotonic(), runner))
+
+    def _next_timeout(self):
+        timeout = self.idle_timeout
+        if self.timers: timeout = min(timeout, self.timers[0][0] - time.monotonic())
+        if self.output_wait is not None: timeout = min(timeout, self.output_wait)
+        return max(0.0, timeout)
+
+    def schedule(self, deadline, callback, *args):
+        heapq.heappush(self.timers, (deadline, next(self._timer_seq), callback, args))
+
+    def run_timers(self):
+        timers = self.timers
+        if not timers: return
+        now = time.monotonic()
+        while timers and timers[0][0] <= now:
+            _, _, callback, args = heapq.heappop(timers)
+            callback(now, *args)
+
+    def start_plugin_timer(self, timer):
+        self.schedule(timer.deadline, self._run_plugin_timer, timer)
+
+    def _run_plugin_timer(self, now, timer):
+        runner = timer.runner
+        if timer.cancelled or not runner.alive: return
+        if not timer.period: runner.post(timer.callback, timer.args); return
+        # A periodic call is skipped while the previous one is still queued or the plugin is being throttled
+        if runner.idle and now >= runner.resume_at: runner.post(timer.callback, timer.args)
+        if timer.cancelled: return
+        # Keep a steady cadence, but skip missed periods rather than firing them in a burst
+        timer.deadline += timer.period
+        if timer.deadline <= now: timer.deadline = now + timer.period
+        self.schedule(timer.deadline, self._run_plugin_timer, timer)
     
-    def handle_analog_input(self, pin, value):
-        self.log(f"Analog {pin} = {value}", level=3)
-        if pin in self.key_mapping:
-            for mapping in self.key_mapping[pin]:
-                key = mapping['key']; t_min, t_max = mapping['threshold']
-                hold_required = mapping.get('hold_time_ms', 0) / 1000.0
-                in_range = t_min <= value <= t_max
-                state = self.key_states[key]
-                self.log(f"Key {key}: in_range={in_range}, pressed={state['pressed']}", level=4)
-                if in_range:
-                    if not state['pressed']:
-                        if 'range_enter_time' not in state: state['range_enter_time'] = time.time()
-                        elif time.time() - state['range_enter_time'] >= hold_required:
-                            self.keyboard.press(key); state['pressed'] = True
-                            self.log(f"Pressed key: {key}", level=1)
-                else:
-                    if state['pressed']: self.keyboard.release(key); state['pressed'] = False; self.log(f"Released key: {key}", level=1)
-                    state.pop('range_enter_time', None)
-
-    def handle_digital_input(self, pin):
-        if pin in self.key_mapping:
-            key = self.key_mapping[pin]['key']; state = self.key_states[key]
-            state['hold_time'] = time.time()
-            if not state['pressed']:
-                self.keyboard.press(key); state['pressed'] = True
-                self.log(f"Pressed key: {key}", level=1)
-
-    def check_and_release_keys(self):
-        for key, state in self.key_states.items():
-            if state['pressed']:
-                is_digital = any(isinstance(m, dict) and m['key'] == key for m in self.key_mapping.values())
-                if is_digital:
-                    if (time.time() - state['hold_time']) > self.max_hold_time:
-                        self.keyboard.release(key); state['pressed'] = False
-                        self.log(f"Auto-released key: {key}", level=1)
+    def handle_analog_input(self, analog, value):
+        if value is None: return
+        self.log("Analog %s = %d", analog.pin, value, level=3)
+        if value < 0: value = 0
+        elif value > ADC_MAX: value = ADC_MAX
+        scope = self.scope
+        if scope is not None and scope.active: scope.add(analog.pin, value)
+        active = analog.active
+        new_active = analog.enter[value] | (active & analog.stay[value])
+        changed = new_active ^ active
+        if not changed and not analog.pending: return
+        now = time.monotonic(); thresholds = analog.thresholds
+        analog.active = new_active
+        left = changed & active
+        analog.pending &= ~left
+        while left:
+            bit = left & -left; left ^= bit
+            state = thresholds[bit.bit_length() - 1].state
+            self.log("Key %s: left range", state.key, level=4)
+            if state.pressed: self.keyboard.release(state.key); state.pressed = False; self.log("Released key: %s", state.key, level=1)
+        entered = changed & new_active
+        analog.pending |= entered
+        while entered:
+            bit = entered & -entered; entered ^= bit
+            threshold = thresholds[bit.bit_length() - 1]; threshold.enter_time = now
+            self.log("Key %s: entered range", threshold.state.key, level=4)
+            # The firmware may only report changes, so a hold has to complete on a timer rather than on the next sample
+            if threshold.hold_required: self.schedule(now + threshold.hold_required, self._press_held, analog)
+        self._press_held(now, analog)
+
+    def handle_filtered_input(self, conditioner, value):
+        if value is None: return
+        conditioner.block.append(value)
+        if not conditioner.queued: conditioner.queued = True; self.filter_queue.append(conditioner)
+
+    def _run_filters(self):
+        conditioners = self.filter_queue; self.filter_queue = []
+        for conditioner in conditioners:
+            block = conditioner.block; conditioner.block = []; conditioner.queued = False
+            for stage in conditioner.stages:
+                block = stage.run(block)
+                if not block: break
+            for value in block: self.handle_analog_input(conditioner.analog, value)
+
+    def _press_held(self, now, analog):
+        pending = analog.pending; thresholds = analog.thresholds
+        while pending:
+            bit = pending & -pending; pending ^= bit
+            threshold = thresholds[bit.bit_length() - 1]
+            if now - threshold.enter_time < threshold.hold_required: continue
+            analog.pending ^= bit
+            state = threshold.state
+            if not state.pressed:
+                self.keyboard.press(state.key); state.pressed = True
+                self.log("Pressed key: %s", state.key, level=1)
+
+    def handle_digital_input(self, state, value=None):
+        if value == 0:
+            if state.pressed: self.keyboard.release(state.key); state.pressed = False; self.log("Released key: %s", state.key, level=1)
+            return
+        if not state.pressed:
+            self.keyboard.press(state.key); state.pressed = True
+            self.log("Pressed key: %s", state.key, level=1)
+        if value is None:
+            # Legacy firmware repeats the pin code while the button is held and never reports the release
+            now = time.monotonic(); state.hold_time = now
+            if not state.queued: self.schedule(now + self.max_hold_time, self._auto_release, state); state.queued = True
+
+    def handle_macro_input(self, macro, value):
+        if value == 0: return
+        now = time.monotonic()
+        if value is None:
+            # Legacy firmware repeats the pin code while the button is held; only the first one starts the macro
+            held = now - macro.triggered < self.max_hold_time; macro.triggered = now
+            if held: return
+        run = MacroRun(macro, now); macro.runs.append(run)
+        self._run_macro(now, run)
+
+    def _run_macro(self, now, run):
+        macro = run.macro; steps = macro.steps; keyboard = self.keyboard
+        if macro.cancelled: return
+        while run.index < len(steps):
+            action, target = steps[run.index]; run.index += 1
+            if action == MACRO_DELAY:
+                # Delays add up from the scheduled times rather than from when the timer ran, so late timers do not stretch the macro
+                run.deadline += target
+                if run.deadline > now: self.schedule(run.deadline, self._run_macro, run); return
+            elif action == MACRO_PRESS:
+                if not target.pressed: keyboard.press(target.key); target.pressed = True; run.held.append(target)
+            elif target.pressed:
+                keyboard.release(target.key); target.pressed = False
+                if target in run.held: run.held.remove(target)
+        macro.runs.remove(run)
+
+    def handle_tap_hold_input(self, tap_hold, value):
+        # Released before hold_time: the tap action is pressed and released; still held at hold_time: the hold action is pressed
+        if value is None: return
+        if value:
+            if tap_hold.down: return
+            tap_hold.down = True; tap_hold.generation += 1
+            self.schedule(time.monotonic() + tap_hold.hold_time, self._tap_hold_timeout, tap_hold, tap_hold.generation)
+        elif tap_hold.down:
+            tap_hold.down = False; tap_hold.generation += 1
+            if tap_hold.holding: tap_hold.holding = False; tap_hold.hold(0)
+            else: tap_hold.tap(1); tap_hold.tap(0)
+
+    def _tap_hold_timeout(self, now, tap_hold, generation):
+        if generation != tap_hold.generation: return
+        tap_hold.holding = True; tap_hold.hold(1)
+
+    def handle_chord_input(self, chord_pin, value):
+        # Presses of chord pins are held back until they complete a chord, its window runs out or another pin's key
+        # is pressed or released; presses that complete no chord are then passed on to the pins' own actions in the order they happened
+        if value is None: return
+        pending = self.chord_pending
+        if value:
+            if chord_pin in pending or chord_pin.chord is not None: return
+            chord_pin.consumed = False; pending.append(chord_pin)
+            pins = frozenset(pending_pin.pin for pending_pin in pending)
+            candidates = [chord for chord in pending[0].chords if pins <= chord.pins]
+            if not candidates:
+                self._replay_chord_pins(pending[:-1]); pending[:] = [chord_pin]
+                pins = frozenset((chord_pin.pin,)); candidates = list(chord_pin.chords)
+            if len(pending) == 1:
+                self.chord_generation += 1
+                self.schedule(time.monotonic() + max(chord.window for chord in candidates), self._chord_timeout, self.chord_generation)
+            if len(candidates) == 1 and candidates[0].pins == pins: self._fire_chord(candidates[0])
+            return
+        chord = chord_pin.chord
+        if chord is not None:
+            # The first chord pin to be released ends the chord; the releases of the others are swallowed
+            for member in chord.members:
+                if member.chord is chord: member.chord = None; member.consumed = member is not chord_pin
+            chord.active = False; chord.action(0)
+        elif chord_pin.consumed: chord_pin.consumed = False
+        elif chord_pin in pending:
+            self._resolve_chord(); self.handle_chord_input(chord_pin, 0)
+        elif chord_pin.handler is not None: chord_pin.handler(0)
+
+    def _chord_timeout(self, now, generation):
+        if generation == self.chord_generation and self.chord_pending: self._resolve_chord()
+
+    def _resolve_chord(self):
+        pending = self.chord_pending; pins = frozenset(chord_pin.pin for chord_pin in pending)
+        chord = next((chord for chord in pending[0].chords if chord.pins == pins), None)
+        if chord is not None: self._fire_chord(chord)
+        else: self._replay_chord_pins(pending); self.chord_pending = []
+        self.chord_generation += 1
+
+    def _fire_chord(self, chord):
+        for chord_pin in self.chord_pending: chord_pin.chord = chord
+        self.chord_pending = []; self.chord_generation += 1
+        chord.active = True; chord.action(1)
+        self.log("Chord %s", "+".join(sorted(chord.pins)), level=3)
+
+    def _replay_chord_pins(self, chord_pins):
+        for chord_pin in chord_pins:
+            if chord_pin.handler is not None: chord_pin.handler(1)
+
+    def _auto_release(self, now, state):
+        state.queued = False
+        if not state.pressed: return
+        deadline = state.hold_time + self.max_hold_time
+        if deadline > now:
+            self.schedule(deadline, self._auto_release, state); state.queued = True
+        else:
+            self.keyboard.release(state.key); state.pressed = False
+            self.log("Auto-released key: %s", state.key, level=1)
 
     def cleanup(self):
         self.log("Cleaning up...", level=2)
-        if hasattr(self, 'controller'): self.controller.clear_all(); self.controller.close()
-        self.log("Serial port closed. Exiting.", level=1); sys.exit(0)
+        # A replay ends where the recorded session started cleaning up
+        if self.recorder is not None: self.recorder.record(REC_END, 0, b"")
+        if getattr(self, 'scope', None) is not None: self.scope.close()
+        for runner in getattr(self, 'plugins', ()): runner.stop()
+        if getattr(self, 'keyboard', None) is not None: self.keyboard.close()
+        # A reload still sending pin commands would otherwise race the reset below
+        if getattr(self, '_reload_thread', None) is not None: self._reload_thread.join()
+        def reset_device(device):
+            controller = device.controller
+            if controller is None: return
+            # A replayed board is a recording, with nobody left to answer
+            if self.replay is None:
+                try:
+                    controller.clear_all()
+                    self.log("Outputs on %s: %d sent, %d merged, %d dropped.", device.port, controller.outputs_sent, controller.outputs_merged, controller.outputs_dropped, level=2)
+                    if controller.binary: controller.set_protocol(False)
+                except serial.SerialException as e: self.log("Could not reset Arduino on %s: %s", device.port, e, level=2)
+            controller.close()
+        run_concurrently(reset_device, getattr(self, 'devices', []))
+        if self.recorder is not None: self.recorder.close()
+        self.log("Serial port closed. Exiting.", level=1); self.log_sink.close(); sys.exit(0)
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Serial keyboard controller")
-    parser.add_argument('--config', type=str, default='config.json', help='Path to JSON config')
+    parser.add_argument('--config', type=str, help='Path to JSON config (default: config.json, or the config stored in the --replay recording)')
     parser.add_argument('--log', type=int, choices=[1, 2, 3, 4], default=2, help='Logging level')
     parser.add_argument('--port', type=str, help='Serial port')
+    parser.add_argument('--protocol', type=str, choices=['text', 'binary'], default='binary', help='Serial protocol to negotiate (falls back to text)')
+    parser.add_argument('--plugin-mode', type=str, choices=['thread', 'inline'], default='thread', help='Run each plugin on its own thread or inline on the main loop')
+    parser.add_argument('--plugin-budget', type=float, default=5, help='Time budget per plugin call in ms')
+    parser.add_argument('--stats', type=float, default=0, help='Log performance statistics every N seconds')
+    parser.add_argument('--stats-port', type=int, help='Serve performance statistics as JSON on this local TCP port')
+    parser.add_argument('--config-poll', type=float, default=CONFIG_POLL_INTERVAL, help='Check the config file for changes every N seconds (0 = only on SIGHUP)')
+    parser.add_argument('--keyboard', type=str, choices=list(KEYBOARD_BACKENDS), help='Keyboard output backend (overrides "keyboard" in the config; default: pynput)')
+    parser.add_argument('--record', type=str, help='Record the serial traffic of this session, with timestamps, to a file')
+    parser.add_argument('--replay', type=str, help='Play a recording back through the CLI instead of opening the serial ports')
+    parser.add_argument('--replay-speed', type=float, default=1.0, help='Replay speed factor (0 = as fast as possible)')
+    parser.add_argument('--replay-start', type=float, default=0.0, help='Skip to this many seconds into the recording once the boards are set up')
+    parser.add_argument('--scope-port', type=int, help='Stream the analog samples to scope clients (the GUI) on this local TCP port')
     args = parser.parse_args()
-    config_path = args.config if os.path.isabs(args.config) else os.path.join(get_base_path(), args.config)
-    app = KeymapuinoCLI(config_path, args.log, args.port)
+    config_path = args.config or 'config.json'
+    if args.replay and args.config is None:
+        try: recording = SessionRecording(args.replay)
+        except (OSError, ValueError) as e: print(f"[ERROR] Could not read recording: {e}"); sys.exit(1)
+        if recording.config_text:
+            handle, config_path = tempfile.mkstemp(suffix=".json")
+            with os.fdopen(handle, 'w', encoding='utf-8') as config_file: config_file.write(recording.config_text)
+            atexit.register(os.remove, config_path)
+        recording.close()
+    config_path = config_path if os.path.isabs(config_path) else os.path.join(get_base_path(), config_path)
+    app = KeymapuinoCLI(config_path, args.log, args.port, args.protocol, args.plugin_mode, args.plugin_budget, args.stats, args.stats_port,
+                        keyboard=args.keyboard, config_poll=args.config_poll, record=args.record, replay=args.replay, replay_speed=args.replay_speed, replay_start=args.replay_start, scope_port=args.scope_port)
     app.main_loop()
\ No newline at end of file
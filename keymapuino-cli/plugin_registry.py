@@ -0,0 +1,81 @@
+import os
+import json
+
+REGISTRY_FILE = ".registry.json"
+REGISTRY_VERSION = 1
+
+def _stamp(path):
+    try: stat = os.stat(path)
+    except OSError: return None
+    return [stat.st_mtime_ns, stat.st_size]
+
+class PluginRegistry:
+    # Index of a plugins directory shared by the CLI and the GUI: for every plugin its entry point, its parsed ui.json
+    # and the settings that name pins. The index is kept in plugins/.registry.json and a plugin is only read again
+    # when the mtime or size of its main.py or ui.json changed, so a warm start costs one listing and two stats per plugin
+    def __init__(self, plugins_dir, cache_path=None):
+        self.plugins_dir = plugins_dir
+        self.cache_path = cache_path or os.path.join(plugins_dir, REGISTRY_FILE)
+        self.manifests = None; self.parsed = 0
+
+    def scan(self):
+        cached = self._load_cache() if self.manifests is None else self.manifests
+        try: names = sorted(entry.name for entry in os.scandir(self.plugins_dir) if entry.is_dir() and not entry.name.startswith(('.', '_')))
+        except OSError: names = []
+        manifests = {}; changed = False
+        for name in names:
+            stamps = self._stamps(name)
+            if stamps == [None, None]: continue
+            manifest = cached.get(name)
+            if manifest is None or manifest.get('stamps') != stamps: manifest = self._read_manifest(name, stamps); changed = True
+            manifests[name] = manifest
+        changed = changed or len(manifests) != len(cached)
+        self.manifests = manifests
+        if changed: self._save_cache()
+        return manifests
+
+    def get(self, name):
+        # One plugin's manifest, read again first if its files changed since the scan; None if there is no such plugin
+        if self.manifests is None: self.scan()
+        stamps = self._stamps(name); manifest = self.manifests.get(name)
+        if stamps == [None, None]:
+            if manifest is not None: del self.manifests[name]; self._save_cache()
+            return None
+        if manifest is None or manifest['stamps'] != stamps:
+            manifest = self.manifests[name] = self._read_manifest(name, stamps); self._save_cache()
+        return manifest
+
+    def _stamps(self, name):
+        path = os.path.join(self.plugins_dir, name)
+        return [_stamp(os.path.join(path, "main.py")), _stamp(os.path.join(path, "ui.json"))]
+
+    def _read_manifest(self, name, stamps):
+        # ui.json may list the settings holding pin numbers under "pins"; otherwise "pin" and "*_pin" in data_model count
+        self.parsed += 1
+        manifest = {'name': name, 'entry': f"plugins.{name}.main" if stamps[0] else None, 'ui': None, 'pins': [], 'error': None, 'stamps': stamps}
+        if stamps[1] is None: return manifest
+        try:
+            with open(os.path.join(self.plugins_dir, name, "ui.json"), 'r', encoding='utf-8') as f: ui = json.load(f)
+            pins = ui.get('pins')
+            manifest['pins'] = list(pins) if pins is not None else [key for key in ui.get('data_model', {}) if key == 'pin' or key.endswith('_pin')]
+            manifest['ui'] = ui
+        except (OSError, ValueError, AttributeError, TypeError) as e: manifest['error'] = f"ui.json: {e}"
+        return manifest
+
+    def _load_cache(self):
+        try:
+            with open(self.cache_path, 'r', encoding='utf-8') as f: cache = json.load(f)
+            if cache.get('version') == REGISTRY_VERSION and cache.get('dir') == os.path.abspath(self.plugins_dir): return cache['plugins']
+        except (OSError, ValueError, AttributeError, KeyError): pass
+        return {}
+
+    def _save_cache(self):
+        # Best effort: from a read-only install the registry still works, it just reads every ui.json on each start
+        temp_path = f"{self.cache_path}.{os.getpid()}.tmp"
+        try:
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump({'version': REGISTRY_VERSION, 'dir': os.path.abspath(self.plugins_dir), 'plugins': self.manifests}, f)
+            os.replace(temp_path, self.cache_path)
+        except OSError:
+            try: os.remove(temp_path)
+            except OSError: pass
@@ -0,0 +1,186 @@
+import time
+import struct
+import socket
+import threading
+from collections import deque
+
+# Analog scope (--scope-port): every client receives a stream of frames, one per pin per send interval: the header,
+# the pin name (UTF-8), then the samples as uint16 LE
+SCOPE_FRAME = struct.Struct('<BHd')      # pin name length, sample count, seconds since the CLI started when the batch was sent
+SCOPE_SEND_INTERVAL = 0.02
+SCOPE_BUFFER_SIZE = 4096                 # samples kept per pin between two sends; older ones are dropped
+SCOPE_SEND_TIMEOUT = 1.0
+SCOPE_COLUMNS = 600
+SCOPE_SPAN = 5.0
+SCOPE_MAX_VALUE = 1023
+SCOPE_EMPTY = SCOPE_MAX_VALUE + 1
+
+class ScopeServer:
+    # Streams the analog samples the threshold stage sees to local TCP clients (the GUI's scope). The main loop only
+    # appends to a bounded ring per pin, and only while a client is connected; a background thread sends the rings as
+    # one batch every SCOPE_SEND_INTERVAL, so a slow or stalled client never holds up key handling
+    def __init__(self, port, log, started):
+        self.port = port; self.log = log; self.started = started
+        self.server = None; self.clients = (); self.active = False; self.samples = {}
+        self.lock = threading.Lock()
+
+    def start(self):
+        try: self.server = socket.create_server(('127.0.0.1', self.port))
+        except OSError as e: self.log("[ERROR] Could not open scope port %d: %s", self.port, e, level=1); return False
+        threading.Thread(target=self._accept, name="scope-accept", daemon=True).start()
+        threading.Thread(target=self._send, name="scope-sender", daemon=True).start()
+        self.log("Serving the analog scope on 127.0.0.1:%d", self.port, level=2)
+        return True
+
+    def add(self, pin, value):
+        samples = self.samples.get(pin)
+        if samples is None: samples = self.samples[pin] = deque(maxlen=SCOPE_BUFFER_SIZE)
+        samples.append(value)
+
+    def _accept(self):
+        while True:
+            try: connection, _ = self.server.accept()
+            except OSError: return
+            connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1); connection.settimeout(SCOPE_SEND_TIMEOUT)
+            with self.lock: self.clients += (connection,); self.active = True
+            self.log("Scope client connected.", level=3)
+
+    def _send(self):
+        while self.server is not None:
+            time.sleep(SCOPE_SEND_INTERVAL)
+            if not self.clients: continue
+            sent = time.monotonic() - self.started; chunks = []
+            for pin, samples in list(self.samples.items()):
+                # Only this thread takes samples out, so the count read here is still there to pop
+                count = len(samples)
+                if not count: continue
+                name = pin.encode('utf-8')
+                chunks.append(SCOPE_FRAME.pack(len(name), count, sent) + name + struct.pack(f'<{count}H', *[samples.popleft() for _ in range(count)]))
+            if not chunks: continue
+            data = b"".join(chunks)
+            for client in self.clients:
+                try: client.sendall(data)
+                except OSError: self._drop(client)
+
+    def _drop(self, client):
+        with self.lock:
+            self.clients = tuple(c for c in self.clients if c is not client); self.active = bool(self.clients)
+            # Samples left over when the last client goes would be stale by the time the next one connects
+            if not self.active:
+                for samples in self.samples.values(): samples.clear()
+        try: client.close()
+        except OSError: pass
+        self.log("Scope client disconnected.", level=3)
+
+    def close(self):
+        server = self.server; self.server = None; self.active = False
+        if server is not None: server.close()
+        for client in self.clients:
+            try: client.close()
+            except OSError: pass
+        self.clients = ()
+
+class ScopeTrace:
+    # Min/max decimation of one pin into a fixed number of columns covering the last span seconds. A sample only widens
+    # its column's min and max, so memory and drawing cost depend on the width, not on the sample rate or on how long
+    # the scope is open. Pins may only report changes, so a column without samples holds the last value
+    __slots__ = ('columns', 'column_time', 'low', 'high', 'head', 'last_time', 'last_value')
+    def __init__(self, columns=SCOPE_COLUMNS, span=SCOPE_SPAN):
+        self.columns = columns; self.column_time = span / columns
+        self.low = [SCOPE_EMPTY] * columns; self.high = [-1] * columns
+        self.head = None; self.last_time = None; self.last_value = None
+
+    def add(self, values, end):
+        # The samples of one frame arrived during the send interval before end and are spread evenly over it
+        count = len(values)
+        if not count: return
+        start = end - SCOPE_SEND_INTERVAL
+        if self.last_time is not None and start < self.last_time < end: start = self.last_time
+        step = (end - start) / count; column_time = self.column_time; columns = self.columns; low = self.low; high = self.high
+        first = 0
+        while first < count:
+            column = int((start + (first + 1) * step) / column_time)
+            # The samples up to the end of this column go in as one slice
+            last = min(count, max(first + 1, int(((column + 1) * column_time - start) / step)))
+            self.advance(column)
+            if column > self.head - columns:
+                block = values[first:last]; index = column % columns
+                block_low = min(block); block_high = max(block)
+                if block_low < low[index]: low[index] = block_low
+                if block_high > high[index]: high[index] = block_high
+            self.last_value = values[last - 1]; first = last
+        self.last_time = end
+
+    def advance(self, column):
+        # Opens the columns up to column, holding the last value in the ones no sample reaches
+        head = self.head
+        if head is not None and column <= head: return
+        columns = self.columns; value = self.last_value
+        low_value, high_value = (SCOPE_EMPTY, -1) if value is None else (value, value)
+        begin = column - columns + 1 if head is None else max(head + 1, column - columns + 1)
+        for c in range(begin, column + 1): self.low[c % columns] = low_value; self.high[c % columns] = high_value
+        self.head = column
+
+    def advance_to(self, now): self.advance(int(now / self.column_time))
+
+    def points(self, width, height):
+        # Canvas line coordinates, oldest column on the left: a zigzag between each column's min and max
+        if self.head is None: return []
+        columns = self.columns; low = self.low; high = self.high; x_scale = width / columns; y_scale = (height - 1) / SCOPE_MAX_VALUE
+        coords = []; oldest = self.head - columns + 1
+        for k in range(columns):
+            index = (oldest + k) % columns
+            if high[index] < 0: continue
+            x = k * x_scale
+            coords += (x, height - 1 - low[index] * y_scale, x, height - 1 - high[index] * y_scale)
+        return coords
+
+class ScopeClient:
+    # Connects to a CLI's scope port (retrying until it is up) and decimates the frames into one ScopeTrace per pin on a
+    # background thread; readers take self.lock while they use the traces
+    def __init__(self, port, host='127.0.0.1', columns=SCOPE_COLUMNS, span=SCOPE_SPAN):
+        self.address = (host, port); self.columns = columns; self.span = span
+        self.traces = {}; self.lock = threading.Lock(); self.offset = None
+        self.connected = False; self.running = True; self.sock = None; self.samples = 0
+        self.thread = threading.Thread(target=self._run, name="scope-client", daemon=True); self.thread.start()
+
+    def now(self):
+        # The CLI's clock: frame times count from the CLI's start
+        return time.monotonic() - self.offset if self.offset is not None else None
+
+    def _run(self):
+        while self.running:
+            try: self.sock = socket.create_connection(self.address, timeout=1.0)
+            except OSError: time.sleep(0.5); continue
+            self.sock.settimeout(None); self.connected = True
+            try: self._receive(self.sock)
+            except OSError: pass
+            finally: self.connected = False; self.sock.close()
+            time.sleep(0.5)
+
+    def _receive(self, sock):
+        buffer = bytearray(); header_size = SCOPE_FRAME.size
+        while self.running:
+            chunk = sock.recv(65536)
+            if not chunk: return
+            buffer += chunk; offset = 0; received = time.monotonic()
+            with self.lock:
+                while len(buffer) - offset >= header_size:
+                    name_length, count, sent = SCOPE_FRAME.unpack_from(buffer, offset)
+                    values_offset = offset + header_size + name_length; end = values_offset + 2 * count
+                    if len(buffer) < end: break
+                    pin = buffer[offset + header_size:values_offset].decode('utf-8', errors='replace')
+                    # The smallest receive delay seen so far is the best estimate of the offset between the two clocks
+                    if self.offset is None or received - sent < self.offset: self.offset = received - sent
+                    trace = self.traces.get(pin)
+                    if trace is None: trace = self.traces[pin] = ScopeTrace(self.columns, self.span)
+                    trace.add(struct.unpack_from(f'<{count}H', buffer, values_offset), sent)
+                    self.samples += count; offset = end
+            del buffer[:offset]
+
+    def close(self):
+        self.running = False
+        sock = self.sock
+        if sock is not None:
+            try: sock.shutdown(socket.SHUT_RDWR)
+            except OSError: pass
@@ -8,17 +8,118 @@ def get_base_path():
         return os.path.dirname(os.path.abspath(__file__))
 
 sys.path.insert(0, get_base_path())
+# The plugin registry is shared with the CLI; the frozen build bundles it (pyinstaller --paths keymapuino-cli)
+if not getattr(sys, 'frozen', False): sys.path.insert(1, os.path.join(get_base_path(), "..", "keymapuino-cli"))
 
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog, simpledialog
 import json
+import copy
+import queue
+import socket
+import codecs
 import subprocess
 import threading
+from collections import deque
 import signal
-import serial.tools.list_ports
+from plugin_registry import PluginRegistry
+from scope import ScopeClient
+
+REPORTING_FIELDS = (("deadband", "Deadband:"), ("min_interval_ms", "Min interval(ms):"), ("max_interval_ms", "Max interval(ms):"), ("sample_interval_ms", "Sample(ms):"))
+LOG_READ_SIZE = 65536
+LOG_HISTORY_LINES = 10000
+LOG_VIEW_LINES = 5000
+LOG_VIEW_INTERVAL_MS = 100
+LOG_FILE_MAX_BYTES = 1024 * 1024
+LOG_FILE_BACKUPS = 2
+SCOPE_ANALOG_PINS = tuple(f"A{pin}" for pin in range(6))
+SCOPE_WIDTH = 600
+SCOPE_HEIGHT = 120
+SCOPE_REFRESH_MS = 50
+SCOPE_BAND_COLORS = ("#1f3a5f", "#5f3a1f", "#2f5f1f", "#5f1f4a")
+
+def free_local_port():
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0)); return probe.getsockname()[1]
+
+def threshold_bands(mapping):
+    # (low, high, key) of an analog pin's thresholds, from either mapping form; empty for digital pins
+    thresholds = mapping if isinstance(mapping, list) else (mapping or {}).get("thresholds", [])
+    return [(item["threshold"][0], item["threshold"][1], item["key"]) for item in thresholds]
+
+def scope_pins(config):
+    # Every analog pin of every board, named as the CLI streams it: with a "devices" list the names carry a "<name>:"
+    # prefix, and a board without a name is numbered from 1
+    if "devices" not in config: return list(SCOPE_ANALOG_PINS)
+    return [f"{entry.get('name', index + 1)}:{pin}" for index, entry in enumerate(config["devices"]) for pin in SCOPE_ANALOG_PINS]
+
+def scope_pin_mapping(config, pin):
+    prefix, _, local_pin = pin.rpartition(":")
+    if not prefix: return config.get("key_mapping", {}).get(local_pin)
+    boards = {str(entry.get("name", index + 1)): entry.get("key_mapping", {}) for index, entry in enumerate(config.get("devices", []))}
+    return boards.get(prefix, {}).get(local_pin)
+
+class RotatingLogFile:
+    # Keeps the log file under max_bytes by moving it to .1, .2, ... once it fills up
+    def __init__(self, path, max_bytes=LOG_FILE_MAX_BYTES, backups=LOG_FILE_BACKUPS):
+        self.path = path; self.max_bytes = max_bytes; self.backups = backups
+        self.file = open(path, "w", encoding="utf-8"); self.size = 0
+
+    def write(self, text):
+        data_size = len(text.encode("utf-8"))
+        if self.size and self.size + data_size > self.max_bytes: self._rotate()
+        self.file.write(text); self.file.flush(); self.size += data_size
+
+    def _rotate(self):
+        self.file.close()
+        for index in range(self.backups - 1, 0, -1):
+            if os.path.exists(f"{self.path}.{index}"): os.replace(f"{self.path}.{index}", f"{self.path}.{index + 1}")
+        if self.backups: os.replace(self.path, f"{self.path}.1")
+        self.file = open(self.path, "w", encoding="utf-8"); self.size = 0
+
+    def close(self): self.file.close()
+
+class ScopeView(tk.Canvas):
+    # One pin's trace from a ScopeClient over its threshold bands. The client decimates on its own thread, so a redraw
+    # only moves one line item to at most two points per column, however fast the samples come in. bands() is called on
+    # every redraw, so a dialog can show ranges while they are being edited. The view closes the client once destroyed
+    def __init__(self, parent, client, pin, bands):
+        super().__init__(parent, width=SCOPE_WIDTH, height=SCOPE_HEIGHT, background="black", highlightthickness=0)
+        self.client = client; self.pin = pin; self.bands = bands; self.drawn = None
+        self.trace_line = self.create_line(0, 0, 0, 0, fill="lime")
+        self.label = self.create_text(4, 4, anchor="nw", fill="gray", text=pin)
+        self.bind("<Destroy>", self._on_destroy)
+        self._redraw()
+
+    def _on_destroy(self, event):
+        # A pending redraw would run against the destroyed canvas, and the client would keep reconnecting
+        if event.widget is not self: return
+        self.after_cancel(self._pending); self.client.close()
+
+    def _redraw(self):
+        width = max(self.winfo_width(), 2); height = max(self.winfo_height(), 2)
+        bands = (width, height, tuple(self.bands()))
+        if bands != self.drawn:
+            self.delete("band"); scale = (height - 1) / 1023
+            for index, (low, high, key) in enumerate(bands[2]):
+                color = SCOPE_BAND_COLORS[index % len(SCOPE_BAND_COLORS)]
+                self.create_rectangle(0, height - 1 - high * scale, width, height - 1 - low * scale, fill=color, outline="", tags="band")
+                self.create_text(width - 4, height - 1 - high * scale, anchor="ne", fill="white", text=key, tags="band")
+            self.tag_lower("band"); self.drawn = bands
+        client = self.client
+        with client.lock:
+            trace = client.traces.get(self.pin); now = client.now()
+            if trace is not None and now is not None: trace.advance_to(now)
+            points = trace.points(width, height) if trace is not None else []
+        self.coords(self.trace_line, *(points if len(points) >= 4 else (0, 0, 0, 0)))
+        if not client.connected: status = "connecting..."
+        elif trace is None: status = "no samples (pin not mapped?)"
+        else: status = str(trace.last_value)
+        self.itemconfigure(self.label, text=f"{self.pin}: {status}")
+        self._pending = self.after(SCOPE_REFRESH_MS, self._redraw)
 
 class AnalogPinDialog(tk.Toplevel):
-    def __init__(self, parent, pin_name, initial_data=None):
+    def __init__(self, parent, pin_name, initial_data=None, initial_options=None, scope_port=None):
         super().__init__(parent)
         self.title(f"Analog Pin Editor: {pin_name}")
         self.transient(parent)
@@ -26,6 +127,9 @@ class AnalogPinDialog(tk.Toplevel):
         
         self.pin_name = pin_name
         self.result = initial_data if initial_data is not None else []
+        self.options = dict(initial_options) if initial_options else {}
+        # While the program runs, the pin's live samples are shown over the ranges being edited
+        self.scope_client = ScopeClient(scope_port) if scope_port else None
         
         self.create_widgets()
         self._refresh_listbox()
@@ -34,6 +138,11 @@ class AnalogPinDialog(tk.Toplevel):
         main_frame = ttk.Frame(self, padding=10)
         main_frame.pack(fill="both", expand=True)
 
+        if self.scope_client is not None:
+            scope_frame = ttk.LabelFrame(main_frame, text="Live Samples")
+            scope_frame.pack(fill="x", pady=(0, 10))
+            ScopeView(scope_frame, self.scope_client, self.pin_name.upper(), lambda: threshold_bands(self.result)).pack(fill="x", padx=5, pady=5)
+
         list_frame = ttk.LabelFrame(main_frame, text="Thresholds")
         list_frame.pack(fill="both", expand=True)
         self.threshold_listbox = tk.Listbox(list_frame, height=8)
@@ -59,7 +168,21 @@ class AnalogPinDialog(tk.Toplevel):
         self.hold_entry = ttk.Entry(add_frame, width=8)
         self.hold_entry.grid(row=0, column=7, padx=5, pady=5)
 
-        ttk.Button(add_frame, text="Add", command=self._add_threshold).grid(row=0, column=8, padx=10, pady=5)
+        ttk.Label(add_frame, text="Hyst:").grid(row=0, column=8, padx=5, pady=5)
+        self.hyst_entry = ttk.Entry(add_frame, width=6)
+        self.hyst_entry.grid(row=0, column=9, padx=5, pady=5)
+
+        ttk.Button(add_frame, text="Add", command=self._add_threshold).grid(row=0, column=10, padx=10, pady=5)
+
+        report_frame = ttk.LabelFrame(main_frame, text="Reporting (empty = every sample)")
+        report_frame.pack(fill="x", pady=(0, 10))
+        self.option_entries = {}
+        for column, (name, label) in enumerate(REPORTING_FIELDS):
+            ttk.Label(report_frame, text=label).grid(row=0, column=column * 2, padx=5, pady=5)
+            entry = ttk.Entry(report_frame, width=8)
+            entry.grid(row=0, column=column * 2 + 1, padx=5, pady=5)
+            if name in self.options: entry.insert(0, str(self.options[name]))
+            self.option_entries[name] = entry
         
         ttk.Button(main_frame, text="Save", command=self.on_save).pack(side="right", padx=5)
         ttk.Button(main_frame, text="Cancel", command=self.destroy).pack(side="right")
@@ -67,7 +190,9 @@ class AnalogPinDialog(tk.Toplevel):
     def _refresh_listbox(self):
         self.threshold_listbox.delete(0, "end")
         for item in self.result:
-            self.threshold_listbox.insert("end", f"Key: {item['key']}, Range: {item['threshold'][0]}-{item['threshold'][1]}, Hold: {item['hold_time_ms']}ms")
+            text = f"Key: {item['key']}, Range: {item['threshold'][0]}-{item['threshold'][1]}, Hold: {item.get('hold_time_ms', 0)}ms"
+            if item.get('hysteresis'): text += f", Hyst: ±{item['hysteresis']}"
+            self.threshold_listbox.insert("end", text)
 
     def _add_threshold(self):
         try:
@@ -75,15 +200,18 @@ class AnalogPinDialog(tk.Toplevel):
             low = int(self.low_entry.get())
             high = int(self.high_entry.get())
             hold = int(self.hold_entry.get())
-            if not key or low > high or low < 0 or high > 1023:
+            hyst = int(self.hyst_entry.get() or 0)
+            if not key or low > high or low < 0 or high > 1023 or hyst < 0:
                 raise ValueError
             new_threshold = {"key": key, "threshold": [low, high], "hold_time_ms": hold}
+            if hyst: new_threshold["hysteresis"] = hyst
             self.result.append(new_threshold)
             self._refresh_listbox()
             self.key_entry.delete(0, "end")
             self.low_entry.delete(0, "end")
             self.high_entry.delete(0, "end")
             self.hold_entry.delete(0, "end")
+            self.hyst_entry.delete(0, "end")
         except ValueError:
             messagebox.showerror("Invalid Input", "Please enter valid data.", parent=self)
     
@@ -94,6 +222,17 @@ class AnalogPinDialog(tk.Toplevel):
         self._refresh_listbox()
     
     def on_save(self):
+        # Options without a field here (such as "filter") are kept as they were
+        options = {name: value for name, value in self.options.items() if name not in dict(REPORTING_FIELDS)}
+        try:
+            for name, entry in self.option_entries.items():
+                if not entry.get().strip(): continue
+                options[name] = int(entry.get())
+                if options[name] < 0: raise ValueError
+        except ValueError:
+            messagebox.showerror("Invalid Input", "Reporting values must be non-negative integers.", parent=self)
+            return
+        self.options = options
         self.destroy()
 
 class PluginConfigDialog(tk.Toplevel):
@@ -103,10 +242,8 @@ class PluginConfigDialog(tk.Toplevel):
         self.transient(parent)
         self.result = None
         self.widgets = {}
-        self.data_model = ui_definition.get("data_model", {})
-        if initial_settings:
-            import copy
-            self.data_model = copy.deepcopy(initial_settings)
+        # ui_definition comes from the shared registry, so its data_model is copied before the widgets write into it
+        self.data_model = copy.deepcopy(initial_settings or ui_definition.get("data_model", {}))
         main_frame = ttk.Frame(self)
         main_frame.pack(side="top", fill="both", expand=True, padx=10, pady=5)
         self.render_layout(main_frame, ui_definition.get("layout", {}))
@@ -167,30 +304,39 @@ class KeymapuinoGUI:
         self.root = root
         self.root.title("Keymapuino")
         self.proc = None
+        self.scope_port = None
         self.config = {"port": "", "key_mapping": {}, "plugins": []}
         self.available_plugins = {}
         BASE_DIR = get_base_path()
         binary_name = "keymapuino-cli.exe" if sys.platform == "win32" else "keymapuino-cli"
         self.path = os.path.join(BASE_DIR, "bin", binary_name)
         self.log_path = os.path.join(BASE_DIR, "temp_log.txt")
+        self.log_lines = deque(maxlen=LOG_HISTORY_LINES)
+        self.log_lock = threading.Lock()
+        self.log_queues = ()
         self.config_path = os.path.join(BASE_DIR, "config.json")
         self.plugins_dir = os.path.join(BASE_DIR, "plugins")
+        self.plugin_registry = PluginRegistry(self.plugins_dir)
         self.root.protocol("WM_DELETE_WINDOW", self.on_closing)
         self._scan_for_plugins()
         self.create_widgets()
 
     def _scan_for_plugins(self):
-        if not os.path.isdir(self.plugins_dir): return
-        for name in os.listdir(self.plugins_dir):
-            if os.path.exists(os.path.join(self.plugins_dir, name, "ui.json")):
-                self.available_plugins[name] = os.path.join(self.plugins_dir, name, "ui.json")
+        self.available_plugins = {name: manifest for name, manifest in self.plugin_registry.scan().items() if manifest['ui'] is not None}
+
+    def _plugin_ui(self, name):
+        # Re-checked against the files on every dialog, but only parsed again when ui.json changed
+        manifest = self.plugin_registry.get(name)
+        return manifest['ui'] if manifest is not None else None
 
     def create_widgets(self):
         port_frame = ttk.LabelFrame(self.root, text="Port Settings")
         port_frame.pack(fill="x", padx=10, pady=5)
-        self.port_combo = ttk.Combobox(port_frame, values=self.get_serial_ports(), state="normal")
+        self.port_combo = ttk.Combobox(port_frame, values=(), state="normal")
         self.port_combo.pack(side="left", fill="x", expand=True, padx=5)
         self.port_combo.set(" ")
+        # Listing serial ports is slow on some systems, so the window is shown first
+        self.root.after_idle(lambda: self.port_combo.configure(values=self.get_serial_ports()))
         ttk.Button(port_frame, text="Refresh", command=self.refresh_ports).pack(side="left", padx=5)
 
         self.notebook = ttk.Notebook(self.root)
@@ -224,6 +370,8 @@ class KeymapuinoGUI:
         self.run_button.pack(side="left", padx=5)
         self.stop_button = ttk.Button(file_frame, text="Stop Program", command=self.stop_program)
         self.stop_button.pack_forget()
+        self.apply_button = ttk.Button(file_frame, text="Apply Changes", command=self.apply_config)
+        self.apply_button.pack_forget()
         
         status_frame = ttk.Frame(self.root)
         status_frame.pack(pady=5)
@@ -231,12 +379,15 @@ class KeymapuinoGUI:
         self.status_icon = tk.Label(status_frame, width=2, background="grey", relief="sunken")
         self.status_icon.pack(side="left")
         ttk.Button(status_frame, text="View Logs", command=self.show_log_window).pack(side="left", padx=10)
+        ttk.Button(status_frame, text="Analog Scope", command=self.show_scope_window).pack(side="left")
 
         footer_frame = ttk.Frame(self.root)
         footer_frame.pack(side="bottom", fill="x", padx=10, pady=5)
         ttk.Label(footer_frame, text=f"{self.version} © 2025 Madsiser", anchor="e", font=("TkDefaultFont", 8, "italic"), foreground="gray").pack(side="right")
 
-    def get_serial_ports(self): return [p.device for p in serial.tools.list_ports.comports()]
+    def get_serial_ports(self):
+        import serial.tools.list_ports
+        return [p.device for p in serial.tools.list_ports.comports()]
     
     def refresh_ports(self):
         ports = self.get_serial_ports()
@@ -246,17 +397,22 @@ class KeymapuinoGUI:
     def _refresh_listboxes(self):
         self.keymap_listbox.delete(0, "end")
         for pin, val in self.config.get("key_mapping", {}).items():
-            if isinstance(val, list):
-                self.keymap_listbox.insert("end", f"Analog {pin} -> {len(val)} thresholds")
-            else:
+            thresholds = val if isinstance(val, list) else val.get("thresholds")
+            if thresholds is not None:
+                self.keymap_listbox.insert("end", f"Analog {pin} -> {len(thresholds)} thresholds")
+            elif "key" in val:
                 self.keymap_listbox.insert("end", f"Digital {pin} -> {val['key']}")
+            else:
+                self.keymap_listbox.insert("end", f"Digital {pin} -> {'macro' if 'macro' in val else 'tap/hold'}")
         
         self.plugin_listbox.delete(0, "end")
         for i, instance_config in enumerate(self.config.get("plugins", [])):
             name = instance_config["name"]
             summary = f"({i}) {name}"
             settings = instance_config.get("settings", {})
-            if "pin" in settings: summary += f" on Pin {settings['pin']}"
+            manifest = self.available_plugins.get(name)
+            pins = [str(settings[key]) for key in (manifest['pins'] if manifest else ("pin",)) if settings.get(key) is not None]
+            if pins: summary += f" on Pin {', '.join(pins)}"
             self.plugin_listbox.insert("end", summary)
 
     def add_digital_pin(self):
@@ -270,11 +426,13 @@ class KeymapuinoGUI:
     def add_analog_pin(self):
         pin = simpledialog.askstring("Input", "Analog Pin (e.g., A0):", parent=self.root)
         if not pin: return
-        initial_data = self.config["key_mapping"].get(pin, [])
-        dialog = AnalogPinDialog(self.root, pin, initial_data)
+        mapping = self.config["key_mapping"].get(pin, [])
+        if isinstance(mapping, list): initial_data, initial_options = mapping, {}
+        else: initial_data, initial_options = mapping.get("thresholds", []), {k: v for k, v in mapping.items() if k != "thresholds"}
+        dialog = AnalogPinDialog(self.root, pin, initial_data, initial_options, self._running_scope_port())
         self.root.wait_window(dialog)
         if dialog.result:
-            self.config["key_mapping"][pin] = dialog.result
+            self.config["key_mapping"][pin] = dict(dialog.options, thresholds=dialog.result) if dialog.options else dialog.result
         elif pin in self.config["key_mapping"] and not dialog.result:
             del self.config["key_mapping"][pin]
         self._refresh_listboxes()
@@ -289,6 +447,7 @@ class KeymapuinoGUI:
         self._refresh_listboxes()
 
     def add_plugin(self):
+        self._scan_for_plugins()
         if not self.available_plugins:
             messagebox.showinfo("No Plugins", "No plugins with a 'ui.json' file found.")
             return
@@ -305,8 +464,10 @@ class KeymapuinoGUI:
             chosen_name = selected_plugin_name.get()
             dialog.destroy()
             if not chosen_name: return
-            ui_path = self.available_plugins[chosen_name]
-            with open(ui_path, 'r') as f: ui_definition = json.load(f)
+            ui_definition = self._plugin_ui(chosen_name)
+            if ui_definition is None:
+                messagebox.showerror("Error", f"UI definition for '{chosen_name}' not found!")
+                return
             config_dialog = PluginConfigDialog(self.root, ui_definition)
             self.root.wait_window(config_dialog)
             if config_dialog.result is not None:
@@ -321,11 +482,10 @@ class KeymapuinoGUI:
         instance_config = self.config["plugins"][index]
         name = instance_config["name"]
         settings = instance_config.get("settings", {})
-        ui_path = self.available_plugins.get(name)
-        if not ui_path:
+        ui_definition = self._plugin_ui(name)
+        if ui_definition is None:
             messagebox.showerror("Error", f"UI definition for '{name}' not found!")
             return
-        with open(ui_path, 'r') as f: ui_definition = json.load(f)
         config_dialog = PluginConfigDialog(self.root, ui_definition, initial_settings=settings)
         self.root.wait_window(config_dialog)
         if config_dialog.result is not None:
@@ -355,20 +515,35 @@ class KeymapuinoGUI:
 
     def run_program(self):
         self.config["port"] = self.port_combo.get()
-        with open(self.config_path, "w") as f: json.dump(self.config, f, indent=2)
-        with open(self.log_path, "w") as f: f.write("")
+        self._write_config()
+        with self.log_lock: self.log_lines.clear()
         try:
-            cmd = [self.path, "--config", self.config_path, "--log", "2"]
+            self.log_file = RotatingLogFile(self.log_path)
+            # The CLI streams analog samples to the scope windows on this port
+            self.scope_port = free_local_port()
+            cmd = [self.path, "--config", self.config_path, "--log", "2", "--scope-port", str(self.scope_port)]
             creationflags = subprocess.CREATE_NO_WINDOW if sys.platform == "win32" else 0
-            self.proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, bufsize=1, creationflags=creationflags)
+            self.proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, bufsize=0, creationflags=creationflags)
             self.update_status("starting")
             self.run_button.pack_forget()
             self.stop_button.pack(side="left", padx=5)
+            self.apply_button.pack(side="left", padx=5)
             threading.Thread(target=self.monitor_process, daemon=True).start()
         except Exception as e:
             messagebox.showerror("Error", f"Failed to start the program:\n{e}")
             self.update_status("error")
 
+    def _write_config(self):
+        # Written to a temporary file and swapped in, so the running CLI never reads a half-written config
+        temp_path = self.config_path + ".tmp"
+        with open(temp_path, "w") as f: json.dump(self.config, f, indent=2)
+        os.replace(temp_path, self.config_path)
+
+    def apply_config(self):
+        # The running CLI notices the new file and only re-sends the pins and plugins that changed
+        self.config["port"] = self.port_combo.get()
+        self._write_config()
+
     def stop_program(self):
         if self.proc and self.proc.poll() is None:
             if sys.platform == "win32": self.proc.terminate()
@@ -380,53 +555,85 @@ class KeymapuinoGUI:
         self.update_status("finished")
         if self.root.winfo_exists():
             self.stop_button.pack_forget()
+            self.apply_button.pack_forget()
             self.run_button.pack(side="left", padx=5)
 
     def monitor_process(self):
+        # Reads whatever the CLI has written so far in one go, so a burst of lines costs one file write and one queue put
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace"); partial = ""
         try:
-            for line in self.proc.stdout:
-                with open(self.log_path, "a") as f: f.write(line)
-                if "STARTING" in line: self.update_status("starting")
-                elif "Configuration sent successfully" in line: self.update_status("running")
+            while chunk := os.read(self.proc.stdout.fileno(), LOG_READ_SIZE):
+                lines = (partial + decoder.decode(chunk).replace("\r", "")).split("\n"); partial = lines.pop()
+                if lines: self._add_log_lines(lines)
+            if partial: self._add_log_lines([partial])
             self.proc.wait()
-            stderr = self.proc.stderr.read()
+            stderr = self.proc.stderr.read().decode("utf-8", errors="replace")
             if self.proc.returncode != 0 and stderr:
-                with open(self.log_path, "a") as f: f.write("\n[ERROR]\n" + stderr)
+                self._add_log_lines(["", "[ERROR]"] + stderr.splitlines())
                 self.update_status("error")
             else:
                 self.update_status("finished")
         except Exception:
             self.update_status("error")
         finally:
+            self.log_file.close()
             if self.root.winfo_exists():
                 self.stop_button.pack_forget()
+                self.apply_button.pack_forget()
                 self.run_button.pack(side="left", padx=5)
 
+    def _add_log_lines(self, lines):
+        self.log_file.write("\n".join(lines) + "\n")
+        with self.log_lock:
+            self.log_lines.extend(lines)
+            for log_queue in self.log_queues: log_queue.put(lines)
+        if any("STARTING" in line for line in lines): self.update_status("starting")
+        if any("Configuration sent successfully" in line for line in lines): self.update_status("running")
+
     def update_status(self, state):
         color_map = {"starting": "yellow", "running": "green", "error": "red", "finished": "blue"}
         self.status_icon.configure(background=color_map.get(state, "grey"))
 
     def show_log_window(self):
-        if not os.path.exists(self.log_path): return
         log_window = tk.Toplevel(self.root)
         log_window.title("Live Log Viewer")
         txt = tk.Text(log_window, wrap="word", state="disabled")
         txt.pack(fill="both", expand=True)
-        last_pos = [0]
+        # The monitor thread hands new lines to this queue; the Tk thread picks them up in batches and keeps at most LOG_VIEW_LINES
+        log_queue = queue.SimpleQueue()
+        with self.log_lock: self.log_queues += (log_queue,); history = list(self.log_lines)
+        def append_lines(lines):
+            txt.config(state="normal")
+            txt.insert("end", "\n".join(lines[-LOG_VIEW_LINES:]) + "\n")
+            excess = int(txt.index("end-1c").split(".")[0]) - 1 - LOG_VIEW_LINES
+            if excess > 0: txt.delete("1.0", f"{excess + 1}.0")
+            txt.yview_moveto(1.0)
+            txt.config(state="disabled")
         def follow_log():
+            if not log_window.winfo_exists():
+                with self.log_lock: self.log_queues = tuple(q for q in self.log_queues if q is not log_queue)
+                return
+            lines = []
             try:
-                with open(self.log_path, "r") as f:
-                    f.seek(last_pos[0])
-                    if new_lines := f.readlines():
-                        txt.config(state="normal")
-                        txt.insert("end", "".join(new_lines))
-                        txt.yview_moveto(1.0)
-                        txt.config(state="disabled")
-                    last_pos[0] = f.tell()
-            finally:
-                if log_window.winfo_exists(): log_window.after(1000, follow_log)
+                while True: lines.extend(log_queue.get_nowait())
+            except queue.Empty: pass
+            if lines: append_lines(lines)
+            self.root.after(LOG_VIEW_INTERVAL_MS, follow_log)
+        if history: append_lines(history)
         follow_log()
 
+    def _running_scope_port(self):
+        return self.scope_port if self.proc and self.proc.poll() is None else None
+
+    def show_scope_window(self):
+        port = self._running_scope_port()
+        if port is None: messagebox.showinfo("Analog Scope", "Start the program to see live samples."); return
+        scope_window = tk.Toplevel(self.root)
+        scope_window.title("Analog Scope")
+        client = ScopeClient(port)
+        for pin in scope_pins(self.config):
+            ScopeView(scope_window, client, pin, lambda pin=pin: threshold_bands(scope_pin_mapping(self.config, pin))).pack(fill="x", padx=5, pady=2)
+
     def on_closing(self):
         if self.proc and self.proc.poll() is None:
             if messagebox.askyesno("Exit", "The program is running. Stop it and exit?"): self.stop_program()
@@ -1,5 +1,3 @@
-import time
-
 class Plugin:
     def __init__(self, core_api, settings):
         """
@@ -13,10 +11,12 @@ class Plugin:
         self.step_delay_sec = self.settings.get("step_delay_ms", 50) / 1000.0  # Konwertuj na sekundy
         self.step_size = self.settings.get("step_size", 2)
         
+        # Rdzeń wywołuje update() co step_delay_sec zamiast przy każdym cyklu pętli
+        self.update_interval = self.step_delay_sec
+        
         # Zmienne stanu do śledzenia ruchu serwa
         self.current_angle = 0
         self.direction = 1  # 1 oznacza ruch w stronę 180, -1 w stronę 0
-        self.last_update_time = 0
         
         if self.pin is not None:
             self.api.log(f"Servo Sweeper initialized on pin {self.pin}.", level='info')
@@ -36,16 +36,12 @@ class Plugin:
 
     def update(self):
         """
-        Główna metoda logiki, wywoływana cyklicznie przez keymapuino-cli.
+        Główna metoda logiki, wywoływana przez keymapuino-cli co update_interval sekund.
         """
         # Jeśli pin nie jest skonfigurowany, nic nie rób
         if self.pin is None:
             return
             
-        # Sprawdź, czy minął już czas na kolejny ruch
-        if (time.time() - self.last_update_time) < self.step_delay_sec:
-            return
-            
         # Oblicz następną pozycję
         self.current_angle += self.step_size * self.direction
         
@@ -60,7 +56,4 @@ class Plugin:
         # Wyślij komendę do Arduino
         self.api.set_servo_angle(self.pin, self.current_angle)
         
-        # Zapisz czas ostatniej aktualizacji
-        self.last_update_time = time.time()
-        
         self.api.log(f"Set servo on pin {self.pin} to {self.current_angle} degrees.", level='debug')